@@ -0,0 +1,139 @@
+"""
+    Reading the people DB from one archive of a db/<cohort> directory,
+    instead of one file per person (e.g. on a slow network filesystem):
+
+        tar czf 2016-MIT.tgz -C db 2016-MIT
+        python src/generate_roster.py 2016-MIT.tgz
+
+    .tar (optionally compressed: .tar.gz, .tgz, .tar.bz2) and .zip are
+    accepted. A tar archive is read in one sequential pass; for a zip
+    archive, the central directory is read once and the members are read
+    from the same open file. Either way there is one open() for the
+    whole DB, instead of a stat, open and read per person.
+
+    The members are taken from the top of the archive or from one
+    directory (the cohort), not from deeper subdirectories. The handle is
+    the name of the YAML member, without the directory.
+
+    The photos next to the YAML files (<handle>.jpg, .jpeg or .png) are
+    extracted in the same pass to a cache directory outside the site
+    (photo_cache_dir()), and are the image source of the roster: for the
+    thumbnails (see thumbnails.py) and for the photo sizes.
+"""
+import hashlib
+import logging
+import os
+import posixpath
+import tempfile
+
+from people import MyExc
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['is_archive', 'read_archive', 'photo_cache_dir', 'archive_photos']
+
+SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.zip')
+
+PHOTO_SUFFIXES = ('.jpg', '.jpeg', '.png')
+
+
+# absolute archive name -> handle -> photo file, from the last read_archive()
+_photos = {}
+
+
+def is_archive(filename):
+    return filename.lower().endswith(SUFFIXES) and os.path.isfile(filename)
+
+
+def photo_cache_dir(filename):
+    """ Where the photos of the archive are extracted: one directory per
+        archive in the temporary directory, kept between runs. """
+    key = hashlib.sha1(os.path.abspath(filename).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), 'duckietown-photos', key)
+
+
+def archive_photos(filename):
+    """ Returns handle -> photo file, as extracted when the people were
+        read (the archive is read only if it was not read yet). """
+    key = os.path.abspath(filename)
+    if not key in _photos:
+        read_archive(filename, photo_cache_dir(filename))
+    return _photos[key]
+
+
+def _iter_tar(filename):
+    import tarfile
+    try:
+        # "r|*" is the streaming mode: no seeking back
+        with tarfile.open(filename, 'r|*') as tar:
+            for member in tar:
+                if member.isfile():
+                    yield member.name, tar.extractfile(member).read()
+    except tarfile.TarError as e:
+        msg = 'Invalid archive %r: %s' % (filename, e)
+        raise MyExc(msg)
+
+
+def _iter_zip(filename):
+    import zipfile
+    try:
+        with zipfile.ZipFile(filename) as z:
+            for info in z.infolist():
+                if not info.filename.endswith('/'):
+                    yield info.filename, z.read(info)
+    except zipfile.BadZipfile as e:
+        msg = 'Invalid archive %r: %s' % (filename, e)
+        raise MyExc(msg)
+
+
+def _iter_members(filename):
+    if filename.lower().endswith('.zip'):
+        return _iter_zip(filename)
+    return _iter_tar(filename)
+
+
+def read_archive(filename, photos_dir=None):
+    """ Returns a list of (handle, member name, YAML bytes), in the
+        order of the archive. With photos_dir, the photos are written there as
+        <handle><suffix> (only if their contents changed), and the
+        result is (records, handle -> photo file). """
+    records = []
+    photos = {}
+    seen = {}
+    for name, data in _iter_members(filename):
+        # "./2016-MIT/x.yaml" (tar czf x.tgz ./2016-MIT) is "2016-MIT/x.yaml"
+        name = posixpath.normpath(name).lstrip('/')
+        if name.count('/') > 1:
+            continue  # subdirectories of the cohort, as for the glob
+        base, suffix = posixpath.splitext(posixpath.basename(name))
+        suffix = suffix.lower()
+        if suffix == '.yaml':
+            if base in seen:
+                msg = 'Duplicate handle %r in %r: %s and %s' % (base, filename, seen[base], name)
+                raise MyExc(msg)
+            seen[base] = name
+            records.append((base, name, data))
+        elif suffix in PHOTO_SUFFIXES and photos_dir is not None:
+            photos[base] = _write_photo(photos_dir, base + suffix, data)
+    if not records:
+        msg = 'No YAML files in the archive %r.' % filename
+        raise MyExc(msg)
+    logger.info('%s: %d people, %d photos', filename, len(records), len(photos))
+    if photos_dir is None:
+        return records
+    photos = dict((h, f) for h, f in photos.items() if h in seen)
+    _photos[os.path.abspath(filename)] = photos
+    return records, photos
+
+
+def _write_photo(photos_dir, name, data):
+    from outputs import atomic_write
+    if not os.path.exists(photos_dir):
+        os.makedirs(photos_dir)
+    filename = os.path.join(photos_dir, name)
+    if os.path.exists(filename) and os.path.getsize(filename) == len(data):
+        with open(filename, 'rb') as f:
+            if f.read() == data:
+                return filename
+    atomic_write(filename, data)
+    return filename
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+    Measures the cold-start import latency of each script, using
+    `python -X importtime` (Python 3.7+):
+
+        python3 src/benchmark_imports.py [repeat]
+
+    For each script it reports the wall time of `python -c "import <script>"`,
+    the cumulative import time of the script module, the heaviest imports,
+    and whether yaml/dateutil were pulled in at import time (they should
+    only be loaded when parsing).
+"""
+import logging
+import os
+import subprocess
+import sys
+import time
+
+logging.basicConfig()
+logger = logging.getLogger('benchmark_imports')
+logger.setLevel(logging.INFO)
+
+SCRIPTS = ['generate_lectures', 'generate_roster', 'generate_documents',
+           'generate_outreach', 'generate_pdf']
+
+HEAVY = ['yaml', 'dateutil', 'sqlite3']
+
+
+def measure(module, src):
+    """ Returns (wall time in s, cumulative us of module,
+        {direct import of module: cumulative us}, set of all imported). """
+    cmd = [sys.executable, '-X', 'importtime', '-c', 'import %s' % module]
+    t0 = time.time()
+    p = subprocess.Popen(cmd, cwd=src, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    _, stderr = p.communicate()
+    wall = time.time() - t0
+    if p.returncode != 0:
+        msg = 'Could not import %s:\n%s' % (module, stderr.decode())
+        raise Exception(msg)
+    # children are listed before their parent, indented by two spaces
+    imported = set()
+    pending = {}
+    own = 0
+    children = {}
+    for line in stderr.decode().splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cum, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        imported.add(name.split('.')[0])
+        if depth == 0:
+            if name == module:
+                own = int(cum)
+                children = pending
+            pending = {}
+        elif depth == 1:
+            pending[name] = int(cum)
+    return wall, own, children, imported
+
+
+def main():
+    if sys.version_info < (3, 7):
+        logger.error('-X importtime needs Python 3.7 or later.')
+        sys.exit(-2)
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    src = os.path.dirname(os.path.abspath(__file__))
+
+    baseline = min(measure('sys', src)[0] for _ in range(repeat))
+    logger.info('interpreter startup: %.1f ms' % (baseline * 1000))
+
+    for module in SCRIPTS:
+        runs = [measure(module, src) for _ in range(repeat)]
+        wall, own, children, imported = min(runs, key=lambda r: r[0])
+        heaviest = sorted(((us, name) for name, us in children.items()),
+                          reverse=True)[:3]
+        loaded = [h for h in HEAVY if h in imported]
+        logger.info('%-20s wall %6.1f ms  import %6.1f ms  heaviest: %s%s' %
+                    (module, wall * 1000, own / 1000.0,
+                     ", ".join('%s %.1f ms' % (name, us / 1000.0) for us, name in heaviest),
+                     ('  LOADED: %s' % ", ".join(loaded)) if loaded else ''))
+
+
+if __name__ == '__main__':
+    main()
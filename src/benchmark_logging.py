@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+    Measures the logging overhead in the generators:
+
+        python src/benchmark_logging.py [n]
+
+    1. A disabled log call with the message formatted by the caller
+       (the previous logger.info('people: %s' % people)) against the lazy
+       logger.info('people: %s', summarize(people)).
+    2. The cost per emitted record of the previous emit() patch
+       (kept here as legacy_*) and of the color, plain and JSON formatters,
+       writing to /dev/null.
+"""
+import logging
+import os
+import sys
+import time
+
+from logs import level_color, make_formatter, summarize
+
+logging.basicConfig()
+logger = logging.getLogger('benchmark_logging')
+logger.setLevel(logging.INFO)
+
+
+def legacy_add_coloring_to_emit_ansi(fn):
+    def new(*args):
+        args[1].msg = level_color(args[1].levelno) + str(args[1].msg) + '\x1b[0m'
+        return fn(*args)
+    return new
+
+
+class LegacyHandler(logging.StreamHandler):
+    pass
+
+
+LegacyHandler.emit = legacy_add_coloring_to_emit_ansi(logging.StreamHandler.emit)
+
+
+def make_people(n):
+    return dict(('person%d' % i, {'name': 'Person %d' % i, 'order': 100,
+                                  'bio': 'Bio of person %d. ' % i * 5,
+                                  'tags': ['operations']})
+                for i in range(n))
+
+
+def timeit(f, n):
+    t0 = time.time()
+    for _ in range(n):
+        f()
+    return (time.time() - t0) / n
+
+
+def make_logger(name, handler, level):
+    l = logging.getLogger('benchmark_logging.%s' % name)
+    l.propagate = False
+    l.handlers = [handler]
+    l.setLevel(level)
+    return l
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    people = make_people(100)
+    devnull = open(os.devnull, 'w')
+
+    off = make_logger('off', logging.NullHandler(), logging.WARNING)
+    eager = timeit(lambda: off.info('people: %s' % people), n // 100)
+    lazy = timeit(lambda: off.info('people: %s', summarize(people)), n)
+    logger.info('level off: eager %.1f us/call, lazy %.2f us/call' %
+                (eager * 1e6, lazy * 1e6))
+
+    h = LegacyHandler(devnull)
+    h.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    legacy = make_logger('legacy', h, logging.DEBUG)
+    t_legacy = timeit(lambda: legacy.debug('score %r -> %r' % ('Person', 100000)), n)
+    res = ['emit patch %.1f' % (t_legacy * 1e6)]
+    for log_format in ['color', 'plain', 'json']:
+        h = logging.StreamHandler(devnull)
+        h.setFormatter(make_formatter(log_format))
+        l = make_logger(log_format, h, logging.DEBUG)
+        t = timeit(lambda: l.debug('score %r -> %r', 'Person', 100000), n)
+        res.append('%s %.1f' % (log_format, t * 1e6))
+    logger.info('emitted, us/record: %s' % ", ".join(res))
+
+    logger.info('summary of 100 people: %s' % summarize(people))
+
+
+if __name__ == '__main__':
+    main()
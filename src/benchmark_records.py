@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+    Compares the memory used by the normalized people as dicts (as they
+    come out of the YAML parser, one list and one string per tag) and as
+    Person records with interned tags:
+
+        python3 src/benchmark_records.py [n]
+
+    With Python 3 the memory is measured with tracemalloc; with Python 2
+    it is estimated with sys.getsizeof() over the records and their tags.
+"""
+import logging
+import sys
+import time
+
+from records import Person, get_tag_stats
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+logging.basicConfig()
+logger = logging.getLogger('benchmark_records')
+logger.setLevel(logging.INFO)
+
+TAGS = [['operations'], ['training'], ['operations', 'training'],
+        ['management', 'advisory'], ['sponsors']]
+
+
+def make_dict(i):
+    # new string objects for the tags, like a YAML parser produces
+    tags = [''.join(list(t)) for t in TAGS[i % len(TAGS)]]
+    return {'order': 100,
+            'name': 'Person %d' % i,
+            'position': 'Position %d' % (i % 7),
+            'url': None if i % 3 == 0 else 'http://example.com/%d' % i,
+            'bio': '',
+            'tags': tags}
+
+
+def make_dicts(n):
+    return [make_dict(i) for i in range(n)]
+
+
+def make_records(n):
+    return [Person.from_dict(make_dict(i)) for i in range(n)]
+
+
+def getsizeof_estimate(items):
+    """ Python 2: size of the containers (records, dicts, tag lists and
+        tag strings), counting shared objects once. """
+    seen = set()
+    total = 0
+    for x in items:
+        total += sys.getsizeof(x)
+        tags = x['tags']
+        for o in [tags] + list(tags):
+            if id(o) not in seen:
+                seen.add(id(o))
+                total += sys.getsizeof(o)
+    return total
+
+
+def measure(f, n):
+    """ Returns (bytes, seconds, result). """
+    if tracemalloc is not None:
+        tracemalloc.start()
+        t0 = time.time()
+        res = f(n)
+        t = time.time() - t0
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    else:
+        t0 = time.time()
+        res = f(n)
+        t = time.time() - t0
+        size = getsizeof_estimate(res)
+    return size, t, res
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    size_d, t_d, dicts = measure(make_dicts, n)
+    size_r, t_r, records = measure(make_records, n)
+
+    for d, r in zip(dicts[:100], records[:100]):
+        assert r == d, (r, d)
+
+    method = 'tracemalloc' if tracemalloc is not None else 'getsizeof estimate'
+    logger.info('%d people (%s): dicts %.1f MiB (%d B each, %.0f ms), '
+                'records %.1f MiB (%d B each, %.0f ms): %.1fx smaller' %
+                (n, method, size_d / 1048576.0, size_d // n, t_d * 1000,
+                 size_r / 1048576.0, size_r // n, t_r * 1000, float(size_d) / size_r))
+    logger.info('tag table: %s' % get_tag_stats())
+
+
+if __name__ == '__main__':
+    main()
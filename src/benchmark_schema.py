@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""
+    Benchmarks the compiled schema validators against the previous
+    field-by-field normalize() path (kept here as legacy_*), and checks
+    that they normalize the records identically.
+
+        python src/benchmark_schema.py [n]
+"""
+import copy
+import logging
+import sys
+import time
+
+logging.basicConfig()
+logger = logging.getLogger('benchmark_schema')
+logger.setLevel(logging.INFO)
+
+import generate_lectures
+from generate_lectures import (normalize_bool, normalize_date, normalize_presenters,
+                               normalize_title, normalize_vimeo)
+from people import (Context, MyExc, normalize_bio, normalize_name,
+                    normalize_person, normalize_position, normalize_string,
+                    normalize_tags, normalize_url)
+
+
+def legacy_normalize(id_struct, struct, key, function, context):
+    with context.sub(id_struct):
+        if not key in struct:
+            msg = 'Could not find %r in %r' % (key, struct)
+            raise MyExc(msg)
+        if not key in struct:
+            msg = 'No %r field in %r' % (key, struct)
+            raise MyExc(msg)
+        value = struct[key]
+        with context.sub(key):
+            struct[key] = function(value, context)
+
+
+def legacy_normalize_person(id_record, record, context):
+    record['order'] = record.get('order', 100)
+    legacy_normalize(id_record, record, 'name', normalize_name, context)
+    legacy_normalize(id_record, record, 'position', normalize_position, context)
+    legacy_normalize(id_record, record, 'url', normalize_url, context)
+    legacy_normalize(id_record, record, 'bio', normalize_bio, context)
+    legacy_normalize(id_record, record, 'tags', normalize_tags, context)
+    return record
+
+
+def legacy_normalize_files(files, context):
+    if files is None:
+        files = []
+    if len(files) == 0:
+        context.warn('No files', code='no-files')
+    for i, f in enumerate(files):
+        legacy_normalize(str(i), f, 'desc', normalize_string, context)
+        legacy_normalize(str(i), f, 'url', normalize_url, context)
+    return files
+
+
+def legacy_normalize_lecture(id_record, record, context):
+    legacy_normalize(id_record, record, 'date', normalize_date, context)
+    legacy_normalize(id_record, record, 'title', normalize_title, context)
+    legacy_normalize(id_record, record, 'vimeo', normalize_vimeo, context)
+    legacy_normalize(id_record, record, 'ready', normalize_bool, context)
+    legacy_normalize(id_record, record, 'files', legacy_normalize_files, context)
+    legacy_normalize(id_record, record, 'presenters', normalize_presenters, context)
+    return record
+
+
+def make_records(n):
+    people = {}
+    lectures = {}
+    for i in range(n):
+        people['p%d' % i] = {
+            'name': 'Person %d' % i,
+            'position': None if i % 5 == 0 else 'Position',
+            'url': None if i % 3 == 0 else 'http://example.com/%d' % i,
+            'bio': None if i % 4 == 0 else 'Bio %d' % i,
+            'tags': ['operations'],
+        }
+        lectures['L%d' % i] = {
+            'date': 'Feb %d, 2016' % (1 + i % 28),
+            'title': 'Lecture %d' % i,
+            'vimeo': 'https://vimeo.com/%d' % i,
+            'ready': True,
+            'files': [{'desc': 'File %d' % j, 'url': 'https://dropbox.com/%d' % j}
+                      for j in range(i % 3)],
+            'presenters': ['p%d' % i],
+        }
+    return people, lectures
+
+
+def run(normalize_person, normalize_lecture, people, lectures):
+    context = Context()
+    t0 = time.time()
+    for k, v in people.items():
+        normalize_person(k, v, context)
+    for k, v in lectures.items():
+        normalize_lecture(k, v, context)
+    return time.time() - t0, context
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    people, lectures = make_records(n)
+
+    people1, lectures1 = copy.deepcopy(people), copy.deepcopy(lectures)
+    t_legacy, c_legacy = run(legacy_normalize_person, legacy_normalize_lecture,
+                             people1, lectures1)
+    people2, lectures2 = copy.deepcopy(people), copy.deepcopy(lectures)
+    t_new, c_new = run(normalize_person,
+                       generate_lectures.normalize_lecture,
+                       people2, lectures2)
+
+    assert people1 == people2, 'Different people'
+    assert lectures1 == lectures2, 'Different lectures'
+    assert len(c_legacy.warnings) == len(c_new.warnings), 'Different warnings'
+
+    logger.info('%d people + %d lectures: normalize() %.1f ms, compiled %.1f ms (%.1fx)' %
+                (n, n, t_legacy * 1000, t_new * 1000, t_legacy / t_new))
+
+
+if __name__ == '__main__':
+    main()
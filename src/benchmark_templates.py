@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+"""
+    Benchmarks the compiled fragment templates against the previous
+    hand-assembled implementations (kept here as legacy_*), and checks
+    that they produce identical output.
+
+    Run from the website directory (generate_documents needs
+    05_materials.begin):
+
+        python src/benchmark_templates.py [n]
+
+    The loggers are silenced, so no log I/O is timed. The ratio is legacy
+    time / compiled time. With n=2000, lectures come out about 2x and
+    people (including the photo lookup) about 1.2x; the documents and
+    outreach templates do not improve on the code they replaced (1.0-1.1x).
+"""
+import logging
+import os
+import sys
+import timeit
+
+logging.basicConfig()
+logger = logging.getLogger('benchmark_templates')
+logger.setLevel(logging.INFO)
+
+import generate_documents
+import generate_lectures
+import generate_outreach
+import generate_roster
+from generate_lectures import indent
+
+
+def legacy_generate_vimeo(url):
+    id_video = url.split('/')[-1]
+    newurl = 'https://player.vimeo.com/video/%s' % id_video
+    s = """\n
+<iframe src="IFRAME"
+        width="400" height="281" frameborder="0"
+        webkitallowfullscreen mozallowfullscreen allowfullscreen></iframe>
+"""
+    s = s.replace("IFRAME", newurl)
+    return s
+
+
+def legacy_generate_lecture(lecture, links):
+    s = "\n\n"
+    s += '<h2> %s </h2>\n\n' % lecture['title']
+    if not lecture['ready']:
+        s += '<p class="notready">This lecture is not ready for publishing yet; files are missing,'
+        s += ' or the videos are not edited.</p>'
+    if lecture['presenters']:
+        s += '<p>Presenters: '
+        s += ', '.join(links.get(p, p) for p in lecture['presenters'])
+        s += '</p>\n\n'
+    else:
+        s += '<p class="incomplete">(No presenters specified.)</p>\n\n'
+    vimeo = lecture['vimeo']
+    if not vimeo:
+        s += '<p class="incomplete">(Video not available yet.)</p>\n\n'
+    s += '<table><tr>\n'
+    for url in vimeo:
+        s += '   <td>'
+        s += legacy_generate_vimeo(url)
+        s += '</td>'
+    s += '</tr></table>\n\n'
+    if lecture['files']:
+        s += '<ul class="materials">\n'
+        for f in lecture['files']:
+            s += ' <li><a href="%s">%s</a></li>\n' % (f['url'], f['desc'])
+        s += '</ul>\n\n'
+    s = "<div class='lecture'>\n\n" + indent(s, "    ") + '\n</div>\n\n'
+    return s
+
+
+def legacy_generate_person(id_person, p):
+    s = "<tr><td class='photo'>"
+    img_local_url = "media/staff/%s.jpg" % id_person
+    if not os.path.exists(img_local_url):
+        generate_roster.logger.warning('Image %r does not exist' % img_local_url)
+        img_local_url = "media/staff/MISSING.jpg"
+    img_url = "http://duckietown.mit.edu/" + img_local_url
+    name = p['name']
+    if name is None:
+        name = '("%s" should add information in DB)' % id_person
+    s += '<img class="person" src="%s"/>' % img_url
+    s += "</td><td>"
+    if p['url'] is not None:
+        s += '<span class="name"><a href="%s">%s</a></span>' % (p['url'], name)
+    else:
+        s += '<span class="name"> %s</span>' % name
+    s += '<br/><span class="position">%s</span>' % p['position']
+    if 'roster_note' in p:
+        s += '<p>%s</p>' % p['roster_note']
+    bio = p['bio'].strip()
+    if bio:
+        s += '<p><span class="bio">%s</span></p>' % bio
+    s += "</td></tr>"
+    return s
+
+
+def legacy_generate_documents(documents, tags_to_include):
+    def select(d):
+        tags = d.get('tags', [])
+        if tags is None:
+            tags = []
+        return any([_ in tags for _ in tags_to_include])
+    selected = [d for d in documents if select(d)]
+    generate_documents.logger.info('tags_to_include %r: selected %d' %
+                                   (tags_to_include, len(selected)))
+    return ''.join(legacy_generate_document(d) for d in selected)
+
+
+def legacy_generate_document(d):
+    title = d.get('title', '')
+    classes = []
+    if not title:
+        title = 'Missing title'
+        classes.append('missing')
+    s = '\n\n'
+    desc = d.get('desc', '')
+    if not desc:
+        desc = '<span class="missing">Missing description</span>'
+    desc = desc.strip().replace('\n', ' ')
+    if d['tags'] != "paper":
+        pdf_link = ('<span class="pdflink">(<a href="%s">%s static pdf</a>)</span>' %
+                    (generate_documents.url_pdf(d), generate_documents.icon_pdf()))
+    else:
+        pdf_link = ''
+    s += ('<p id="%s" class="%s"><a class="title" href="%s">%s%s</a> %s: ' %
+          (d.get('id'), " ".join(classes), d['google_docs_share_link'],
+           generate_documents.icon_gdoc(), title, pdf_link))
+    s += desc
+    s += '</p>'
+    s += '\n\n'
+    return s
+
+
+def legacy_generate_outreaches(selected, tags_to_include):
+    generate_outreach.logger.info('tags_to_include %r: selected %d' %
+                                  (tags_to_include, len(selected)))
+    return ''.join(legacy_generate_outreach(d) for d in selected)
+
+
+def legacy_generate_outreach(d):
+    title = d.get('title', '')
+    if not title:
+        title = "Under development"
+    s = '\n\n'
+    desc = (d.get('desc', '') or '').strip().replace('\n', ' ')
+    institute_url = d.get('institution_url')
+    s += """<p id="%s" class="%s"> """ % (d.get('id'), "")
+    if institute_url:
+        s += """<a class="title" href="%s">""" % institute_url
+    s += "%s" % d.get('institution', '')
+    if institute_url:
+        s += "</a>"
+    s += " - "
+    project_url = d.get('project_url')
+    if project_url:
+        s += """<a class="title" href="%s"> """ % project_url
+    s += "%s" % title
+    if project_url:
+        s += "</a>"
+    if desc:
+        s += ": %s" % desc
+    s += '</p>'
+    s += '\n\n'
+    return s
+
+
+def make_records(n):
+    people = {}
+    lectures = {}
+    documents = []
+    outreach = []
+    for i in range(n):
+        people['p%d' % i] = {
+            'name': None if i % 7 == 0 else 'Person Number%d' % i,
+            'url': None if i % 3 == 0 else 'http://example.com/%d' % i,
+            'position': 'Position %d' % i,
+            'bio': '' if i % 5 == 0 else '  Bio of person %d.\nSecond line.  ' % i,
+            'tags': ['operations'],
+            'order': 100,
+        }
+        if i % 4 == 0:
+            people['p%d' % i]['roster_note'] = 'Note %d' % i
+        lectures['L%05d' % i] = {
+            'title': 'Lecture %d' % i,
+            'ready': i % 2 == 0,
+            'presenters': ['p%d' % j for j in range(i % 3)],
+            'vimeo': ['https://vimeo.com/%d' % (1000 + j) for j in range(i % 3)],
+            'files': [{'desc': 'File %d' % j, 'url': 'https://dropbox.com/%d' % j}
+                      for j in range(i % 4)],
+        }
+        documents.append({
+            'id': 'doc%d' % i,
+            'title': '' if i % 6 == 0 else 'Document %d' % i,
+            'desc': None if i % 5 == 0 else 'Description\nof document %d' % i,
+            'tags': 'paper' if i % 9 == 0 else ['setup'],
+            'google_docs_share_link': 'https://docs.google.com/document/d/%d/edit?usp=sharing' % i,
+        })
+        outreach.append({
+            'id': 'o%d' % i,
+            'institution': 'Institution %d' % i,
+            'institution_url': None if i % 2 else 'http://inst%d.edu' % i,
+            'project_url': None if i % 3 else 'http://proj%d.edu' % i,
+            'title': None if i % 8 == 0 else 'Project %d' % i,
+            'desc': None if i % 4 == 0 else 'Desc %d\nmore' % i,
+            'tags': ['graduate'],
+        })
+    return people, lectures, documents, outreach
+
+
+def compare(name, legacy, new, number):
+    assert legacy() == new(), 'Different output for %s' % name
+    t_legacy = min(timeit.repeat(legacy, number=number, repeat=3))
+    t_new = min(timeit.repeat(new, number=number, repeat=3))
+    logger.info('%-10s legacy %8.2f ms  compiled %8.2f ms  (legacy/compiled %.1fx)' %
+                (name, t_legacy * 1000, t_new * 1000, t_legacy / t_new))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    # no log I/O in the timings (Photos warns about every missing photo)
+    for m in [generate_documents, generate_lectures, generate_outreach, generate_roster]:
+        m.logger.setLevel(logging.ERROR)
+    people, lectures, documents, outreach = make_records(n)
+    links = generate_lectures.generate_presenter_links(people)
+    context = generate_lectures.Context()
+    # one for the whole roster, as in generate_roster.go()
+    photos = generate_roster.Photos()
+
+    compare('lecture',
+            lambda: [legacy_generate_lecture(l, links) for l in lectures.values()],
+            lambda: [generate_lectures.generate_lecture(k, l, links, context)
+                     for k, l in lectures.items()],
+            number=1)
+
+    compare('person',
+            lambda: [legacy_generate_person(k, p) for k, p in people.items()],
+            lambda: [generate_roster.generate_person(k, p, photos) for k, p in people.items()],
+            number=1)
+
+    compare('document',
+            lambda: legacy_generate_documents(documents, ['setup', 'paper']),
+            lambda: generate_documents.generate_html_tag(documents, ['setup', 'paper']),
+            number=1)
+
+    compare('outreach',
+            lambda: legacy_generate_outreaches(outreach, ['graduate']),
+            lambda: generate_outreach.generate_html_tag(outreach, ['graduate']),
+            number=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+"""
+    Command-line helpers shared by the scripts.
+"""
+
+__all__ = ['UsageError', 'split_options']
+
+
+class UsageError(Exception):
+    pass
+
+
+def split_options(args, known):
+    """ Separates the "--name=value" (or "--name") options from the
+        positional arguments. """
+    positional = []
+    options = {}
+    for a in args:
+        if not a.startswith('--'):
+            positional.append(a)
+            continue
+        name, _, value = a[2:].partition('=')
+        if not name in known:
+            msg = 'Unknown option %r; known: %s' % (a, ", ".join(known))
+            raise UsageError(msg)
+        options[name] = value
+    return positional, options
@@ -0,0 +1,179 @@
+"""
+    Cohort-sharded people DB: each subdirectory db/<cohort>/ with YAML
+    files is a shard, loaded independently of the others.
+
+        cohorts = read_cohorts('db', context)   # cohort -> handle -> person
+        index = HandleIndex(cohorts)
+        index['2016-MIT/carlone']
+        index.resolve('carlone')                # if the handle is unique
+
+    The shards are parsed concurrently (one process per shard, up to
+    --jobs) and normalized in this process, with the diagnostics paths
+    prefixed by the cohort name. Selecting some cohorts (--cohort=A,B)
+    only reads those directories, so adding a cohort does not slow down
+    the builds of the others.
+"""
+from collections import OrderedDict
+import glob
+import logging
+import os
+
+from people import MyExc, normalize_person, read_yaml_dict
+from records import Person
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['is_cohort_db', 'discover_cohorts', 'read_cohorts', 'HandleIndex',
+           'with_bare_handles']
+
+SEP = '/'
+
+
+def is_cohort_db(filename):
+    """ True if filename is a directory of cohorts (db/), rather than a
+        glob or a snapshot. """
+    return os.path.isdir(filename)
+
+
+def discover_cohorts(db_dir):
+    """ Returns the sorted names of the subdirectories with YAML files. """
+    if not os.path.isdir(db_dir):
+        msg = 'Could not find directory %r.' % db_dir
+        raise MyExc(msg)
+    res = []
+    for name in sorted(os.listdir(db_dir)):
+        d = os.path.join(db_dir, name)
+        if os.path.isdir(d) and glob.glob(os.path.join(d, '*.yaml')):
+            res.append(name)
+    return res
+
+
+def load_cohort(db_dir, cohort):
+    """ Parses one shard; returns a sorted list of (handle, raw record).
+        Runs in the worker processes. """
+    res = []
+    for filename in sorted(glob.glob(os.path.join(db_dir, cohort, '*.yaml'))):
+        handle = os.path.splitext(os.path.basename(filename))[0]
+        if SEP in handle:
+            msg = 'Invalid handle %r in %r.' % (handle, filename)
+            raise MyExc(msg)
+        res.append((handle, read_yaml_dict(filename)))
+    return res
+
+
+def _load_cohort_star(args):
+    return load_cohort(*args)
+
+
+def read_cohorts(db_dir, context, cohorts=None, jobs=None):
+    """ Returns an OrderedDict cohort -> handle -> normalized person.
+
+        cohorts: names to load (default: all of them).
+        jobs: number of processes (default: one per shard, up to the CPUs). """
+    available = discover_cohorts(db_dir)
+    if cohorts is None:
+        cohorts = available
+    for c in cohorts:
+        if not c in available:
+            msg = 'Unknown cohort %r; available: %s' % (c, ", ".join(available))
+            raise MyExc(msg)
+
+    tasks = [(db_dir, c) for c in cohorts]
+    if jobs is None:
+        jobs = min(len(tasks), _cpu_count())
+    if jobs > 1 and len(tasks) > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(jobs)
+        try:
+            shards = pool.map(_load_cohort_star, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        shards = [load_cohort(*t) for t in tasks]
+
+    res = OrderedDict()
+    for cohort, records in zip(cohorts, shards):
+        logger.info('%s: %d people', cohort, len(records))
+        people = res[cohort] = {}
+        with context.sub(cohort):
+            for handle, value in records:
+                people[handle] = Person.from_dict(normalize_person(handle, value, context))
+    return res
+
+
+def _cpu_count():
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except (ImportError, NotImplementedError):
+        return 1
+
+
+class HandleIndex(object):
+    """ Namespaced index of the people: "cohort/handle" -> person.
+
+        A bare handle resolves if only one cohort has it. """
+
+    def __init__(self, cohorts):
+        self.people = {}
+        # bare handle -> list of cohorts having it
+        self.cohorts_of = {}
+        for cohort, people in cohorts.items():
+            for handle, person in people.items():
+                self.people[cohort + SEP + handle] = person
+                self.cohorts_of.setdefault(handle, []).append(cohort)
+
+    def __getitem__(self, key):
+        return self.people[key]
+
+    def __contains__(self, key):
+        return key in self.people
+
+    def __len__(self):
+        return len(self.people)
+
+    def resolve(self, handle, cohort=None):
+        """ Returns the namespaced key for handle, which may be bare or
+            "cohort/handle"; cohort is the default namespace for bare
+            handles. Raises KeyError if unknown or ambiguous. """
+        if SEP in handle:
+            if not handle in self.people:
+                raise KeyError(handle)
+            return handle
+        if cohort is not None and cohort + SEP + handle in self.people:
+            return cohort + SEP + handle
+        found = self.cohorts_of.get(handle, [])
+        if len(found) != 1:
+            raise KeyError(handle)
+        return found[0] + SEP + handle
+
+    def flat(self):
+        """ handle -> person, with both the namespaced keys and the bare
+            handles that are unique across the cohorts. """
+        res = dict(self.people)
+        for handle, found in self.cohorts_of.items():
+            if len(found) == 1:
+                res[handle] = self.people[found[0] + SEP + handle]
+        return res
+
+
+def with_bare_handles(people):
+    """ For people keyed by "cohort/handle" (a snapshot of several
+        cohorts), adds the bare handles that are unique, as
+        HandleIndex.flat(); other dicts are returned as they are. """
+    shards = OrderedDict()
+    for key in sorted(people):
+        cohort, handle = split_key(key)
+        if cohort is None:
+            return people
+        shards.setdefault(cohort, {})[handle] = people[key]
+    return HandleIndex(shards).flat()
+
+
+def split_key(key):
+    """ "cohort/handle" -> (cohort, handle); (None, key) if not namespaced. """
+    if SEP in key:
+        cohort, handle = key.split(SEP, 1)
+        return cohort, handle
+    return None, key
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+"""
+    Precompressed sidecars for the generated artifacts, so that the web
+    server can send them without compressing on every request:
+
+        lectures.html -> lectures.html.gz, lectures.html.br, lectures.html.zst
+
+    gz is always available; br and zst need the brotli and zstandard
+    modules, and are skipped with a warning otherwise. The scripts write
+    the sidecars of their outputs with --compress=gz,br (see outputs.py);
+    other files can be compressed with:
+
+        python src/compress.py --compress=gz,br joined.pdf ...
+
+    A sidecar is only regenerated when the artifact changed: with a build
+    manifest, the sha256 of the artifact it was made from is recorded;
+    otherwise it is regenerated if it is older than the artifact. When an
+    output of the scripts is rewritten, the sidecars in the formats that
+    are no longer asked for are deleted. The sidecars of one artifact (and
+    of the files given on the command line) are compressed in parallel;
+    zlib and the other compressors release the GIL, so threads are enough.
+
+    The .gz files have no timestamp in the header, so the same artifact
+    always gives the same bytes.
+"""
+import gzip
+import io
+import logging
+import os
+import sys
+
+from cli import UsageError, split_options
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['FORMATS', 'parse_formats', 'update_sidecars', 'remove_sidecars']
+
+FORMATS = ['gz', 'br', 'zst']
+
+
+def compress_gz(data):
+    buf = io.BytesIO()
+    f = gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=9, mtime=0)
+    try:
+        f.write(data)
+    finally:
+        f.close()
+    return buf.getvalue()
+
+
+def compress_br(data):
+    import brotli
+    return brotli.compress(data)
+
+
+def compress_zst(data):
+    import zstandard
+    return zstandard.ZstdCompressor(level=19).compress(data)
+
+
+COMPRESSORS = {'gz': compress_gz, 'br': compress_br, 'zst': compress_zst}
+MODULES = {'br': 'brotli', 'zst': 'zstandard'}
+
+# formats for which we already warned
+_skipped = set()
+
+
+def is_available(fmt):
+    if not fmt in MODULES:
+        return True
+    try:
+        __import__(MODULES[fmt])
+    except ImportError:
+        return False
+    return True
+
+
+def parse_formats(spec):
+    """ "gz,br" -> ['gz', 'br'], without the formats whose module is not
+        installed. Raises UsageError for unknown formats. """
+    res = []
+    for fmt in spec.split(','):
+        fmt = fmt.strip()
+        if not fmt:
+            continue
+        if not fmt in FORMATS:
+            msg = 'Unknown compression %r; known: %s' % (fmt, ", ".join(FORMATS))
+            raise UsageError(msg)
+        if not is_available(fmt):
+            if not fmt in _skipped:
+                _skipped.add(fmt)
+                logger.warning('Skipping %s: module %r not installed.', fmt, MODULES[fmt])
+            continue
+        if not fmt in res:
+            res.append(fmt)
+    return res
+
+
+def sidecar_name(filename, fmt):
+    return filename + '.' + fmt
+
+
+def is_fresh(filename, fmt, digest, previous):
+    """ previous: fmt -> sha256 of the artifact the sidecar was made from,
+        from the manifest, or None if there is no manifest. """
+    sidecar = sidecar_name(filename, fmt)
+    if not os.path.exists(sidecar):
+        return False
+    if previous is not None:
+        return previous.get(fmt) == digest
+    return os.path.getmtime(sidecar) >= os.path.getmtime(filename)
+
+
+def _make_sidecar(args):
+    from outputs import atomic_write
+    filename, fmt, data = args
+    atomic_write(sidecar_name(filename, fmt), COMPRESSORS[fmt](data))
+    return filename, fmt
+
+
+def update_sidecars(artifacts, formats, jobs=None):
+    """ artifacts: list of (filename, sha256, previous) (see is_fresh()).
+        Regenerates the stale sidecars in parallel; returns a dict
+        filename -> {fmt: sha256} describing the sidecars now on disk. """
+    res = {}
+    tasks = []
+    for filename, digest, previous in artifacts:
+        res[filename] = {}
+        data = None
+        for fmt in formats:
+            res[filename][fmt] = digest
+            if is_fresh(filename, fmt, digest, previous):
+                continue
+            if data is None:
+                with open(filename, 'rb') as f:
+                    data = f.read()
+            tasks.append((filename, fmt, data))
+
+    if len(tasks) > 1 and jobs != 1:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(min(len(tasks), jobs or _cpu_count()))
+        try:
+            done = pool.map(_make_sidecar, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        done = [_make_sidecar(t) for t in tasks]
+
+    for filename, fmt in done:
+        logger.info('%s: updated', sidecar_name(filename, fmt))
+    return res
+
+
+def remove_sidecars(filename, keep=()):
+    """ Deletes the sidecars of filename in the formats not in keep, which
+        would be served with the previous contents once it is rewritten. """
+    for fmt in FORMATS:
+        sidecar = sidecar_name(filename, fmt)
+        if not fmt in keep and os.path.exists(sidecar):
+            os.remove(sidecar)
+            logger.info('%s: removed', sidecar)
+
+
+def _cpu_count():
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except (ImportError, NotImplementedError):
+        return 1
+
+
+def main():
+    from logs import setup_logging
+    setup_logging()
+    try:
+        args, options = split_options(sys.argv[1:], ['compress', 'jobs'])
+        if not args:
+            msg = 'Usage: compress.py --compress=gz,br,zst FILE...'
+            raise UsageError(msg)
+        formats = parse_formats(options.get('compress') or 'gz')
+        jobs = int(options['jobs']) if options.get('jobs') else None
+        artifacts = [(f, None, None) for f in args]
+        update_sidecars(artifacts, formats, jobs)
+    except (UsageError, ValueError, IOError) as e:
+        logger.error(e)
+        sys.exit(-2)
+
+
+if __name__ == '__main__':
+    main()
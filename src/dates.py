@@ -0,0 +1,108 @@
+"""
+    Date normalization for the lecture DB.
+
+    Our dates are almost always written in one of a few fixed formats
+    ("Feb 3, 2016", "February 3, 2016", "2016-02-03"), so we try those
+    with precompiled patterns first and only fall back to the general
+    (and slow) dateutil parser when nothing matches.
+
+    Results are memoized per distinct string.
+"""
+from datetime import datetime
+import re
+
+try:
+    string_types = basestring
+except NameError:  # Python 3
+    string_types = str
+
+__all__ = ['parse_date', 'get_date_stats', 'reset_date_cache']
+
+MONTHS = {}
+for i, month in enumerate(['january', 'february', 'march', 'april', 'may', 'june',
+                           'july', 'august', 'september', 'october', 'november',
+                           'december']):
+    MONTHS[month] = i + 1
+    MONTHS[month[:3]] = i + 1
+MONTHS['sept'] = 9
+
+# "Feb 3, 2016", "February 3 2016", "Feb. 3, 2016"
+re_month_day_year = re.compile(r'^\s*([A-Za-z]{3,9})\.?\s+(\d{1,2}),?\s+(\d{4})\s*$')
+# "2016-02-03", "2016-02-03T10:30", "2016-02-03 10:30:00" (no timezone)
+re_iso = re.compile(r'^\s*(\d{4})-(\d{2})-(\d{2})'
+                    r'(?:[T ](\d{2}):(\d{2})(?::(\d{2}))?)?\s*$')
+
+_cache = {}
+_stats = {'calls': 0, 'cached': 0, 'known': 0, 'iso': 0, 'fallback': 0}
+
+
+def parse_date(v):
+    """
+        Parses the date string v into a datetime.
+
+        Raises ValueError (like dateutil) if the date cannot be parsed.
+    """
+    _stats['calls'] += 1
+    try:
+        res = _cache[v]
+    except KeyError:
+        pass
+    except TypeError:
+        # unhashable; let dateutil complain about it
+        return _parse_fallback(v)
+    else:
+        _stats['cached'] += 1
+        return res
+
+    res = _parse_fast(v)
+    if res is None:
+        res = _parse_fallback(v)
+    _cache[v] = res
+    return res
+
+
+def _parse_fast(v):
+    """ Returns None if v is not in one of the known formats. """
+    if not isinstance(v, string_types):
+        return None
+
+    m = re_month_day_year.match(v)
+    if m is not None:
+        month = MONTHS.get(m.group(1).lower())
+        if month is not None:
+            try:
+                res = datetime(int(m.group(3)), month, int(m.group(2)))
+            except ValueError:
+                return None
+            _stats['known'] += 1
+            return res
+
+    m = re_iso.match(v)
+    if m is not None:
+        year, month, day, hour, minute, second = m.groups()
+        try:
+            res = datetime(int(year), int(month), int(day),
+                           int(hour or 0), int(minute or 0), int(second or 0))
+        except ValueError:
+            return None
+        _stats['iso'] += 1
+        return res
+
+    return None
+
+
+def _parse_fallback(v):
+    from dateutil import parser
+    _stats['fallback'] += 1
+    return parser.parse(v)
+
+
+def get_date_stats():
+    """ Returns a copy of the counters (calls, cached, known, iso, fallback). """
+    return dict(_stats)
+
+
+def reset_date_cache():
+    _cache.clear()
+    for k in _stats:
+        _stats[k] = 0
@@ -0,0 +1,156 @@
+"""
+    Structured storage for warnings and errors.
+
+    Each problem is recorded as (path, code, format, args); the message is
+    only formatted when a report is produced (the mutable args are copied
+    as text when the problem is recorded). Problems are grouped by code:
+    all of them are counted, but only the first max_examples of each code
+    are kept.
+"""
+from contextlib import contextmanager
+import json
+import logging
+
+__all__ = ['Diagnostics', 'Context']
+
+logger = logging.getLogger(__name__)
+
+
+class Diagnostics(object):
+
+    def __init__(self, max_examples=10):
+        self.max_examples = max_examples
+        # code -> number of occurrences
+        self.counts = {}
+        # code -> list of (path, format, args), in order of arrival
+        self.examples = {}
+        # codes in order of first occurrence
+        self.codes = []
+        self.total = 0
+
+    def __len__(self):
+        return self.total
+
+    def __bool__(self):
+        return self.total > 0
+
+    __nonzero__ = __bool__
+
+    def add(self, path, code, fmt, args=()):
+        self.total += 1
+        try:
+            self.counts[code] += 1
+        except KeyError:
+            self.counts[code] = 1
+            self.examples[code] = []
+            self.codes.append(code)
+        examples = self.examples[code]
+        if len(examples) < self.max_examples:
+            examples.append((path, fmt, tuple(_snapshot(a) for a in args)))
+
+    def __iter__(self):
+        """ Yields the formatted messages that were kept. """
+        for code in self.codes:
+            for path, fmt, args in self.examples[code]:
+                yield format_message(path, fmt, args)
+
+    def format_report(self, title):
+        lines = [title]
+        for code in self.codes:
+            lines.extend(format_message(path, fmt, args)
+                         for path, fmt, args in self.examples[code])
+            skipped = self.counts[code] - len(self.examples[code])
+            if skipped > 0:
+                lines.append('(... and %d more %r)' % (skipped, code))
+        return "\n".join(lines)
+
+    def as_dict(self):
+        res = {}
+        for code in self.codes:
+            res[code] = {
+                'count': self.counts[code],
+                'examples': [{'path': list(path),
+                              'message': _format(fmt, args)}
+                             for path, fmt, args in self.examples[code]],
+            }
+        return res
+
+    def as_json(self):
+        return json.dumps(self.as_dict(), indent=2, sort_keys=True)
+
+
+class Context(object):
+    """ Collects the warnings and errors, with the current path (stack). """
+
+    # raised by bail(); scripts override it with their own exception
+    exception = Exception
+
+    def __init__(self, max_examples=10):
+        self.warnings = Diagnostics(max_examples)
+        self.errors = Diagnostics(max_examples)
+        self.stack = []
+
+    def warn(self, s, args=(), code=None):
+        """ s is formatted with args only if the warning is reported;
+            code defaults to s. """
+        self.warnings.add(tuple(self.stack), code or s, s, args)
+
+    def error(self, s, args=(), code=None):
+        self.errors.add(tuple(self.stack), code or s, s, args)
+
+    @contextmanager
+    def sub(self, w):
+        self.stack.append(w)
+        yield
+        self.stack.pop(-1)
+
+    def get_warnings(self):
+        return self.warnings.format_report("Please fix the following problems:")
+
+    def get_errors(self):
+        return self.errors.format_report("You need to fix the following problems:")
+
+    def as_json(self):
+        return json.dumps({'warnings': self.warnings.as_dict(),
+                           'errors': self.errors.as_dict()},
+                          indent=2, sort_keys=True)
+
+    def bail(self):
+        if self.errors:
+            logger.error(self.get_errors())
+            msg = 'Errors in the input.'
+            raise self.exception(msg)
+
+
+class _Snapshot(object):
+    """ The str() and repr() of a mutable argument at the time the problem
+        was added; the record may be normalized further afterwards. """
+    __slots__ = ('s', 'r')
+
+    def __init__(self, value):
+        self.s = '%s' % (value,)
+        self.r = repr(value)
+
+    def __str__(self):
+        return self.s
+
+    def __repr__(self):
+        return self.r
+
+
+_IMMUTABLE = (type(None), bool, int, float, type(''), type(u''), bytes)
+
+
+def _snapshot(value):
+    """ Only the kept examples are snapshotted, so this is bounded. """
+    if isinstance(value, _IMMUTABLE):
+        return value
+    return _Snapshot(value)
+
+
+def _format(fmt, args):
+    return fmt % args if args else fmt
+
+
+def format_message(path, fmt, args):
+    return ":".join(path) + ':' + _format(fmt, args)
@@ -1,19 +1,26 @@
 #!/usr/bin/env python
-from contextlib import contextmanager
-from dateutil import parser
 import logging
-import os
-import platform
 import sys
-import yaml
-logging.basicConfig()
+import diagnostics
+import ingest
+from cli import UsageError, split_options
+import logs
+import minify
+import outputs
+from logs import setup_logging, configure_logging
+from records import Document
+from schema import Field, compile_schema, string_types
+from templates import compile_template
+import timings
+from timings import stage, timed
 logger = logging.getLogger(__name__)
 
 def read_file(fn):
     with open(fn) as f:
         return f.read()
 
-head = read_file('05_materials.begin').strip()
+def read_head():
+    return read_file('05_materials.begin').strip()
 
 tail = """
 
@@ -22,17 +29,23 @@ tail = """
 class MyExc(Exception):
     pass
 
+class Context(diagnostics.Context):
+    exception = MyExc
+
 def main():
+    setup_logging()
     try:
-
-        documents_data = sys.stdin.read()
-        documents = yaml.load(documents_data)
-
-        print(head)
-        generate_html(documents)
-        print(tail)
-
-    except MyExc as e:
+        _, options = split_options(sys.argv[1:], timings.OPTIONS + logs.OPTIONS +
+                                   outputs.OPTIONS + minify.OPTIONS + ingest.OPTIONS)
+        configure_logging(options)
+        fmt = ingest.stream_format(options)
+        with timings.instrumented(options), outputs.output_to(options):
+            if fmt is None:
+                go()
+            else:
+                go_stream(fmt)
+
+    except (MyExc, UsageError) as e:
         logger.error(e)
         sys.exit(-2)
     except Exception as e:
@@ -40,49 +53,65 @@ def main():
         logger.error(traceback.format_exc(e))
         sys.exit(-1)
 
-def generate_html(documents):
-
-
-
-    print("""
-
-## Basic Setup Documents
-
-    """)
-
-    print(generate_html_tag(documents, ['setup']))
-
-    print("""
-
-## Procedures and HOWTos
-
-    """)
-
-    print(generate_html_tag(documents, ['procedure+howto']))
-
-    print("""
+def go():
+    import yaml
 
-## The Design of Duckietown
-
-    """)
-
-    print(generate_html_tag(documents, ['design']))
+    with stage('parse'):
+        documents_data = sys.stdin.read()
+        documents = yaml.load(documents_data)
 
+    context = Context()
+    with stage('normalize'):
+        normalize_documents(documents, context)
+    if context.warnings:
+        logger.warning(context.get_warnings())
+    context.bail()
+
+    generate_page(documents)
+
+def go_stream(fmt):
+    """ Renders the documents as they are read from stdin (see ingest.py). """
+    context = Context()
+    print(read_head())
+    sys.stdout.flush()
+    sections = SectionBuffer()
+    records = ingest.iter_records(sys.stdin, fmt, MyExc)
+    for i, d in enumerate(records):
+        d = normalize_entry(i, d, context)
+        context.bail()
+        sections.add(d)
+    if context.warnings:
+        logger.warning(context.get_warnings())
+    sections.generate_html()
+    print(tail)
+
+def generate_page(documents):
+    print(read_head())
+    generate_html(documents)
+    print(tail)
+
+# (heading, tags) of the sections, in order
+SECTIONS = [
+    ('Basic Setup Documents', ['setup']),
+    ('Procedures and HOWTos', ['procedure+howto']),
+    ('The Design of Duckietown', ['design']),
+    ('Spring 2016: Documents Specific to MIT 2.166 Students', ['spring2016', 'modules+labs']),
+    ('Publications', "paper"),
+]
+
+def print_section(heading, html):
     print("""
 
-## Spring 2016: Documents Specific to MIT 2.166 Students
-
-    """)
+## %s
 
-    print(generate_html_tag(documents, ['spring2016', 'modules+labs']))
+    """ % heading)
 
-    print("""
-
-## Publications
+    print(html)
 
-    """)
+def generate_html(documents):
 
-    print(generate_html_tag(documents, "paper"))
+    for heading, tags in SECTIONS:
+        print_section(heading, generate_html_tag(documents, tags))
 
 
     if False:
@@ -94,6 +123,56 @@ def generate_html(documents):
 
         print(generate_html_tag(documents, None))
 
+class SectionBuffer(object):
+    """ The sections of generate_html(), filled one document at a time;
+        keeps only the rendered HTML. """
+
+    def __init__(self):
+        self.fragments = [[] for _ in SECTIONS]
+
+    def add(self, d):
+        for (_, tags), fragments in zip(SECTIONS, self.fragments):
+            if select_document(d, tags):
+                fragments.append(generate_document(d))
+
+    def generate_html(self):
+        for (heading, tags), fragments in zip(SECTIONS, self.fragments):
+            logger.info('tags_to_include %r: selected %d', tags, len(fragments))
+            print_section(heading, "".join(fragments))
+
+def normalize_link(v, context):  # @UnusedVariable
+    if not isinstance(v, string_types):
+        msg = 'Expected a link, got %r' % v
+        raise MyExc(msg)
+    return v
+
+def normalize_tags(v, context):  # @UnusedVariable
+    if v is None or isinstance(v, (string_types, list)):
+        return v
+    msg = 'Expected a tag or a list of tags, got %r' % v
+    raise MyExc(msg)
+
+normalize_document = compile_schema([
+    Field('google_docs_share_link', normalize_link),
+    Field('id', optional=True),
+    Field('title', optional=True),
+    Field('desc', optional=True),
+    Field('tags', normalize_tags, optional=True),
+], catch=MyExc)
+
+def normalize_documents(documents, context):
+    if not isinstance(documents, list):
+        msg = 'Expected a list of documents, got %r' % type(documents)
+        raise MyExc(msg)
+    for i, d in enumerate(documents):
+        documents[i] = normalize_entry(i, d, context)
+    return documents
+
+def normalize_entry(i, d, context):
+    """ Normalizes the i-th document. """
+    id_document = d.get('id') if isinstance(d, dict) else None
+    return Document.from_dict(normalize_document(str(id_document or i), d, context))
+
 def icon_pdf():
     return "<img class='icon' src='media/pdf.gif'/>"
 
@@ -125,82 +204,59 @@ def get_id(d):
 
     return s
 
+DOCUMENT_TEMPLATE = compile_template(
+    '\n\n'
+    '<p id="{id_document}" class="{classes}">'
+    '<a class="title" href="{google_docs_share_link}">' + icon_gdoc() + '{title}</a> '
+    '{if has_pdf}'
+    '<span class="pdflink">(<a href="{pdf_url}">' + icon_pdf() + ' static pdf</a>)</span>'
+    '{end}'
+    ': {desc}</p>'
+    '\n\n')
+
+def select_document(d, tags_to_include):
+    tags = d.get('tags', [])
+    if tags is None:
+        tags = []
+    if tags_to_include is None:
+        return len(tags) == 0
+    return any([_ in tags for _ in tags_to_include])
+
+@timed('generate_html_tag')
 def generate_html_tag(documents, tags_to_include):
 
-    def select(d):
-        tags = d.get('tags', [])
-        if tags is None:
-            tags = []
-        if tags_to_include is None:
-            return len(tags) == 0
-        return any([_ in tags for _ in tags_to_include])
-
-    selected = [d for d in documents if select(d)]
-
-    logger.info('tags_to_include %r: selected %d' % (tags_to_include, len(selected)))
-    s = ""
-    for d in selected:
-        id_document = d.get('id')
-        title = d.get('title', '')
-        classes = []
-        if not title:
-            title = 'Missing title'
-            classes.append('missing')
-
-        google_docs_share_link = d['google_docs_share_link']
-
-        s += '\n\n'
-        desc = d.get('desc', '')
-        if not desc:
-            desc = ''
-        if not desc:
-            desc = '<span class="missing">Missing description</span>'
-#             classes.append('missing')
-        desc = desc.strip()
-        desc = desc.replace('\n', ' ')
-
-        if (d['tags'] != "paper"):
-            pdf_link = '<span class="pdflink">(<a href="%s">%s static pdf</a>)</span>' % (url_pdf(d), icon_pdf())
-        else:
-            pdf_link = ''
-        s += ('<p id="%s" class="%s"><a class="title" href="%s">%s%s</a> %s: ' %
-              (id_document, " ".join(classes), google_docs_share_link, icon_gdoc(), title, pdf_link))
-
-        s += desc
-
-
-        s += '</p>'
-
-
-        s += '\n\n'
-    return s
+    selected = [d for d in documents if select_document(d, tags_to_include)]
+
+    logger.info('tags_to_include %r: selected %d', tags_to_include, len(selected))
+    return "".join(generate_document(d) for d in selected)
+
+def generate_document(d):
+    id_document = d.get('id')
+    title = d.get('title', '')
+    classes = []
+    if not title:
+        title = 'Missing title'
+        classes.append('missing')
+
+    desc = d.get('desc', '')
+    if not desc:
+        desc = ''
+    if not desc:
+        desc = '<span class="missing">Missing description</span>'
+#         classes.append('missing')
+    desc = desc.strip()
+    desc = desc.replace('\n', ' ')
+
+    has_pdf = d['tags'] != "paper"
+    return DOCUMENT_TEMPLATE(id_document=id_document,
+                             classes=" ".join(classes),
+                             google_docs_share_link=d['google_docs_share_link'],
+                             title=title,
+                             has_pdf=has_pdf,
+                             pdf_url=url_pdf(d) if has_pdf else None,
+                             desc=desc)
 
 
-logger.setLevel(logging.DEBUG)
-def add_coloring_to_emit_ansi(fn):
-    # add methods we need to the class
-    def new(*args):
-        levelno = args[1].levelno
-        if(levelno >= 50):
-            color = '\x1b[31m'  # red
-        elif(levelno >= 40):
-            color = '\x1b[31m'  # red
-        elif(levelno >= 30):
-            color = '\x1b[33m'  # yellow
-        elif(levelno >= 20):
-            color = '\x1b[32m'  # green
-        elif(levelno >= 10):
-            color = '\x1b[35m'  # pink
-        else:
-            color = '\x1b[0m'  # normal
-
-        args[1].msg = color + str(args[1].msg) + '\x1b[0m'  # normal
-        return fn(*args)
-    return new
-
-if platform.system() != 'Windows':
-    emit2 = add_coloring_to_emit_ansi(logging.StreamHandler.emit)
-    logging.StreamHandler.emit = emit2
 
 
 
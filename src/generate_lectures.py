@@ -1,19 +1,28 @@
 #!/usr/bin/env python
-from dateutil import parser
 import logging
-import os
-import yaml
-from contextlib import contextmanager
-logging.basicConfig()
+import sys
+from cli import UsageError, split_options
+from cohorts import HandleIndex, is_cohort_db, read_cohorts, split_key, with_bare_handles
+from dates import parse_date, get_date_stats
+import logs
+import minify
+import outputs
+from logs import setup_logging, configure_logging, summarize
+from people import (MyExc, Context, read_people, read_yaml_dict, normalize_string,
+                    normalize_url, write_diagnostics)
+from records import Lecture, LectureFile
+from schema import Field, compile_schema
+from templates import compile_template
+import timings
+from timings import stage
 logger = logging.getLogger(__name__)
 
-class MyExc(Exception):
-    pass
-
 def main():
+    setup_logging()
     try:
-        import sys
-        args = sys.argv[1:]
+        args, options = split_options(sys.argv[1:],
+                                      ['diagnostics-json'] + timings.OPTIONS +
+                                      logs.OPTIONS + outputs.OPTIONS + minify.OPTIONS)
         if len(args) != 2:
             msg = 'Expected two arguments, got %r.' % args
             
@@ -22,10 +31,15 @@ def main():
         people_filename = args[0]
         lectures_filename = args[1]
         
-        res = go(people_filename, lectures_filename)
-        print(res)
+        configure_logging(options)
+        
+        with outputs.output_to(options):
+            with timings.instrumented(options):
+                res = go(people_filename, lectures_filename,
+                         diagnostics_json=options.get('diagnostics-json'))
+            print(res)
 
-    except MyExc as e:
+    except (MyExc, UsageError) as e:
         logger.error(e)
         sys.exit(-2)
     except Exception as e:
@@ -34,28 +48,45 @@ def main():
         sys.exit(-1)
 
 
-def go(people_filename, lectures_filename):
+def go(people_filename, lectures_filename, diagnostics_json=None):
     
     context = Context()
+    try:
+        with stage('read_people'):
+            if is_cohort_db(people_filename):
+                # presenters are "cohort/handle", or just the handle if unique
+                people_contents = HandleIndex(read_cohorts(people_filename, context)).flat()
+            else:
+                people_contents = with_bare_handles(read_people(people_filename, context))
+        
+        logger.info('people: %s', summarize(people_contents))
+        
+        with stage('read_lectures'):
+            lectures_contents = read_lectures(lectures_filename, context)
+        
+        logger.info('lectures: %s', summarize(lectures_contents))
 
-    people_contents = read_people(people_filename, context)
-    
-    
-    logger.info('people: %s' % people_contents)
-    
-    lectures_contents = read_lectures(lectures_filename, context)
-    
-    logger.info('lectures: %s' % lectures_contents)
-    
-    context.bail()
-    
-    res = generate(lectures_contents, people_contents, context)
-    
-    context.bail()
+        stats = get_date_stats()
+        logger.info('dates: %d parsed, %d cached, %d needed the dateutil fallback',
+                    stats['calls'], stats['cached'], stats['fallback'])
+        
+        context.bail()
+        
+        with stage('generate'):
+            res = generate(lectures_contents, people_contents, context)
+        
+        context.bail()
+    finally:
+        if diagnostics_json is not None:
+            write_diagnostics(context, diagnostics_json)
     
     if context.warnings:
         logger.warning(context.get_warnings())
 
+    return lectures_page(res)
+
+
+def lectures_page(res):
     head = """---
 layout: page
 title: Lectures
@@ -80,185 +111,104 @@ permalink: lectures.html
 """
     return head + res + foot
 
-class Context():
-
-    def __init__(self):
-        self.warnings = []
-        self.errors = []
-        self.stack = []
-
-    def _convert(self, s):
-        return ":".join(self.stack)+':'+ s
-        
-    def warn(self, s):
-        self.warnings.append(self._convert(s))
-    
-    def error(self, s):
-        self.errors.append(self._convert(s))
-    
-    @contextmanager 
-    def sub(self, w):
-        self.stack.append(w)
-        yield
-        self.stack.pop(-1)
-        
-    def get_warnings(self):
-        s = "Please fix the following problems:"
-        for w in self.warnings:
-            s += "\n" + w
-        return s
-
-    def get_errors(self):
-        s = "You need to fix the following problems:"
-        for w in self.errors:
-            s += "\n" + w
-        return s
-    
-    def bail(self):
-        if self.errors:
-            logger.error(self.get_errors())
-            msg = 'Errors in the input.'
-            raise MyExc(msg)
-        
-
-    
-def generate_vimeo(url, context):  # @UnusedVariable
-
-    id_video = url.split('/')[-1]
-    newurl = 'https://player.vimeo.com/video/%s' % id_video
-    s = """\n
-<iframe src="IFRAME" 
+VIMEO_IFRAME = """\n
+<iframe src="https://player.vimeo.com/video/{id_video}" 
         width="400" height="281" frameborder="0" 
         webkitallowfullscreen mozallowfullscreen allowfullscreen></iframe>
 """
 
-    s = s.replace("IFRAME", newurl)
-
-    return s
-
-def generate_lecture(id_lecture, lecture, people, context):
-    s = "\n\n"
-    title = lecture['title']
-
-
-    #s += '<h2><span class="lecture_id">%s:</span> %s </h2>\n\n' % (id_lecture, title)
-    s += '<h2> %s </h2>\n\n' % ( title)
-
-    if not lecture['ready']:
-        s += '<p class="notready">This lecture is not ready for publishing yet; files are missing,'
-        s += ' or the videos are not edited.</p>'
-
+LECTURE_TEMPLATE = compile_template(
+    '\n\n'
+    #'<h2><span class="lecture_id">{id_lecture}:</span> {title} </h2>\n\n'
+    '<h2> {title} </h2>\n\n'
+    '{if not ready}'
+    '<p class="notready">This lecture is not ready for publishing yet; files are missing,'
+    ' or the videos are not edited.</p>'
+    '{end}'
+    '{if presenters}'
+    '<p>Presenters: {presenters}</p>\n\n'
+    '{else}'
+    '<p class="incomplete">(No presenters specified.)</p>\n\n'
+    '{end}'
+    '{if not vimeo}'
+    '<p class="incomplete">(Video not available yet.)</p>\n\n'
+    '{end}'
+    '<table><tr>\n'
+    '{for id_video in vimeo}   <td>' + VIMEO_IFRAME + '</td>{end}'
+    '</tr></table>\n\n'
+    '{if files}'
+    '<ul class="materials">\n'
+    '{for f in files} <li><a href="{f.url}">{f.desc}</a></li>\n{end}'
+    '</ul>\n\n'
+    '{end}', prefix="    ")
+
+
+def generate_lecture(id_lecture, lecture, links, context):  # @UnusedVariable
+    presenters = ', '.join(links.get(p, p) for p in lecture['presenters'])
+    body = LECTURE_TEMPLATE(title=lecture['title'],
+                            ready=lecture['ready'],
+                            presenters=presenters,
+                            vimeo=[url.split('/')[-1] for url in lecture['vimeo']],
+                            files=lecture['files'])
+    return "<div class='lecture'>\n\n" + body + '\n</div>\n\n'
+
+
+
+def generate_presenter_links(people):
+    """ Renders the presenter fragment for each person, once per build. """
+    links = {}
+    for handle, person in people.items():
+        url = person['url']
+        name = person['name']
+        if name is None:
+            links[handle] = handle
+        elif url:
+            links[handle] = "<a href='%s'>%s</a>" % (url, name)
+        else:
+            links[handle] = name
+    return links
 
-    if lecture['presenters']:
-        s += '<p>Presenters: '
-        def f(p):
 
-            if p in people:
-                person = people[p]
-                url = person['url']
-                name = person['name']
-                if name is None:
-                    return p
-                if url:
-                    return "<a href='%s'>%s</a>" % (url, name)
+def check_presenters(lectures, links, context):
+    """ Warns for each unknown presenter, in the lecture using it; a bare
+        handle that several cohorts have is reported as ambiguous, with
+        the candidates. """
+    for l in sorted(lectures):
+        with context.sub(l):
+            for p in lectures[l]['presenters']:
+                if p in links:
+                    continue
+                candidates = sorted(k for k in links if split_key(k)[1] == p and k != p)
+                if len(candidates) > 1:
+                    context.warn('Ambiguous presenter %r: qualify it with the cohort '
+                                 '(one of %s).', (p, ", ".join(candidates)),
+                                 code='ambiguous-presenter')
                 else:
-                    return name
-                return p
-            else:
-                context.warn('No person %r.' % p)
-                return p
-        s += ', '.join(f(_) for _ in lecture['presenters'])
-        s += '</p>\n\n'
-    else:
-        s += '<p class="incomplete">(No presenters specified.)</p>\n\n'
-
-    vimeo = lecture['vimeo']
-
-    if not vimeo:
-        s += '<p class="incomplete">(Video not available yet.)</p>\n\n'
-
-    s += '<table><tr>\n'
-    for url in vimeo:
-        s += '   <td>'
-        s += generate_vimeo(url, context)
-        s += '</td>'
-    s += '</tr></table>\n\n'
-
-
-    if lecture['files']:
-        s += '<ul class="materials">\n'
-        for f in lecture['files']:
-            s += ' <li><a href="%s">%s</a></li>\n' % (f['url'], f['desc'])
-        s += '</ul>\n\n'
-
-
-    s = "<div class='lecture'>\n\n" + indent(s, "    ") + '\n</div>\n\n'
-    return s
-
+                    context.warn('No person %r.', (p,), code='unknown-presenter')
 
 
 def generate(lectures, people, context):
+    links = generate_presenter_links(people)
+    check_presenters(lectures, links, context)
+
     s = "\n\n"
     order = sorted(lectures)
     for l in order:
         lecture = lectures[l]
         with context.sub(l):
-            s += generate_lecture(l, lecture, people, context)
+            s += generate_lecture(l, lecture, links, context)
     return s
  
  
-def read_yaml_dict(filename):
-    if not os.path.exists(filename):
-        msg = 'Could not find file %r.' % filename
-        raise Exception(msg)
-
-    yaml_string = open(filename).read()
-    try:
-        values = yaml.load(yaml_string)
-    except yaml.YAMLError as e:
-        msg = 'Yaml file is invalid:\n---\n%s' % e
-        raise MyExc(msg)
-
-    if not isinstance(values, dict):
-        msg = 'Invalid content: %s' % values
-        raise MyExc(msg)
-
-    return values
-
-def read_people(people_filename, context):
-
-    import glob
-
-    values = {}
-    listing = glob.glob(people_filename)
-    for filename in listing:
-        handle = os.path.splitext(os.path.basename(filename))[0]
-        logger.info('%s - %s ' % (handle, filename))
-        value = read_yaml_dict(filename)
-        values[handle] = normalize_person(handle, value, context)
-    return values
-
 def read_lectures(lectures_filename, context):
     values = read_yaml_dict(lectures_filename)
     for k, value in list(values.items()):
-        values[k] = normalize_lecture(k, value, context)
+        lecture = normalize_lecture(k, value, context)
+        if isinstance(lecture, dict) and isinstance(lecture.get('files'), list):
+            lecture['files'] = tuple(LectureFile.from_dict(f) for f in lecture['files'])
+        values[k] = Lecture.from_dict(lecture)
     return values
 
-def normalize(id_struct, struct, key, function, context):
-    with context.sub(id_struct):
-        if not key in struct:
-            msg = 'Could not find %r in %r' % (key, struct)
-            raise MyExc(msg)
-        if not key in struct:
-            msg = 'No %r field in %r' % (key, struct)
-            raise MyExc(msg)
-        value = struct[key]
-        try:
-            with context.sub(key):
-                struct[key] = function(value, context)
-        except MyExc as e:
-            logger.error('Problem with %r in %s: %s\n\n%s' % (key, id_struct, struct, e))
-            raise
 
 def normalize_vimeo(v, context):  # @UnusedVariable
     """ must be list of strings """
@@ -273,79 +223,40 @@ def normalize_vimeo(v, context):  # @UnusedVariable
 def normalize_title(v, context):
     if v is None:
         return '(untitled)'
-    context.warn('untitled lecture')
-    return v
-
-def normalize_name(v, context):  # @UnusedVariable
-    return v
-
-
-def normalize_url(v, context):  # @UnusedVariable
-    if v is None:
-        context.warn('Empty URL')
-    # TODO: not existing
-    return v
-
-
-def normalize_string(v, context):  # @UnusedVariable
-    if v is None:
-        context.warn('empty string')
+    context.warn('untitled lecture', code='untitled')
     return v
 
 def normalize_date(v, context):  # @UnusedVariable
     try:
-        dt = parser.parse(v)
+        dt = parse_date(v)
     except ValueError as e:
         msg = 'Cannot parse date %r:\n\n%s' % (v, e)
         raise MyExc(msg)
     return dt
 
-def normalize_tags(v, context):
-    if v is None:
-        context.warn('No tags specified')
-        return []
-    return v
-
-def normalize_position(v, context):
-    if v is None:
-        context.warn('No position specified')
-        return ''
-    return v
-
-def normalize_bio(v, context):
-    if v is None:
-        context.warn('No bio.')
-        return ''
-    return v
-
-def normalize_person(id_record, record, context):
-    record['order'] = record.get('order', 100)
-    normalize(id_record, record, 'name', normalize_name, context)
-    normalize(id_record, record, 'position', normalize_position, context)
-    normalize(id_record, record, 'url', normalize_url, context)
-    normalize(id_record, record, 'bio', normalize_bio, context)
-    normalize(id_record, record, 'tags', normalize_tags, context)
-    return record
-
 def normalize_presenters(presenters, context):
     if presenters is None:
         presenters = []
 
     if len(presenters) == 0:
-        context.warn('No presenters')
+        context.warn('No presenters', code='no-presenters')
 
     return presenters
 
+normalize_file = compile_schema([
+    Field('desc', normalize_string),
+    Field('url', normalize_url),
+], catch=MyExc)
+
 def normalize_files(files, context):
     if files is None:
         files = []
 
     if len(files) == 0:
-        context.warn('No files')
+        context.warn('No files', code='no-files')
 
     for i, f in enumerate(files):
-        normalize(str(i), f, 'desc', normalize_string, context)
-        normalize(str(i), f, 'url', normalize_url, context)
+        normalize_file(str(i), f, context)
 
     return files
 
@@ -370,46 +281,14 @@ def normalize_files(files, context):
 def normalize_bool(x, context):
     return x
 
-def normalize_lecture(id_record, record, context):
-    normalize(id_record, record, 'date', normalize_date, context)
-    normalize(id_record, record, 'title', normalize_title, context)
-    normalize(id_record, record, 'vimeo', normalize_vimeo, context)
-    normalize(id_record, record, 'ready', normalize_bool, context)
-    normalize(id_record, record, 'files', normalize_files, context)
-    normalize(id_record, record, 'presenters', normalize_presenters, context)
-
-    return record
-
-# ## colored loggin
-
-logger.setLevel(logging.DEBUG)
-def add_coloring_to_emit_ansi(fn):
-    # add methods we need to the class
-    def new(*args):
-        levelno = args[1].levelno
-        if(levelno >= 50):
-            color = '\x1b[31m'  # red
-        elif(levelno >= 40):
-            color = '\x1b[31m'  # red
-        elif(levelno >= 30):
-            color = '\x1b[33m'  # yellow
-        elif(levelno >= 20):
-            color = '\x1b[32m'  # green
-        elif(levelno >= 10):
-            color = '\x1b[35m'  # pink
-        else:
-            color = '\x1b[0m'  # normal
-
-        args[1].msg = color + str(args[1].msg) + '\x1b[0m'  # normal
-        return fn(*args)
-    return new
-
-import platform
-if platform.system() != 'Windows':
-    emit2 = add_coloring_to_emit_ansi(logging.StreamHandler.emit)
-    logging.StreamHandler.emit = emit2
-
-
+normalize_lecture = compile_schema([
+    Field('date', normalize_date),
+    Field('title', normalize_title),
+    Field('vimeo', normalize_vimeo),
+    Field('ready', normalize_bool),
+    Field('files', normalize_files),
+    Field('presenters', normalize_presenters),
+], catch=MyExc)
 
 def indent(s, prefix, first=None):
     s = str(s)
@@ -1,12 +1,18 @@
 #!/usr/bin/env python
-from contextlib import contextmanager
-from dateutil import parser
 import logging
-import os
-import platform
 import sys
-import yaml
-logging.basicConfig()
+import diagnostics
+import ingest
+from cli import UsageError, split_options
+import logs
+import minify
+import outputs
+from logs import setup_logging, configure_logging
+from records import Outreach
+from schema import Field, compile_schema, string_types
+from templates import compile_template
+import timings
+from timings import stage, timed
 logger = logging.getLogger(__name__)
 
 ###
@@ -28,17 +34,23 @@ tail = """
 class MyExc(Exception):
     pass
 
+class Context(diagnostics.Context):
+    exception = MyExc
+
 def main():
+    setup_logging()
     try:
-
-        outreach_data = sys.stdin.read()
-        outreach = yaml.load(outreach_data)
-
-        generate_head(outreach)
-        generate_html(outreach)
-        print(tail)
-
-    except MyExc as e:
+        _, options = split_options(sys.argv[1:], timings.OPTIONS + logs.OPTIONS +
+                                   outputs.OPTIONS + minify.OPTIONS + ingest.OPTIONS)
+        configure_logging(options)
+        fmt = ingest.stream_format(options)
+        with timings.instrumented(options), outputs.output_to(options):
+            if fmt is None:
+                go()
+            else:
+                go_stream(fmt)
+
+    except (MyExc, UsageError) as e:
         logger.error(e)
         sys.exit(-2)
     except Exception as e: 
@@ -46,8 +58,109 @@ def main():
         logger.error(traceback.format_exc(e))
         sys.exit(-1)
 
+def go():
+    import yaml
+
+    with stage('parse'):
+        outreach_data = sys.stdin.read()
+        outreach = yaml.load(outreach_data)
+
+    context = Context()
+    with stage('normalize'):
+        normalize_outreach_list(outreach, context)
+    if context.warnings:
+        logger.warning(context.get_warnings())
+    context.bail()
+
+    generate_page(outreach)
+
+def go_stream(fmt):
+    """ Renders the entries as they are read from stdin (see ingest.py). """
+    context = Context()
+    print_front_matter()
+    sys.stdout.flush()
+    sections = SectionBuffer()
+    records = ingest.iter_records(sys.stdin, fmt, MyExc)
+    for i, d in enumerate(records):
+        d = normalize_entry(i, d, context)
+        context.bail()
+        sections.add(d)
+    if context.warnings:
+        logger.warning(context.get_warnings())
+    print(sections.generate_map())
+    sections.generate_html()
+    print(tail)
+
+def generate_page(outreach):
+    generate_head(outreach)
+    generate_html(outreach)
+    print(tail)
+
+def normalize_tags(v, context):  # @UnusedVariable
+    """ The first tag decides the marker and the info window. """
+    if not isinstance(v, list) or not v:
+        msg = 'Expected a non-empty list of tags, got %r' % v
+        raise MyExc(msg)
+    return v
+
+def normalize_coordinate(v, context):  # @UnusedVariable
+    if isinstance(v, bool) or not isinstance(v, (int, float)):
+        msg = 'Expected a number, got %r' % v
+        raise MyExc(msg)
+    return v
+
+def normalize_text(v, context):  # @UnusedVariable
+    if v is not None and not isinstance(v, string_types):
+        msg = 'Expected a string, got %r' % v
+        raise MyExc(msg)
+    return v
+
+normalize_outreach = compile_schema([
+    Field('tags', normalize_tags),
+    # required except for the media entries, which are not on the map
+    Field('lat', normalize_coordinate, optional=True),
+    Field('lon', normalize_coordinate, optional=True),
+    Field('id', optional=True),
+    Field('institution', optional=True),
+    Field('institution_url', optional=True),
+    Field('project_url', optional=True),
+    Field('title', optional=True),
+    Field('desc', normalize_text, optional=True),
+    Field('active', optional=True),
+], catch=MyExc)
+
+def normalize_outreach_list(outreach, context):
+    if not isinstance(outreach, list):
+        msg = 'Expected a list of entries, got %r' % type(outreach)
+        raise MyExc(msg)
+    for i, d in enumerate(outreach):
+        outreach[i] = normalize_entry(i, d, context)
+    return outreach
+
+def normalize_entry(i, d, context):
+    """ Normalizes the i-th entry. """
+    id_outreach = str((d.get('id') if isinstance(d, dict) else None) or i)
+    d = normalize_outreach(id_outreach, d, context)
+    if isinstance(d, dict) and isinstance(d.get('tags'), list) and d['tags'] and not is_media(d):
+        with context.sub(id_outreach):
+            for key in ['lat', 'lon']:
+                if not key in d:
+                    context.error('Could not find %r in %r', (key, d), code='missing-field')
+    return Outreach.from_dict(d)
+
 def generate_head(outreach):
 
+    print_front_matter()
+
+    outreach_no_media = [d for d in outreach if not is_media(d)]
+    #logger.info('outreach_no_media: %r' % outreach_no_media)
+    print(generate_map(outreach_no_media))
+
+def is_media(d):
+    return d.get('tags',[])[0] == 'media'
+
+def print_front_matter():
+
     print("""---
 layout: page
 title: Outreach
@@ -63,12 +176,12 @@ permalink: outreach.html
 </style>
 
 """)
-
-    outreach_no_media = [d for d in outreach if d.get('tags',[])[0] != 'media']
-    #logger.info('outreach_no_media: %r' % outreach_no_media)
-    print(generate_map(outreach_no_media))
 	
+@timed('generate_map')
 def generate_map(outreach):
+    return assemble_map(generate_info_windows(outreach), generate_markers(outreach))
+
+def assemble_map(info_windows, markers):
     s=""
     s+="""
 <div id="map"></div>
@@ -83,8 +196,8 @@ function initMap() {
 #    s+="var bounds = new google.maps.LatLngBounds();"
     s+="var infoWindow = new google.maps.InfoWindow(), marker, i;"
     s+="var service = new google.maps.places.PlacesService(map);"
-    s+= generate_info_windows(outreach)
-    s+= generate_markers(outreach)
+    s+= info_windows
+    s+= markers
 #    s+= """var boundsListener = google.maps.event.addListener((map), 'bounds_changed', function(event) {
 #        this.setZoom(14);
 #        google.maps.event.removeListener(boundsListener);
@@ -99,37 +212,41 @@ function initMap() {
 """
     return s
     
-def generate_markers(outreach):    
-    s=""
-    s+= """var image = { 
+MARKERS_HEAD = """var image = { 
             url: 'media/duckie2.png', 
             scaledSize: new google.maps.Size(20,20), 
             origin: new google.maps.Point(0, 0), 
             anchor: new google.maps.Point(0, 20) 
   };"""
-    i=0
 
-    for d in outreach:
-        lat = d.get('lat')
-        lon = d.get('lon')
-        s+= """
+def generate_markers(outreach):    
+    s=""
+    s+= MARKERS_HEAD
+
+    for i, d in enumerate(outreach):
+        s+= generate_marker(i, d)
+
+    return s
+
+def generate_marker(i, d):
+    s=""
+    lat = d.get('lat')
+    lon = d.get('lon')
+    s+= """
         marker = new google.maps.Marker({
          position: new google.maps.LatLng(%.9f,%.9f),
          map: map,
          icon: image,
          title: '%s'
         }); """ % (lat,lon,generate_hover(d))
-        if (d.get('active')):
-            s+="""
+    if (d.get('active')):
+        s+="""
             google.maps.event.addListener(marker, 'click', (function(marker,i) {
               return function() {
                 infoWindow.setContent(infoWindowContent[%d][0]);
                 infoWindow.open(map, marker);
             }
         })(marker, %d));""" % (i,i)
-        i+=1
-        
-
     return s
         
 def generate_hover(d):
@@ -146,125 +263,106 @@ def generate_hover(d):
     if tag != 'research' and tag!= 'independent' :
         s+=" Class"
     s+=")"
-    logger.info("institution: %s" % institution)
+    logger.info("institution: %s", institution)
     return s
 
-def generate_info_windows(outreach):
-    
-    s=""
-    s+="""
+INFO_WINDOWS_HEAD = """
     // Info Window Content
     var infoWindowContent = []
 """
+
+def generate_info_windows(outreach):
+    
+    s=""
+    s+=INFO_WINDOWS_HEAD
     for d in outreach:
-        tag=d.get('tags')[0]
-        title = d.get('title')
-        if not title:
-            title = "Under Development"
-        info = """'<div class="info_content">'"""
-        info += """+'<h3>%s' """ % tag.title()
-        if tag != 'research' and tag!= 'independent':
-            info+= "+ ' Class'"
-        institute_url = d.get('institution_url')
-        project_url = d.get('project_url')
-        if project_url:
-            info+="""+ ': <a href="%s">'""" % project_url  
-        info+="+ ' %s'" % title
-        if project_url:
-            info+="+'</a>'"
-        info+= "+' at '"
-        if institute_url:
-            info+="""+'<a href="%s">'""" % institute_url
-        info+="+'%s'" % d.get('institution')
-        if institute_url:
-            info+="+'</a>'" 
-        info+="+'</h3>'"
-        desc = d.get('desc')
-        if desc:
-            info+="""+'<p>%s</p>'""" % desc.strip()
-        info+="+'</div>'""" 
-        s+="""infoWindowContent.push([%s]);\n""" % info
+        s+=generate_info_window(d)
     return s
 
-def generate_html(outreach):
-
-
-
-    print("""
+def generate_info_window(d):
+    tag=d.get('tags')[0]
+    title = d.get('title')
+    if not title:
+        title = "Under Development"
+    info = """'<div class="info_content">'"""
+    info += """+'<h3>%s' """ % tag.title()
+    if tag != 'research' and tag!= 'independent':
+        info+= "+ ' Class'"
+    institute_url = d.get('institution_url')
+    project_url = d.get('project_url')
+    if project_url:
+        info+="""+ ': <a href="%s">'""" % project_url  
+    info+="+ ' %s'" % title
+    if project_url:
+        info+="+'</a>'"
+    info+= "+' at '"
+    if institute_url:
+        info+="""+'<a href="%s">'""" % institute_url
+    info+="+'%s'" % d.get('institution')
+    if institute_url:
+        info+="+'</a>'" 
+    info+="+'</h3>'"
+    desc = d.get('desc')
+    if desc:
+        info+="""+'<p>%s</p>'""" % desc.strip()
+    info+="+'</div>'""" 
+    return """infoWindowContent.push([%s]);\n""" % info
+
+EDUCATION = """
 
 ## Education
     
-    """)
+    """
 
-    selected = select_from_tags(outreach,['graduate'])
-    if len(selected) != 0:
-                                
-        print("""
+# (heading, tags) of the sections, in order; a section without entries
+# is left out
+SECTIONS = [
+    ("""
 
 ### Graduate
 
-""")
-        print(generate_html_tag(selected, ['graduate']))
-
-    selected = select_from_tags(outreach,['undergraduate'])
-    if len(selected) != 0:
-        print("""
+""", ['graduate']),
+    ("""
 
 ### Undergraduate
 
-""")
-
-        print(generate_html_tag(selected, ['undergraduate']))
-
-    selected = select_from_tags(outreach,['high school'])
-    if len(selected) != 0:
-        print("""
+""", ['undergraduate']),
+    ("""
 
 ### High School
 
-""")
-
-        print(generate_html_tag(selected, ['high school']))
-
-    selected = select_from_tags(outreach,['elementary school'])
-    if len(selected) != 0:
-        print("""
+""", ['high school']),
+    ("""
 
 ### Elementary School
 
-""")
-
-        print(generate_html_tag(selected, ['elementary school']))
-
-    selected = select_from_tags(outreach,['independent'])
-    if len(selected) != 0:
-        print("""
+""", ['elementary school']),
+    ("""
 
 ### Independent Study
 
-""")
-        print(generate_html_tag(selected, ['independent']))
-
-
-    selected = select_from_tags(outreach,['research'])
-    if len(selected) !=0:
-        print("""
+""", ['independent']),
+    ("""
 
 ## Research
     
-    """)
-
-        print(generate_html_tag(selected, ['research']))
-
-    selected = select_from_tags(outreach,['media'])
-    if len(selected) !=0:
-        print("""
+    """, ['research']),
+    ("""
 
 ## Media Coverage
     
-    """)
+    """, ['media']),
+]
+
+def generate_html(outreach):
 
-        print(generate_html_tag(selected, ['media']))
+    print(EDUCATION)
+
+    for heading, tags in SECTIONS:
+        selected = select_from_tags(outreach, tags)
+        if len(selected) != 0:
+            print(heading)
+            print(generate_html_tag(selected, tags))
 
     if False:
         print("""
@@ -276,90 +374,94 @@ def generate_html(outreach):
         print(generate_html_tag(outreach, None))
 
 
+class SectionBuffer(object):
+    """ The map and the sections of generate_head() and generate_html(),
+        filled one entry at a time; keeps only the rendered HTML. """
+
+    def __init__(self):
+        self.info_windows = []
+        self.markers = []
+        self.fragments = [[] for _ in SECTIONS]
+
+    def add(self, d):
+        if not is_media(d):
+            self.info_windows.append(generate_info_window(d))
+            self.markers.append(generate_marker(len(self.markers), d))
+        for (_, tags), fragments in zip(SECTIONS, self.fragments):
+            if select_entry(d, tags):
+                fragments.append(generate_entry(d))
+
+    def generate_map(self):
+        return assemble_map(INFO_WINDOWS_HEAD + "".join(self.info_windows),
+                            MARKERS_HEAD + "".join(self.markers))
+
+    def generate_html(self):
+        print(EDUCATION)
+        for (heading, tags), fragments in zip(SECTIONS, self.fragments):
+            if fragments:
+                logger.info('tags_to_include %r: selected %d', tags, len(fragments))
+                print(heading)
+                print("".join(fragments))
+
+
+def select_entry(d, tags_to_include, require_active=True):
+    tags = d.get('tags', [])
+    if tags is None:
+        tags = []
+    sel = False
+    if tags_to_include is None:
+        if (len(tags) == 0):
+            sel = True
+    else:
+        sel = any([_ in tags for _ in tags_to_include])
+    if require_active and not d.get('active'):
+        sel = False
+    return sel
 
 def select_from_tags(outreach, tags_to_include, require_active=True):
-    def select_elements(d):
-        tags = d.get('tags', [])
-        if tags is None:
-            tags = []
-        sel = False
-        if tags_to_include is None:
-            if (len(tags) == 0):
-                sel = True
-        else:
-            sel = any([_ in tags for _ in tags_to_include])
-        if require_active and not d.get('active'):
-            sel = False
-        return sel
-    return [d for d in outreach if select_elements(d)]
+    return [d for d in outreach if select_entry(d, tags_to_include, require_active)]
                     
 
+OUTREACH_TEMPLATE = compile_template(
+    '\n\n'
+    '<p id="{id_outreach}" class="{classes}"> '
+    '{if institute_url}<a class="title" href="{institute_url}">{end}'
+    '{institute}'
+    '{if institute_url}</a>{end}'
+    ' - '
+    '{if project_url}<a class="title" href="{project_url}"> {end}'
+    '{title}'
+    '{if project_url}</a>{end}'
+    '{if desc}: {desc}{end}'
+    '</p>'
+    '\n\n')
+
+@timed('generate_html_tag')
 def generate_html_tag(selected, tags_to_include):
     
 
-    logger.info('tags_to_include %r: selected %d' % (tags_to_include, len(selected)))
-    s = ""
-    for d in selected:
-        id_outreach = d.get('id')
-        title = d.get('title', '')
-        if not title:
-            title = "Under development"
-        institute = d.get('institution','')
-        classes = []
-        if not title:
-            title = ''
-        s += '\n\n'
-        desc = d.get('desc', '')
-        if not desc:
-            desc = ''
-        desc = desc.strip()
-        desc = desc.replace('\n', ' ')
-        institute_url = d.get('institution_url')
-        s += """<p id="%s" class="%s"> """ % (id_outreach, " ".join(classes)) 
-        if institute_url:
-            s+= """<a class="title" href="%s">""" % institute_url
-        s+="%s" % institute
-        if institute_url:
-            s+="</a>"
-        s+=" - "
-        project_url = d.get('project_url')
-        if project_url:
-            s+="""<a class="title" href="%s"> """ % project_url
-        s+= "%s" % title
-        if project_url:
-            s+="</a>"
-        if desc:
-            s += ": %s" % desc
-        s += '</p>'
-        s += '\n\n'
-    return s
+    logger.info('tags_to_include %r: selected %d', tags_to_include, len(selected))
+    return "".join(generate_entry(d) for d in selected)
+
+def generate_entry(d):
+    title = d.get('title', '')
+    if not title:
+        title = "Under development"
+    classes = []
+    desc = d.get('desc', '')
+    if not desc:
+        desc = ''
+    desc = desc.strip()
+    desc = desc.replace('\n', ' ')
+    return OUTREACH_TEMPLATE(id_outreach=d.get('id'),
+                             classes=" ".join(classes),
+                             institute_url=d.get('institution_url'),
+                             institute=d.get('institution', ''),
+                             project_url=d.get('project_url'),
+                             title=title,
+                             desc=desc)
     
 
-logger.setLevel(logging.DEBUG)
-def add_coloring_to_emit_ansi(fn):
-    # add methods we need to the class
-    def new(*args):
-        levelno = args[1].levelno
-        if(levelno >= 50):
-            color = '\x1b[31m'  # red
-        elif(levelno >= 40):
-            color = '\x1b[31m'  # red
-        elif(levelno >= 30):
-            color = '\x1b[33m'  # yellow
-        elif(levelno >= 20):
-            color = '\x1b[32m'  # green
-        elif(levelno >= 10):
-            color = '\x1b[35m'  # pink
-        else:
-            color = '\x1b[0m'  # normal
-
-        args[1].msg = color + str(args[1].msg) + '\x1b[0m'  # normal
-        return fn(*args)
-    return new
-
-if platform.system() != 'Windows':
-    emit2 = add_coloring_to_emit_ansi(logging.StreamHandler.emit)
-    logging.StreamHandler.emit = emit2
 
 
 
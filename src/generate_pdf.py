@@ -1,81 +1,163 @@
 #!/usr/bin/env python
 import logging
-logging.basicConfig()
-import sys, yaml, os, urllib2, platform
+import sys, os
+from cli import UsageError, split_options
+import ingest
+import logs
+import outputs
+from logs import setup_logging, configure_logging
+import timings
+from timings import stage
+from pdfstore import PdfStore, merge_key
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-from system_cmd import system_cmd_result
 
 def main():
+    setup_logging()
     try:
+        _, options = split_options(sys.argv[1:], ['verify'] + timings.OPTIONS +
+                                   logs.OPTIONS + outputs.OPTIONS + ingest.OPTIONS)
+        configure_logging(options)
+        output, manifest, compress = outputs.output_options(options)
+        fmt = ingest.stream_format(options)
+        with timings.instrumented(options):
+            errors = go(output, manifest, compress, fmt, verify='verify' in options)
 
-        documents_data = sys.stdin.read()
-        documents = yaml.load(documents_data)
-
-        out = 'media/pdfs'
-
-        if not os.path.exists(out):
-            os.makedirs(out)
-
-        errors = []
-        pdfs = []
-
-        for d in documents:
-            id_document = get_id(d)
-            if (d['tags'] == 'paper'):
-                continue
-
-            pdf_url = make_pdf_url(id_document)
+        if errors:
+            logger.error('Could not download all files.')
+            sys.exit(2)
 
-            pdf_file = os.path.join(out, id_document + '.pdf')
+    except UsageError as e:
+        logger.error(e)
+        sys.exit(-2)
+    except Exception as e:
+        import traceback
+        logger.error(traceback.format_exc(e))
+        sys.exit(-1)
 
-            if os.path.exists(pdf_file):
-                pdfs.append(pdf_file)
+def go(output=None, manifest=None, compress=None, fmt=None, verify=False):
+    """ Writes the joined PDF on stdout, or to output (see outputs.py).
+        With fmt (see ingest.py), the documents are fetched as they are
+        read from stdin. The downloads are kept in a content-addressed
+        store (see pdfstore.py). With verify, the stored PDFs are checked
+        first and the bad ones are quarantined, so they are downloaded
+        again (see pdfcheck.py). """
+    from system_cmd import system_cmd_result
+
+    if fmt is None:
+        import yaml
+        with stage('parse'):
+            documents_data = sys.stdin.read()
+            documents = yaml.load(documents_data)
+    else:
+        documents = ingest.iter_records(sys.stdin, fmt, UsageError)
+
+    out = 'media/pdfs'
+
+    if not os.path.exists(out):
+        os.makedirs(out)
+
+    store = PdfStore(out)
+
+    if verify:
+        with stage('verify'):
+            verify_store(store)
+
+    errors = []
+    pdfs = []
+    hashes = []
+
+    for d in documents:
+        id_document = get_id(d)
+        if (d['tags'] == 'paper'):
+            continue
+
+        pdf_url = make_pdf_url(id_document)
+
+        pdf_file = store.get(id_document)
+
+        if pdf_file is None:
+            pdf_file = store.path(id_document)
+            with stage('fetch'):
+                data = fetch(d, pdf_url, pdf_file)
+            if data is not None:
+                store.put(id_document, data)
             else:
-                logger.info('Downloading %s' % pdf_file)
-                response = urllib2.urlopen(pdf_url)
-                data = response.read()
-
-                is_valid = (data[1:4] == 'PDF')
-
-                if is_valid:
-                    with open(pdf_file, 'w') as f:
-                        f.write(data)
-                    pdfs.append(pdf_file)
-                else:
-                    logger.error('Invalid response for document %r' % d)
-                    errors.append(id_document)
-                    with open(pdf_file + '.invalid-response.html', 'w') as f:
-                        f.write(data)
+                errors.append(id_document)
+                continue
+        pdfs.append(pdf_file)
+        hashes.append(store.digest(id_document))
 
+    store.save()
+    n_ids, n_blobs, size = store.stats()
+    logger.info('%s: %d documents in %d blobs (%d bytes)', out, n_ids, n_blobs, size)
 
-        pdfout = 'joined.pdf'
+    pdfout = 'joined.pdf'
 
+    # the merge depends only on the contents of the parts, in order
+    key = merge_key(hashes)
+    if os.path.exists(pdfout) and store.index.get('merged') == key:
+        logger.info('%s is up to date', pdfout)
+    else:
         cmd = ['pdftk']
         cmd.extend(pdfs)
         cmd.extend(['cat', 'output', pdfout])
 
-        system_cmd_result(
-            cwd='.', cmd=cmd,
-            display_stdout=True,
-            display_stderr=True,
-            raise_on_error=True)
-
-
-        with open(pdfout) as f:
-            data = f.read()
-        logger.info('Writing on stdout %s' % len(data))
-        sys.stdout.write(data)
-
-        if errors:
-            logger.error('Could not download all files.')
-            sys.exit(2)
-
-
-    except Exception as e:
-        import traceback
-        logger.error(traceback.format_exc(e))
-        sys.exit(-1)
+        with stage('merge'):
+            system_cmd_result(
+                cwd='.', cmd=cmd,
+                display_stdout=True,
+                display_stderr=True,
+                raise_on_error=True)
+        store.set_merged(key)
+        store.save()
+
+    with open(pdfout, 'rb') as f:
+        data = f.read()
+    if output is not None:
+        outputs.write_output(output, data, manifest, compress)
+    else:
+        logger.info('Writing on stdout %s', len(data))
+        getattr(sys.stdout, 'buffer', sys.stdout).write(data)
+
+    return errors
+
+def verify_store(store):
+    """ Quarantines the bad blobs (forgetting the documents stored in
+        them) and the bad files left from before the store. """
+    from pdfcheck import quarantine, scan_files, scan_pdfs
+    bad = scan_pdfs(store.blob_dir)
+    for blob in sorted(bad):
+        digest = os.path.splitext(os.path.basename(blob))[0]
+        store.forget_blob(digest)
+        logger.warning('%s: %s; downloading it again (old copy in %s)',
+                       blob, bad[blob], quarantine(blob))
+    legacy = [os.path.join(store.directory, f) for f in sorted(os.listdir(store.directory))
+              if f.endswith('.pdf') and store.digest(f[:-len('.pdf')]) is None
+              and os.path.isfile(os.path.join(store.directory, f))]
+    bad = scan_files(legacy)
+    for pdf_file in sorted(bad):
+        logger.warning('%s: %s; downloading it again (old copy in %s)',
+                       pdf_file, bad[pdf_file], quarantine(pdf_file))
+    store.save()
+
+def fetch(d, pdf_url, pdf_file):
+    """ Downloads the PDF; returns its contents, or None if the response
+        is not a PDF. """
+    import urllib2
+
+    logger.info('Downloading %s', pdf_file)
+    response = urllib2.urlopen(pdf_url)
+    data = response.read()
+
+    is_valid = (data[1:4] == 'PDF')
+
+    if is_valid:
+        return data
+    else:
+        logger.error('Invalid response for document %r', d)
+        with open(pdf_file + '.invalid-response.html', 'w') as f:
+            f.write(data)
+        return None
 
 def make_pdf_url(id_document):
     return 'https://docs.google.com/document/d/%s/export?format=pdf' % id_document
@@ -92,30 +174,6 @@ def get_id(d):
 
     return s
 
-def add_coloring_to_emit_ansi(fn):
-    # add methods we need to the class
-    def new(*args):
-        levelno = args[1].levelno
-        if(levelno >= 50):
-            color = '\x1b[31m'  # red
-        elif(levelno >= 40):
-            color = '\x1b[31m'  # red
-        elif(levelno >= 30):
-            color = '\x1b[33m'  # yellow
-        elif(levelno >= 20):
-            color = '\x1b[32m'  # green
-        elif(levelno >= 10):
-            color = '\x1b[35m'  # pink
-        else:
-            color = '\x1b[0m'  # normal
-
-        args[1].msg = color + str(args[1].msg) + '\x1b[0m'  # normal
-        return fn(*args)
-    return new
-
-if platform.system() != 'Windows':
-    emit2 = add_coloring_to_emit_ansi(logging.StreamHandler.emit)
-    logging.StreamHandler.emit = emit2
 
 if __name__ == '__main__':
     main()
@@ -1,24 +1,59 @@
 #!/usr/bin/env python
 import logging
-logging.basicConfig()
+import os
+import sys
+from cli import UsageError, split_options
+import logs
+import minify
+import outputs
+from logs import setup_logging, configure_logging, summarize
+from minify import minify_text
+from cohorts import SEP, is_cohort_db, read_cohorts, split_key
+from people import MyExc, Context, read_people, write_diagnostics
+from templates import compile_template
+import timings
+from timings import stage, timed
 logger = logging.getLogger(__name__)
 
-from generate_lectures import *  # @UnusedWildImport
-
 def main():
+    setup_logging()
     try:
-        import sys
-        args = sys.argv[1:]
+        args, options = split_options(sys.argv[1:],
+                                      ['diagnostics-json', 'cohort', 'jobs', 'output-dir',
+                                       'thumbnails', 'image-index', 'deferred-bios'] +
+                                      timings.OPTIONS + logs.OPTIONS + outputs.OPTIONS +
+                                      minify.OPTIONS)
         if len(args) != 1:
             msg = 'Expected one arguments, got %r.' % args
 
             raise MyExc(msg)
 
         people_filename = args[0]
-        res = go(people_filename)
-        print(res)
+        cohorts = options['cohort'].split(',') if options.get('cohort') else None
+        try:
+            jobs = int(options['jobs']) if options.get('jobs') else None
+        except ValueError:
+            msg = 'Invalid --jobs=%s.' % options['jobs']
+            raise UsageError(msg)
+        output_dir = options.get('output-dir') or None
+        if (cohorts or output_dir) and not is_cohort_db(people_filename):
+            msg = '--cohort and --output-dir need a DB directory (db/).'
+            raise UsageError(msg)
+        configure_logging(options)
+        with outputs.output_to(options, needs_output=output_dir is None):
+            with timings.instrumented(options):
+                res = go(people_filename,
+                         diagnostics_json=options.get('diagnostics-json'),
+                         cohorts=cohorts, jobs=jobs, output_dir=output_dir,
+                         manifest=options.get('manifest') or None,
+                         compress=outputs.output_options(options, False)[2],
+                         minified='minify' in options,
+                         thumbnails_dir=options.get('thumbnails') or None,
+                         image_index=options.get('image-index') or None,
+                         bios_dir=options.get('deferred-bios') or None)
+            print(res)
         
-    except MyExc as e:
+    except (MyExc, UsageError) as e:
         logger.error(e)
         sys.exit(-2)
     except Exception as e:
@@ -27,20 +62,98 @@ def main():
         sys.exit(-1)
 
 
-def go(people_filename):
+def go(people_filename, diagnostics_json=None, cohorts=None, jobs=None,
+       output_dir=None, manifest=None, compress=None, minified=False,
+       thumbnails_dir=None, image_index=None, bios_dir=None):
+    """ people_filename is a glob, a snapshot or a DB directory (db/);
+        with a DB directory the roster combines all the cohorts (or the
+        selected ones), and output_dir gets one <cohort>.html each.
+        With thumbnails_dir, the photos are resized there (thumbnails.py).
+        The photo sizes come from an image index (imageinfo.py), cached
+        in the image_index file if given. With bios_dir, the bios are
+        written there, one JSON asset per section, and the page loads
+        them on demand (DeferredBios). """
     
     context = Context()
 
-    people_contents = read_people(people_filename, context)
+    shards = None
+    try:
+        with stage('read_people'):
+            if is_cohort_db(people_filename):
+                shards = read_cohorts(people_filename, context, cohorts, jobs)
+                people_contents = {}
+                for cohort, people in shards.items():
+                    people_contents.update(namespaced(cohort, people))
+            else:
+                people_contents = read_people(people_filename, context)
+
+        context.bail()
+    finally:
+        if diagnostics_json is not None:
+            write_diagnostics(context, diagnostics_json)
 
     
-    logger.info('people: %s' % people_contents)
+    logger.info('people: %s', summarize(people_contents))
     
     if context.warnings:
         logger.warning(context.get_warnings())
 
-    res = generate_roster(people_contents)
-
+    thumbs = None
+    if thumbnails_dir is not None:
+        with stage('thumbnails'):
+            thumbs = make_thumbs(people_filename, thumbnails_dir, jobs)
+    from imageinfo import ImageIndex
+    from archive import archive_photos, is_archive
+    # an archive has the photos in it (extracted when it was read)
+    sources = archive_photos(people_filename) if is_archive(people_filename) else None
+    photos = Photos(ImageIndex(image_index), thumbs, sources)
+
+    if output_dir is not None:
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        for cohort, people in shards.items():
+            with stage('generate_roster'):
+                bios = make_bios(bios_dir, cohort, manifest, compress)
+                page = roster_page(generate_roster(namespaced(cohort, people), photos,
+                                                   bios)) + '\n'
+            filename = os.path.join(output_dir, cohort + '.html')
+            if minified:
+                page = minify_text(page, filename)
+            outputs.write_output(filename, page, manifest, compress)
+
+    with stage('generate_roster'):
+        res = generate_roster(people_contents, photos,
+                              make_bios(bios_dir, 'roster', manifest, compress))
+
+    photos.images.save()
+    return roster_page(res)
+
+
+def make_thumbs(people_filename, thumbnails_dir, jobs):
+    """ Returns id_person -> template fields for the thumbnails. """
+    from thumbnails import make_all_thumbnails, photo_attributes, photo_sources
+    sources = photo_sources(people_filename)
+    thumbs = make_all_thumbnails(sources, thumbnails_dir, jobs)
+    url_prefix = "http://duckietown.mit.edu/" + thumbnails_dir.strip('/') + '/'
+    return dict((id_person, photo_attributes(sizes, url_prefix))
+                for id_person, sizes in thumbs.items())
+
+
+def make_bios(bios_dir, name, manifest, compress):
+    if bios_dir is None:
+        return None
+    # site-relative: the page fetches them by XHR, so they must be on its origin
+    url_prefix = '/' + bios_dir.strip('/') + '/'
+    return DeferredBios(bios_dir, url_prefix, name, manifest, compress)
+
+
+def namespaced(cohort, people):
+    """ Keys the people by "cohort/handle", so that the same handle in two
+        cohorts is two people; the photos are still media/staff/<handle>.jpg. """
+    return dict((cohort + SEP + handle, p) for handle, p in people.items())
+
+
+def roster_page(res):
     head = """  
     
 <style type='text/css'>
@@ -64,58 +177,58 @@ def go(people_filename):
     
     return head + res + foot
 
-def generate_roster(people):
-
-    s = "\n\n"
-
-    s += """
-<table id='roster'>
-"""
-
-    s += """
+# (heading row, tag, expected number of people) of the sections, in order
+SECTIONS = [
+    ("""
 <tr class='roles' id="first" > <td colspan="2">Duckietown Engineering Co. </td> </tr>
-"""
-
-    s += generate_roster_tag(people, 'management')
-
-    s += """
+""", 'management', None),
+    ("""
 <tr class='roles'   > <td colspan="2"> Advisory board </td> </tr>
-"""
-
-    s += generate_roster_tag(people, 'advisory')
-
-    s += """
+""", 'advisory', None),
+    ("""
 <tr class='roles'  > <td colspan="2"> Sponsors  </td> </tr>
-"""
-
-    s += generate_roster_tag(people, 'sponsors')
-
-
-    s += """
+""", 'sponsors', None),
+    ("""
 <tr class='roles'   > <td colspan="2"> Operations </td> </tr>
-"""
-
-    s += generate_roster_tag(people, 'operations', expected=24)
-
-    s += """
+""", 'operations', 24),
+    ("""
 <tr class='roles'   > <td colspan="2"> Special Operations </td> </tr>
-"""
+""", 'special-ops', None),
+    ("""
+<tr class='roles' > <td colspan="2"> Duckietown Engineering Training Program </td> </tr>
+""", 'training', 26),
+]
 
-    s += generate_roster_tag(people, 'special-ops')
+def generate_roster(people, photos=None, bios=None):
+    """ With bios (a DeferredBios), the bios and roster notes are written
+        to one JSON asset per section, loaded by the page on demand. """
+
+    s = "\n\n"
 
     s += """
-<tr class='roles' > <td colspan="2"> Duckietown Engineering Training Program </td> </tr>
+<table id='roster'>
 """
 
-    s += generate_roster_tag(people, 'training', expected=26)
+    for heading, tag, expected in SECTIONS:
+        rows = generate_roster_tag(people, tag, expected=expected, photos=photos, bios=bios)
+        if bios is not None:
+            heading = heading.replace("<tr class='roles'",
+                                      "<tr class='roles' data-section='%s' data-bios='%s'"
+                                      % (tag, bios.write(tag)), 1)
+        s += heading
+        s += rows
 
     s += """
 </table>"""
 
+    if bios is not None:
+        s += DEFERRED_BIOS_SCRIPT
+
     return s
 
 
-def generate_roster_tag(people, tag, expected=None):
+@timed('generate_roster_tag')
+def generate_roster_tag(people, tag, expected=None, photos=None, bios=None):
     people = select(people, tag)
 
 
@@ -131,16 +244,20 @@ def generate_roster_tag(people, tag, expected=None):
             last = name.split(' ')[-1]
             score += ord(last[0])
 
-        logger.debug('score %r -> %r' % (name, score))
+        logger.debug('score %r -> %r', name, score)
         return score
 
     ordered = sorted(people, key=get_order)
 
-    logger.info('tag %r: %s selected: %s' % (tag, len(people), ", ".join(ordered)))
+    logger.info('tag %r: %s selected: %s', tag, len(people), summarize(ordered))
 
     for id_person in ordered:
         p = people[id_person]
-        s += "\n\n" + generate_person(id_person, p) + "\n\n"
+        section = None
+        if bios is not None:
+            bios.add(tag, id_person, p)
+            section = tag
+        s += "\n\n" + generate_person(id_person, p, photos, section) + "\n\n"
 
     if expected is not None:
         n = len(ordered)
@@ -155,41 +272,219 @@ def generate_roster_tag(people, tag, expected=None):
 
     return s
 
-def generate_person(id_person, p):
-    s = "<tr><td class='photo'>"
+PERSON_TEMPLATE = compile_template(
+    "<tr><td class='photo'>"
+    '{if has_thumbs}'
+    '<picture>'
+    '{if webp_srcset}<source type="image/webp" srcset="{webp_srcset}" sizes="{width}px"/>{end}'
+    '<img class="person" src="{thumb_url}" srcset="{srcset}" sizes="{width}px"'
+    ' width="{width}" height="{height}" loading="lazy"/>'
+    '</picture>'
+    '{else}'
+    '<img class="person" src="{img_url}"{if has_size} width="{img_width}" height="{img_height}"{end}/>'
+    '{end}'
+    "</td><td>"
+    '{if has_url}'
+    '<span class="name"><a href="{url}">{name}</a></span>'
+    '{else}'
+    '<span class="name"> {name}</span>'
+    '{end}'
+    '<br/><span class="position">{position}</span>'
+    '{if section}'
+    '<div class="bio-deferred" data-section="{section}" data-person="{id_person}"></div>'
+    '{else}'
+    '{if has_note}<p>{roster_note}</p>{end}'
+    '{if bio}<p><span class="bio">{bio}</span></p>{end}'
+    '{end}'
+    "</td></tr>")
+
+BIO_TEMPLATE = compile_template(
+    '{if has_note}<p>{roster_note}</p>{end}'
+    '{if bio}<p><span class="bio">{bio}</span></p>{end}')
+
+# loads the bios of a section when one of its people is about to be shown
+# (everything at once without IntersectionObserver)
+DEFERRED_BIOS_SCRIPT = """
+<script>
+(function() {
+  var urls = {}, loaded = {};
+  var rows = document.querySelectorAll('tr.roles[data-bios]');
+  for (var i = 0; i < rows.length; i++) {
+    urls[rows[i].getAttribute('data-section')] = rows[i].getAttribute('data-bios');
+  }
+  function load(section) {
+    if (loaded[section]) return;
+    loaded[section] = true;
+    var xhr = new XMLHttpRequest();
+    xhr.open('GET', urls[section]);
+    xhr.onload = function() {
+      if (xhr.status != 200) return;
+      var bios = JSON.parse(xhr.responseText);
+      var divs = document.querySelectorAll('div.bio-deferred[data-section="' + section + '"]');
+      for (var i = 0; i < divs.length; i++) {
+        divs[i].innerHTML = bios[divs[i].getAttribute('data-person')] || '';
+      }
+    };
+    xhr.send();
+  }
+  var divs = document.querySelectorAll('div.bio-deferred');
+  if (!('IntersectionObserver' in window)) {
+    for (var s in urls) load(s);
+    return;
+  }
+  var observer = new IntersectionObserver(function(entries) {
+    for (var i = 0; i < entries.length; i++) {
+      if (entries[i].isIntersecting) {
+        observer.unobserve(entries[i].target);
+        load(entries[i].target.getAttribute('data-section'));
+      }
+    }
+  }, {rootMargin: '100% 0px'});
+  for (var i = 0; i < divs.length; i++) observer.observe(divs[i]);
+})();
+</script>
+"""
+
+
+class DeferredBios(object):
+    """ Collects the bios and roster notes of each section, and writes
+        them as <name>-bios-<section>-<hash>.json in out_dir. The name
+        contains the hash of the contents, so the assets can be cached
+        forever; the previous versions are removed. """
+
+    def __init__(self, out_dir, url_prefix, name='roster', manifest=None, compress=None):
+        self.out_dir = out_dir
+        self.url_prefix = url_prefix
+        self.name = name
+        self.manifest = manifest
+        self.compress = compress
+        # section -> id_person -> HTML
+        self.sections = {}
+
+    def add(self, section, id_person, p):
+        self.sections.setdefault(section, {})[id_person] = BIO_TEMPLATE(
+            has_note='roster_note' in p, roster_note=p.get('roster_note'),
+            bio=p['bio'].strip())
+
+    def write(self, section):
+        """ Writes the asset of the section; returns its URL. """
+        import hashlib
+        import json
+        data = json.dumps(self.sections.get(section, {}), sort_keys=True,
+                          separators=(',', ':')).encode('utf-8')
+        prefix = '%s-bios-%s-' % (self.name, section)
+        filename = prefix + hashlib.sha256(data).hexdigest()[:16] + '.json'
+        if not os.path.exists(self.out_dir):
+            os.makedirs(self.out_dir)
+        for f in os.listdir(self.out_dir):
+            if f.startswith(prefix) and not f.startswith(filename) and \
+                    f[len(prefix):].split('.')[0].isalnum():
+                os.remove(os.path.join(self.out_dir, f))
+        outputs.write_output(os.path.join(self.out_dir, filename), data,
+                             self.manifest, self.compress)
+        return self.url_prefix + filename
+
+class Photos(object):
+    """ The photo of each person: the thumbnails if any (thumbnails.py),
+        otherwise media/staff/<handle>.jpg, with its size if an image index
+        (imageinfo.ImageIndex) is given. Without an index, only the
+        existence of the file is checked. Each file is looked up once per
+        Photos, so use one per build.
+
+        With sources (handle -> photo file, for an archive), the photos
+        are looked up there rather than in media/staff, which is still
+        where the page links them. """
+
+    NO_THUMBS = {'thumb_url': None, 'srcset': None, 'webp_srcset': None,
+                 'width': None, 'height': None}
+
+    MISSING = "media/staff/MISSING.jpg"
+
+    def __init__(self, images=None, thumbs=None, sources=None):
+        self.images = images
+        self.thumbs = thumbs or {}
+        self.sources = sources
+        # img_local_url -> fields (shared by the people with that photo)
+        self.photos = {}
+
+    def image(self, img_local_url):
+        """ Returns (usable, info). """
+        if self.images is None:
+            return os.path.exists(img_local_url), None
+        info = self.images.get(img_local_url)
+        if info is not None and info['format'] == 'lfs':
+            logger.warning('Image %r is a Git LFS pointer; run "git lfs pull".', img_local_url)
+            return False, info
+        return info is not None, info
+
+    def fields(self, id_person):
+        # media/staff is flat: the cohort of a "cohort/handle" id is dropped
+        handle = split_key(id_person)[1]
+        img_local_url = "media/staff/%s.jpg" % handle
+        source = None
+        if self.sources is not None:
+            source = self.sources.get(handle)
+            if source is not None:
+                img_local_url = "media/staff/%s" % os.path.basename(source)
+        thumbs = self.thumbs.get(id_person)
+        if thumbs is not None:
+            return dict(thumbs, img_url="http://duckietown.mit.edu/" + img_local_url,
+                        has_size=False, img_width=None, img_height=None)
+        if self.sources is not None and source is None:
+            logger.warning('No photo of %r in the archive', handle)
+            return self.photo(self.MISSING)
+        return self.photo(img_local_url, source)
+
+    def photo(self, img_local_url, source=None):
+        """ The fields for the full-size image (read from source if given),
+            or for MISSING.jpg if it is not usable. """
+        res = self.photos.get(img_local_url)
+        if res is not None:
+            return res
+        ok, info = self.image(source or img_local_url)
+        if not ok and img_local_url != self.MISSING:
+            if info is None:
+                logger.warning('Image %r does not exist', img_local_url)
+            res = self.photo(self.MISSING)
+        else:
+            has_size = info is not None and info['width'] is not None
+            res = dict(self.NO_THUMBS, img_url="http://duckietown.mit.edu/" + img_local_url,
+                       has_size=has_size,
+                       img_width=info['width'] if has_size else None,
+                       img_height=info['height'] if has_size else None)
+        self.photos[img_local_url] = res
+        return res
 
-    img_local_url = "media/staff/%s.jpg" % id_person
 
-    img_missing_local_url = "media/staff/MISSING.jpg"
-    if not os.path.exists(img_local_url):
-        logger.warn('Image %r does not exist' % img_local_url)
-        img_local_url = img_missing_local_url
+def generate_person(id_person, p, photos=None, section=None):
+    """ With section, the bio is left to the deferred bios of the section. """
+    if photos is None:
+        photos = Photos()
+    photo = photos.fields(id_person)
 
-    img_url = "http://duckietown.mit.edu/"+img_local_url
     name = p['name']
     if name is None:
         name = '("%s" should add information in DB)' % id_person
-    position = p['position']
-    url = p['url']
-    
-    s += '<img class="person" src="%s"/>' % img_url
-    s += "</td><td>"
-
-    if url is not None:
-        s += '<span class="name"><a href="%s">%s</a></span>' % (url, name)
-    else:
-        s += '<span class="name"> %s</span>' % name
-    s += '<br/><span class="position">%s</span>' % position
-
-    if 'roster_note' in p:
-        s += '<p>%s</p>' % p['roster_note']
 
-    bio = p['bio'].strip()
-    if bio:
-        s += '<p><span class="bio">%s</span></p>' % bio
-        
-    s += "</td></tr>"
-    return s
+    return PERSON_TEMPLATE(img_url=photo['img_url'],
+                           has_size=photo['has_size'],
+                           img_width=photo['img_width'],
+                           img_height=photo['img_height'],
+                           has_thumbs=photo['thumb_url'] is not None,
+                           thumb_url=photo['thumb_url'],
+                           srcset=photo['srcset'],
+                           webp_srcset=photo['webp_srcset'],
+                           width=photo['width'],
+                           height=photo['height'],
+                           has_url=p['url'] is not None,
+                           url=p['url'],
+                           name=name,
+                           position=p['position'],
+                           section=section,
+                           id_person=id_person,
+                           has_note='roster_note' in p,
+                           roster_note=p.get('roster_note'),
+                           bio=p['bio'].strip())
 
 
 def select(people, tag):
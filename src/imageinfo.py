@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+"""
+    Image metadata from the file headers only, without decoding:
+
+        format   'jpeg', 'png', 'gif', 'lfs' (a Git LFS pointer that was
+                 not fetched; see the README) or 'unknown'
+        width, height
+                 from the JPEG SOF segment, the PNG IHDR chunk or the GIF
+                 screen descriptor; None for the others. As displayed: for
+                 a JPEG whose EXIF orientation turns it by 90 degrees
+                 (5 to 8), the SOF values are swapped
+        orientation
+                 the EXIF Orientation of a JPEG (1 to 8), or None
+        size     of the file, or of the real image for LFS pointers
+        sha256   of the contents (the oid for LFS pointers); only with
+                 hashes=True, as it reads the whole file
+
+    ImageIndex caches the results by path, mtime and file size, optionally
+    in a JSON file:
+
+        python src/imageinfo.py [--cache=FILE] db/2016-MIT media/staff
+"""
+import json
+import logging
+import os
+import struct
+import sys
+
+from cli import UsageError, split_options
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['read_image_info', 'ImageIndex', 'IMAGE_FORMATS']
+
+# the formats that are actual images
+IMAGE_FORMATS = ('jpeg', 'png', 'gif')
+
+SUFFIXES = ('.jpg', '.jpeg', '.png', '.gif')
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+LFS_PREFIX = b'version https://git-lfs.github.com/spec/'
+
+# SOF0..SOF15, except DHT (C4), JPG (C8) and DAC (CC)
+SOF_MARKERS = set(range(0xC0, 0xD0)) - set([0xC4, 0xC8, 0xCC])
+
+
+def _exif_orientation(data):
+    """ The Orientation tag of IFD0 in an APP1 "Exif" segment, or None. """
+    tiff = data[6:]
+    order = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+    if order is None:
+        return None
+    try:
+        offset = struct.unpack(order + 'I', tiff[4:8])[0]
+        n = struct.unpack(order + 'H', tiff[offset:offset + 2])[0]
+        for i in range(n):
+            entry = tiff[offset + 2 + 12 * i:offset + 14 + 12 * i]
+            tag = struct.unpack(order + 'H', entry[:2])[0]
+            if tag == 0x0112:
+                return struct.unpack(order + 'H', entry[8:10])[0]
+    except struct.error:
+        pass
+    return None
+
+
+def _jpeg_size(f):
+    """ Walks the JPEG segments up to the first SOF; returns (w, h,
+        orientation) or None. """
+    f.seek(2)
+    orientation = None
+    while True:
+        b = f.read(1)
+        while b and b != b'\xff':
+            b = f.read(1)
+        while b == b'\xff':
+            b = f.read(1)
+        if not b:
+            return None
+        marker = ord(b)
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            continue  # no length
+        if marker in (0xD9, 0xDA):
+            return None  # end of image or start of scan before any SOF
+        header = f.read(2)
+        if len(header) != 2:
+            return None
+        length = struct.unpack('>H', header)[0]
+        if marker in SOF_MARKERS:
+            data = f.read(5)
+            if len(data) != 5:
+                return None
+            _, h, w = struct.unpack('>BHH', data)
+            return w, h, orientation
+        if marker == 0xE1 and orientation is None:
+            data = f.read(length - 2)
+            if data.startswith(b'Exif\x00\x00'):
+                orientation = _exif_orientation(data)
+            continue
+        f.seek(length - 2, 1)
+
+
+def _lfs_pointer(head):
+    res = {}
+    for line in head.decode('ascii', 'replace').splitlines():
+        key, _, value = line.partition(' ')
+        if key == 'oid' and value.startswith('sha256:'):
+            res['sha256'] = value[len('sha256:'):]
+        elif key == 'size' and value.isdigit():
+            res['size'] = int(value)
+    return res
+
+
+def read_image_info(filename, hashes=False):
+    """ Returns a dict with format, width, height, size and sha256 (None
+        unless hashes is True or the file is an LFS pointer). """
+    info = {'format': 'unknown', 'width': None, 'height': None, 'orientation': None,
+            'size': os.path.getsize(filename), 'sha256': None}
+    with open(filename, 'rb') as f:
+        head = f.read(512)
+        if head.startswith(b'\xff\xd8'):
+            info['format'] = 'jpeg'
+            size = _jpeg_size(f)
+            if size is not None:
+                w, h, info['orientation'] = size
+                if info['orientation'] in (5, 6, 7, 8):
+                    w, h = h, w  # turned by 90 degrees when displayed
+                info['width'], info['height'] = w, h
+        elif head.startswith(PNG_SIGNATURE) and head[12:16] == b'IHDR':
+            info['format'] = 'png'
+            info['width'], info['height'] = struct.unpack('>II', head[16:24])
+        elif head[:6] in (b'GIF87a', b'GIF89a'):
+            info['format'] = 'gif'
+            info['width'], info['height'] = struct.unpack('<HH', head[6:10])
+        elif head.startswith(LFS_PREFIX):
+            info['format'] = 'lfs'
+            info.update(_lfs_pointer(head))
+            return info
+    if hashes:
+        from outputs import file_hash
+        info['sha256'] = file_hash(filename)
+    return info
+
+
+class ImageIndex(object):
+    """ Path -> image info, cached by mtime and size; the cache can be
+        kept in a JSON file (load() / save()). """
+
+    def __init__(self, cache_filename=None, hashes=False):
+        self.cache_filename = cache_filename
+        self.hashes = hashes
+        # path -> [mtime, size, info]
+        self.entries = {}
+        self.dirty = False
+        if cache_filename is not None and os.path.exists(cache_filename):
+            try:
+                with open(cache_filename) as f:
+                    self.entries = json.load(f)
+            except ValueError:
+                logger.warning('Ignoring invalid image index %r.', cache_filename)
+
+    def get(self, filename):
+        """ Returns the info for filename, or None if it does not exist. """
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        entry = self.entries.get(filename)
+        # (entries from before 'orientation' was read are read again)
+        if entry is not None and entry[0] == st.st_mtime and entry[1] == st.st_size \
+                and 'orientation' in entry[2] \
+                and (entry[2]['sha256'] is not None or not self.hashes):
+            return entry[2]
+        info = read_image_info(filename, self.hashes)
+        self.entries[filename] = [st.st_mtime, st.st_size, info]
+        self.dirty = True
+        return info
+
+    def scan(self, directory):
+        """ Indexes the images in directory; returns filename -> info. """
+        res = {}
+        for name in sorted(os.listdir(directory)):
+            if name.lower().endswith(SUFFIXES):
+                filename = os.path.join(directory, name)
+                res[filename] = self.get(filename)
+        return res
+
+    def save(self):
+        if self.cache_filename is None or not self.dirty:
+            return
+        from outputs import atomic_write
+        data = json.dumps(self.entries, indent=1, sort_keys=True, separators=(',', ': '))
+        atomic_write(self.cache_filename, data.encode('utf-8'))
+        self.dirty = False
+
+
+def main():
+    from logs import setup_logging
+    setup_logging()
+    try:
+        args, options = split_options(sys.argv[1:], ['cache'])
+        if not args:
+            msg = 'Usage: imageinfo.py [--cache=FILE] DIR...'
+            raise UsageError(msg)
+        index = ImageIndex(options.get('cache') or None, hashes=True)
+        counts = {}
+        for d in args:
+            for filename, info in index.scan(d).items():
+                counts[info['format']] = counts.get(info['format'], 0) + 1
+                size = '%sx%s' % (info['width'], info['height']) if info['width'] else '-'
+                print('%-40s %-7s %10s %9d %s' % (filename, info['format'], size,
+                                                  info['size'], info['sha256']))
+        index.save()
+        logger.info('%s', ", ".join('%d %s' % (n, fmt) for fmt, n in sorted(counts.items())))
+        if counts.get('lfs'):
+            logger.warning('%d images are Git LFS pointers: run "git lfs pull".', counts['lfs'])
+    except (UsageError, OSError) as e:
+        logger.error(e)
+        sys.exit(-2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+    Incremental reading of the documents and outreach entries from stdin
+    (--stream=yaml or --stream=ndjson), one record at a time:
+
+        cat documents/*.yaml | python src/generate_documents.py --stream=yaml
+        python src/generate_pdf.py --stream=ndjson < documents.ndjson
+
+    yaml     a stream of YAML documents separated by "---"; each document
+             is one entry, or a list of entries (so the usual single list
+             is accepted too, but is then read as a whole)
+    ndjson   one JSON object per line; blank lines are skipped
+
+    The generators normalize and render each entry as it arrives and keep
+    only the rendered fragments, so the whole input and its object graph
+    are never in memory at once, and the head of the page is written
+    before the input is finished.
+
+    The load_* functions read a whole input file (or the people DB) and
+    return the normalized records, for the tools that need them all at
+    once (preview.py, linkcheck.py). They log the warnings and raise
+    MyExc with the report of the errors.
+"""
+import json
+import logging
+
+from cli import UsageError
+from logs import summarize
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['OPTIONS', 'FORMATS', 'stream_format', 'iter_records',
+           'load_people', 'load_lectures', 'load_documents', 'load_outreach',
+           'log_diagnostics']
+
+OPTIONS = ['stream']
+
+FORMATS = ['yaml', 'ndjson']
+
+
+def stream_format(options):
+    """ Returns the format given with --stream, or None. """
+    fmt = options.get('stream')
+    if fmt is None:
+        return None
+    fmt = fmt or 'yaml'
+    if not fmt in FORMATS:
+        msg = 'Unknown stream format %r; known: %s' % (fmt, ", ".join(FORMATS))
+        raise UsageError(msg)
+    return fmt
+
+
+def _iter_yaml(f, exception):
+    import yaml
+    documents = yaml.load_all(f)
+    while True:
+        try:
+            value = next(documents)
+        except StopIteration:
+            return
+        except yaml.YAMLError as e:
+            msg = 'Yaml stream is invalid:\n---\n%s' % e
+            raise exception(msg)
+        if value is None:
+            continue
+        if isinstance(value, list):
+            for x in value:
+                yield x
+        else:
+            yield value
+
+
+def _iter_ndjson(f, exception):
+    # readline() rather than iterating f, which reads ahead on Python 2
+    for i, line in enumerate(iter(f.readline, '')):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            value = json.loads(line)
+        except ValueError as e:
+            msg = 'Invalid JSON on line %d: %s' % (i + 1, e)
+            raise exception(msg)
+        yield value
+
+
+def iter_records(f, fmt, exception=ValueError):
+    """ Yields the records read from the file f, as they are read;
+        raises exception for invalid input. """
+    if fmt == 'ndjson':
+        return _iter_ndjson(f, exception)
+    return _iter_yaml(f, exception)
+
+
+def log_diagnostics(context):
+    """ Logs the warnings; raises MyExc with the report of the errors. """
+    from people import MyExc
+    if context.warnings:
+        logger.warning(context.get_warnings())
+    if context.errors:
+        # the whole report (paths and messages) rather than what bail()
+        # raises, so that the preview page shows the problems
+        raise MyExc(context.get_errors())
+
+
+def load_people(people_filename):
+    """ Returns (people for the roster, people for the presenters). """
+    from cohorts import HandleIndex, is_cohort_db, read_cohorts, with_bare_handles
+    from generate_roster import namespaced
+    from people import Context, read_people
+    context = Context()
+    if is_cohort_db(people_filename):
+        shards = read_cohorts(people_filename, context)
+        roster = {}
+        for cohort, people in shards.items():
+            roster.update(namespaced(cohort, people))
+        presenters = HandleIndex(shards).flat()
+    else:
+        roster = read_people(people_filename, context)
+        presenters = with_bare_handles(roster)
+    log_diagnostics(context)
+    logger.info('people: %s', summarize(roster))
+    return roster, presenters
+
+
+def load_lectures(lectures_filename):
+    from generate_lectures import read_lectures
+    from people import Context
+    context = Context()
+    lectures = read_lectures(lectures_filename, context)
+    log_diagnostics(context)
+    return lectures
+
+
+def _load_list(filename, normalize, context):
+    import yaml
+    with open(filename) as f:
+        values = yaml.load(f.read())
+    normalize(values, context)
+    log_diagnostics(context)
+    return values
+
+
+def load_documents(documents_filename):
+    import generate_documents
+    return _load_list(documents_filename, generate_documents.normalize_documents,
+                      generate_documents.Context())
+
+
+def load_outreach(outreach_filename):
+    import generate_outreach
+    return _load_list(outreach_filename, generate_outreach.normalize_outreach_list,
+                      generate_outreach.Context())
@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+"""
+    Checks the URLs in the DB:
+
+        python src/linkcheck.py --people='db/2016-MIT/*.yaml' \\
+            --lectures=lectures.yaml --documents=documents.yaml \\
+            --outreach=outreach.yaml [--cache=.linkcheck.json] [--ttl=86400] \\
+            [--jobs=16] [--per-host=2] [--timeout=10]
+
+    The URLs are taken from the normalized records:
+
+        people      url
+        lectures    vimeo, files[].url
+        documents   google_docs_share_link
+        outreach    institution_url, project_url
+
+    Each distinct URL is checked once, concurrently, with a HEAD request
+    and, if the server refuses it or fails, a GET. At most PER_HOST
+    requests go to the same host at a time, so Dropbox or Vimeo do not
+    see a burst; the workers take the URLs from one queue per host, in
+    turn, so the other hosts are checked meanwhile. Redirects are followed; a final status below 400 is ok.
+
+    The results are kept in a JSON cache (--cache) with the time of the
+    check: a URL is checked again only after --ttl seconds, so repeated
+    runs only recheck the stale entries. Transient failures (no response,
+    or a 5xx status) are not cached, so a host that was briefly down is
+    checked again on the next run.
+
+    Broken links are reported as errors, with the record and field, and
+    the script exits with -2. URLs that are not http(s) are skipped.
+"""
+from collections import deque
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+from cli import UsageError, split_options
+import logs
+from logs import setup_logging, configure_logging
+from people import MyExc, Context
+import timings
+from timings import stage
+
+if sys.version_info[0] >= 3:
+    from urllib.error import HTTPError, URLError
+    from urllib.parse import urlparse
+    from urllib.request import Request, urlopen
+else:
+    from urllib2 import HTTPError, Request, URLError, urlopen
+    from urlparse import urlparse
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['extract_urls', 'LinkCache', 'check_url', 'check_urls', 'is_transient']
+
+TTL = 24 * 3600
+JOBS = 16
+PER_HOST = 2
+TIMEOUT = 10
+
+USER_AGENT = 'Mozilla/5.0 (compatible; duckietown-linkcheck)'
+
+# statuses for which a GET would not tell anything more
+DEFINITIVE = (404, 410)
+
+
+def main():
+    setup_logging()
+    try:
+        args, options = split_options(sys.argv[1:],
+                                      ['people', 'lectures', 'documents', 'outreach',
+                                       'cache', 'ttl', 'jobs', 'per-host', 'timeout'] +
+                                      timings.OPTIONS + logs.OPTIONS)
+        if args:
+            msg = 'Unexpected arguments %r.' % args
+            raise UsageError(msg)
+        configure_logging(options)
+        try:
+            ttl = float(options.get('ttl') or TTL)
+            jobs = int(options.get('jobs') or JOBS)
+            per_host = int(options.get('per-host') or PER_HOST)
+            timeout = float(options.get('timeout') or TIMEOUT)
+        except ValueError as e:
+            msg = 'Invalid option: %s' % e
+            raise UsageError(msg)
+        with timings.instrumented(options):
+            go(options.get('people') or None, options.get('lectures') or None,
+               options.get('documents') or None, options.get('outreach') or None,
+               cache_filename=options.get('cache') or None, ttl=ttl, jobs=jobs,
+               per_host=per_host, timeout=timeout)
+    except (MyExc, UsageError) as e:
+        logger.error(e)
+        sys.exit(-2)
+    except Exception as e:
+        import traceback
+        logger.error(traceback.format_exc(e))
+        sys.exit(-1)
+
+
+def go(people=None, lectures=None, documents=None, outreach=None, cache_filename=None,
+       ttl=TTL, jobs=JOBS, per_host=PER_HOST, timeout=TIMEOUT):
+    from ingest import load_documents, load_lectures, load_outreach, load_people
+
+    with stage('read'):
+        records = {}
+        if people is not None:
+            records['people'] = load_people(people)[0]
+        if lectures is not None:
+            records['lectures'] = load_lectures(lectures)
+        if documents is not None:
+            records['documents'] = load_documents(documents)
+        if outreach is not None:
+            records['outreach'] = load_outreach(outreach)
+    if not records:
+        msg = 'Nothing to check: give --people, --lectures, --documents or --outreach.'
+        raise UsageError(msg)
+
+    urls = extract_urls(**records)
+    logger.info('%d distinct URLs in %d fields', len(urls), sum(len(v) for v in urls.values()))
+
+    cache = LinkCache(cache_filename, ttl)
+    with stage('check'):
+        results = check_urls(sorted(urls), cache, jobs, per_host, timeout)
+    cache.save()
+
+    context = Context()
+    for url in sorted(urls):
+        result = results[url]
+        if result['ok']:
+            continue
+        problem = result['error'] or 'HTTP %s' % result['status']
+        for path in urls[url]:
+            with context.sub(path):
+                context.error('Broken link %s (%s)', (url, problem), code='broken-link')
+    context.bail()
+
+
+def _vimeo_url(v):
+    if '/' in v:
+        return v
+    return 'https://vimeo.com/' + v
+
+
+def extract_urls(people=None, lectures=None, documents=None, outreach=None):
+    """ Returns url -> list of "input:record:field" where it is used. """
+    res = {}
+
+    def add(url, *path):
+        if url and isinstance(url, (type(''), type(u''))) and \
+                urlparse(url).scheme in ('http', 'https'):
+            res.setdefault(url, []).append(':'.join(path))
+
+    for handle, p in sorted((people or {}).items()):
+        add(p['url'], 'people', handle, 'url')
+    for id_lecture, l in sorted((lectures or {}).items()):
+        for v in l['vimeo'] or []:
+            add(_vimeo_url('%s' % v), 'lectures', id_lecture, 'vimeo')
+        for i, f in enumerate(l['files']):
+            add(f['url'], 'lectures', id_lecture, 'files[%d].url' % i)
+    for i, d in enumerate(documents or []):
+        add(d['google_docs_share_link'], 'documents', d.get('id') or str(i),
+            'google_docs_share_link')
+    for i, d in enumerate(outreach or []):
+        for field in ('institution_url', 'project_url'):
+            add(d.get(field), 'outreach', d.get('id') or str(i), field)
+    return res
+
+
+class LinkCache(object):
+    """ url -> {'checked', 'ok', 'status', 'error'}, kept in a JSON file;
+        entries older than ttl seconds are stale. """
+
+    def __init__(self, filename=None, ttl=TTL):
+        self.filename = filename
+        self.ttl = ttl
+        self.entries = {}
+        if filename is not None and os.path.exists(filename):
+            try:
+                with open(filename) as f:
+                    self.entries = json.load(f)
+            except ValueError:
+                logger.warning('Ignoring invalid link cache %r.', filename)
+
+    def get(self, url, now=None):
+        """ Returns the result if it is fresh, else None. """
+        entry = self.entries.get(url)
+        if entry is None or (now or time.time()) - entry['checked'] > self.ttl:
+            return None
+        if is_transient(entry):  # left by an older version
+            return None
+        return entry
+
+    def put(self, url, result):
+        if is_transient(result):
+            self.entries.pop(url, None)
+            return
+        self.entries[url] = result
+
+    def save(self):
+        if self.filename is None:
+            return
+        from outputs import atomic_write
+        data = json.dumps(self.entries, indent=1, sort_keys=True, separators=(',', ': '))
+        atomic_write(self.filename, data.encode('utf-8'))
+
+
+def is_transient(result):
+    """ No response at all, or a server error: worth checking again soon. """
+    status = result['status']
+    return status is None or status >= 500
+
+
+def _request(url, method, timeout):
+    """ Returns the final HTTP status; raises HTTPError or URLError. """
+    req = Request(url, headers={'User-Agent': USER_AGENT})
+    req.get_method = lambda: method
+    response = urlopen(req, timeout=timeout)
+    try:
+        return response.getcode()
+    finally:
+        response.close()
+
+
+def check_url(url, timeout=TIMEOUT):
+    """ HEAD, then GET if the HEAD failed. Returns a cache entry. """
+    import socket
+    result = {'checked': time.time(), 'ok': False, 'status': None, 'error': None}
+    for method in ('HEAD', 'GET'):
+        try:
+            result['status'] = _request(url, method, timeout)
+            result['error'] = None
+        except HTTPError as e:
+            result['status'] = e.code
+            result['error'] = None
+            if e.code in DEFINITIVE:
+                break
+            continue
+        except (URLError, socket.error, ValueError) as e:
+            result['error'] = '%s' % (getattr(e, 'reason', None) or e)
+            continue
+        result['ok'] = result['status'] < 400
+        if result['ok']:
+            break
+    return result
+
+
+def _host(url):
+    return urlparse(url).netloc.lower()
+
+
+class _HostQueues(object):
+    """ The URLs to check, in one queue per host. take() hands out a URL
+        of the next host, round robin, that has fewer than per_host
+        requests in flight, so that a worker is never held up by a busy
+        host while there is work for the others. """
+
+    def __init__(self, urls, per_host):
+        self.per_host = per_host
+        self.cond = threading.Condition()
+        self.queues = {}
+        self.active = {}
+        self.hosts = []  # the hosts with queued URLs, in round-robin order
+        for url in urls:
+            host = _host(url)
+            if not host in self.queues:
+                self.queues[host] = deque()
+                self.active[host] = 0
+                self.hosts.append(host)
+            self.queues[host].append(url)
+
+    def take(self):
+        """ Returns the next URL, waiting for a free host if needed, or
+            None if there are no more. """
+        with self.cond:
+            while self.hosts:
+                for i, host in enumerate(self.hosts):
+                    if self.active[host] < self.per_host:
+                        del self.hosts[i]
+                        url = self.queues[host].popleft()
+                        if self.queues[host]:
+                            self.hosts.append(host)
+                        self.active[host] += 1
+                        return url
+                self.cond.wait()
+            return None
+
+    def done(self, url):
+        with self.cond:
+            self.active[_host(url)] -= 1
+            self.cond.notify_all()
+
+
+def check_urls(urls, cache, jobs=JOBS, per_host=PER_HOST, timeout=TIMEOUT):
+    """ Returns url -> result, checking only the URLs that are not fresh
+        in the cache, jobs at a time and at most per_host per host. """
+    now = time.time()
+    results = {}
+    todo = []
+    for url in urls:
+        entry = cache.get(url, now)
+        if entry is not None:
+            results[url] = entry
+        else:
+            todo.append(url)
+    logger.info('links: %d cached, %d to check', len(results), len(todo))
+    if not todo:
+        return results
+
+    queues = _HostQueues(todo, per_host)
+
+    def work(_):
+        checked = []
+        while True:
+            url = queues.take()
+            if url is None:
+                return checked
+            t0 = time.time()
+            try:
+                result = check_url(url, timeout)
+            finally:
+                queues.done(url)
+            logger.debug('%s: %s %s (%.0f ms)', url, result['status'], result['error'] or '',
+                         1000 * (time.time() - t0))
+            checked.append((url, result))
+
+    from multiprocessing.pool import ThreadPool
+    n = max(1, min(jobs, len(todo)))
+    pool = ThreadPool(n)
+    try:
+        checked = [x for xs in pool.map(work, range(n)) for x in xs]
+    finally:
+        pool.close()
+        pool.join()
+    for url, result in checked:
+        cache.put(url, result)
+        results[url] = result
+    n_broken = sum(1 for _, r in checked if not r['ok'])
+    logger.info('links: %d checked, %d broken', len(checked), n_broken)
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+"""
+    Validate-only check of the DB, for the pre-commit hook: parses and
+    normalizes the inputs of the generators, without rendering anything.
+
+        python src/lint.py --people=db --lectures=lectures.yaml \\
+            --documents=documents.yaml --outreach=outreach.yaml
+
+    --people is a glob, a snapshot or a DB directory, as for the
+    generators. Every people file and every other input is checked in
+    parallel, in a process pool (--jobs), each with its own diagnostics,
+    so that all the problems are reported at once: an invalid YAML file
+    is one error, and the others are still checked. The presenters of the
+    lectures are then checked against the people.
+
+    Warnings are reported; if there are errors, the script exits with -2.
+"""
+import glob
+import logging
+import os
+import sys
+import time
+
+from cli import UsageError, split_options
+import logs
+from logs import setup_logging, configure_logging
+from people import MyExc, Context
+import timings
+from timings import stage
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['make_tasks', 'check_task', 'check_all']
+
+# people files per task sent to a worker
+CHUNK = 8
+
+# problems kept per code and task; all of them are reported
+MAX_EXAMPLES = 1000
+
+
+def main():
+    setup_logging()
+    try:
+        args, options = split_options(sys.argv[1:],
+                                      ['people', 'lectures', 'documents',
+                                       'outreach', 'jobs'] +
+                                      timings.OPTIONS + logs.OPTIONS)
+        if args:
+            msg = 'Unexpected arguments %r.' % args
+            raise UsageError(msg)
+        configure_logging(options)
+        try:
+            jobs = int(options['jobs']) if options.get('jobs') else None
+        except ValueError:
+            msg = 'Invalid --jobs=%s.' % options['jobs']
+            raise UsageError(msg)
+        with timings.instrumented(options):
+            go(options.get('people') or None, options.get('lectures') or None,
+               options.get('documents') or None, options.get('outreach') or None,
+               jobs=jobs)
+    except (MyExc, UsageError) as e:
+        logger.error(e)
+        sys.exit(-2)
+    except Exception as e:
+        import traceback
+        logger.error(traceback.format_exc(e))
+        sys.exit(-1)
+
+
+def go(people=None, lectures=None, documents=None, outreach=None, jobs=None):
+    t0 = time.time()
+    tasks = make_tasks(people, lectures, documents, outreach)
+    if not tasks:
+        msg = 'Nothing to check: give --people, --lectures, --documents or --outreach.'
+        raise UsageError(msg)
+    with stage('check'):
+        results = check_all(tasks, jobs)
+
+    warnings = []
+    errors = []
+    n_warnings = n_errors = 0
+    handles = set()
+    presenters = {}
+    for r in results:
+        n_warnings += r['warnings'][0]
+        warnings.extend(r['warnings'][1])
+        n_errors += r['errors'][0]
+        errors.extend(r['errors'][1])
+        handles.update(r['handles'])
+        presenters.update(r['presenters'])
+
+    if people is not None:
+        for id_lecture in sorted(presenters):
+            for p in presenters[id_lecture]:
+                if not p in handles:
+                    n_warnings += 1
+                    warnings.append('lectures:%s:No person %r.' % (id_lecture, p))
+
+    n_files = sum(len(t[1]) for t in tasks)
+    logger.info('checked %d files in %.2f s: %d warnings, %d errors',
+                n_files, time.time() - t0, n_warnings, n_errors)
+    if warnings:
+        logger.warning('\n'.join(['Please fix the following problems:'] + warnings))
+    if errors:
+        logger.error('\n'.join(['You need to fix the following problems:'] + errors))
+        msg = 'Errors in the input.'
+        raise MyExc(msg)
+
+
+def _people_files(people):
+    """ Returns a sorted list of (id, filename); id is "cohort/handle"
+        for a DB directory. """
+    from cohorts import SEP, discover_cohorts, is_cohort_db
+    if is_cohort_db(people):
+        res = []
+        for cohort in discover_cohorts(people):
+            for filename in glob.glob(os.path.join(people, cohort, '*.yaml')):
+                handle = os.path.splitext(os.path.basename(filename))[0]
+                res.append((cohort + SEP + handle, filename))
+        return sorted(res)
+    return sorted((os.path.splitext(os.path.basename(f))[0], f)
+                  for f in glob.glob(people))
+
+
+def make_tasks(people=None, lectures=None, documents=None, outreach=None):
+    """ Returns a list of (kind, [(id, filename), ...]). """
+    tasks = []
+    for kind, filename in [('lectures', lectures), ('documents', documents),
+                           ('outreach', outreach)]:
+        if filename is None:
+            continue
+        if not os.path.exists(filename):
+            msg = 'Could not find file %r.' % filename
+            raise UsageError(msg)
+        tasks.append((kind, [(kind, filename)]))
+    if people is not None:
+        from archive import is_archive
+        from snapshot import is_snapshot
+        if is_snapshot(people) or is_archive(people):
+            tasks.append(('people-db', [('people', people)]))
+        else:
+            files = _people_files(people)
+            if not files:
+                msg = 'No people files match %r.' % people
+                raise UsageError(msg)
+            for i in range(0, len(files), CHUNK):
+                tasks.append(('people', files[i:i + CHUNK]))
+    return tasks
+
+
+def _check_people(files, context, res):
+    from people import normalize_person, read_yaml_dict
+    for id_person, filename in files:
+        handle = id_person.split('/')[-1]
+        res['handles'].extend(set([id_person, handle]))
+        with context.sub(id_person):
+            try:
+                value = read_yaml_dict(filename)
+            except MyExc as e:
+                context.error('%s', (e,), code='invalid-yaml')
+                continue
+        if handle == id_person:
+            normalize_person(handle, value, context)
+        else:
+            with context.sub(id_person[:-len(handle) - 1]):
+                normalize_person(handle, value, context)
+
+
+def _check_people_db(filename, context, res):
+    """ A snapshot or an archive, read as a whole. """
+    from people import read_people
+    with context.sub('people'):
+        res['handles'].extend(read_people(filename, context))
+
+
+def _check_lectures(filename, context, res):
+    from generate_lectures import read_lectures
+    with context.sub('lectures'):
+        lectures = read_lectures(filename, context)
+    for id_lecture, l in lectures.items():
+        if isinstance(l.get('presenters'), (list, tuple)):
+            res['presenters'][id_lecture] = list(l['presenters'])
+
+
+def _check_list(filename, context, res, kind):  # @UnusedVariable
+    import yaml
+    import generate_documents
+    import generate_outreach
+    normalize = {'documents': generate_documents.normalize_documents,
+                 'outreach': generate_outreach.normalize_outreach_list}[kind]
+    exceptions = (MyExc, generate_documents.MyExc, generate_outreach.MyExc)
+    with context.sub(kind):
+        try:
+            with open(filename) as f:
+                values = yaml.load(f.read())
+        except yaml.YAMLError as e:
+            context.error('Yaml file is invalid:\n%s', (e,), code='invalid-yaml')
+            return
+        try:
+            normalize(values, context)
+        except exceptions as e:
+            context.error('%s', (e,), code='invalid-value')
+
+
+def check_task(task):
+    """ Worker: checks one task (see make_tasks()). Returns a dict with
+        warnings and errors as (count, messages), the handles of the
+        people and the presenters of the lectures. """
+    kind, files = task
+    context = Context(MAX_EXAMPLES)
+    res = {'handles': [], 'presenters': {}}
+    try:
+        if kind == 'people':
+            _check_people(files, context, res)
+        elif kind == 'people-db':
+            _check_people_db(files[0][1], context, res)
+        elif kind == 'lectures':
+            _check_lectures(files[0][1], context, res)
+        else:
+            _check_list(files[0][1], context, res, kind)
+    except MyExc as e:
+        with context.sub(kind):
+            context.error('%s', (e,), code='invalid-input')
+    res['warnings'] = (len(context.warnings), list(context.warnings))
+    res['errors'] = (len(context.errors), list(context.errors))
+    return res
+
+
+def check_all(tasks, jobs=None):
+    """ Runs check_task() on the tasks, in a process pool. """
+    if jobs == 1 or len(tasks) == 1:
+        return [check_task(t) for t in tasks]
+    import multiprocessing
+    pool = multiprocessing.Pool(jobs)
+    try:
+        return pool.map(check_task, tasks)
+    finally:
+        pool.close()
+        pool.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""
+    Logging setup shared by the scripts.
+
+    Nothing happens at import time: each script calls setup_logging()
+    from its main(), and then configure_logging(options) once the command
+    line has been parsed:
+
+        --log-format=color|plain|json
+            color is the default (plain on Windows or if NO_COLOR is set);
+            plain and json skip the ANSI escapes entirely.
+        --log-level=LEVEL
+        --log-level=people=WARNING,generate_roster=DEBUG
+            a global level, or one level per logger ("stage"); the two
+            forms can be mixed: INFO,generate_roster=DEBUG.
+
+    The modules do not set a level on their own logger: they inherit
+    the one of the root logger (DEBUG unless --log-level says otherwise),
+    so that a disabled call returns before any record is made.
+
+    The scripts pass the arguments to the logger instead of formatting
+    the message themselves (logger.info('x: %s', x)), so nothing is
+    formatted when the level is off; big collections are logged through
+    summarize().
+"""
+import json
+import logging
+import os
+import platform
+import sys
+
+from cli import UsageError
+
+__all__ = ['OPTIONS', 'setup_logging', 'configure_logging', 'summarize']
+
+OPTIONS = ['log-level', 'log-format']
+
+FORMATS = ['color', 'plain', 'json']
+
+RESET = '\x1b[0m'
+
+DEFAULT_LEVEL = logging.DEBUG
+
+_installed = []
+
+
+def level_color(levelno):
+    if(levelno >= 50):
+        return '\x1b[31m'  # red
+    elif(levelno >= 40):
+        return '\x1b[31m'  # red
+    elif(levelno >= 30):
+        return '\x1b[33m'  # yellow
+    elif(levelno >= 20):
+        return '\x1b[32m'  # green
+    elif(levelno >= 10):
+        return '\x1b[35m'  # pink
+    else:
+        return RESET  # normal
+
+
+class ColorFormatter(logging.Formatter):
+    """ Same layout as the basicConfig() one, with the message colored by
+        level. Unlike patching StreamHandler.emit, the record is left alone. """
+
+    def format(self, record):
+        s = logging.Formatter.format(self, record)
+        return '%s:%s:%s%s%s' % (record.levelname, record.name,
+                                 level_color(record.levelno), s, RESET)
+
+
+class JSONFormatter(logging.Formatter):
+    """ One JSON object per line. """
+
+    def format(self, record):
+        d = {'time': record.created,
+             'level': record.levelname,
+             'logger': record.name,
+             'message': record.getMessage()}
+        if record.exc_info:
+            d['exc'] = self.formatException(record.exc_info)
+        return json.dumps(d, sort_keys=True)
+
+
+def make_formatter(log_format):
+    if log_format == 'color':
+        return ColorFormatter('%(message)s')
+    elif log_format == 'json':
+        return JSONFormatter()
+    else:
+        return logging.Formatter(logging.BASIC_FORMAT)
+
+
+def default_format():
+    if platform.system() == 'Windows' or 'NO_COLOR' in os.environ:
+        return 'plain'
+    return 'color'
+
+
+def setup_logging():
+    """ Configures the root handler (once). """
+    if _installed:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(make_formatter(default_format()))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(DEFAULT_LEVEL)
+    # Pillow logs each chunk of the images it opens at DEBUG
+    logging.getLogger('PIL').setLevel(logging.INFO)
+    _installed.append(handler)
+
+
+def configure_logging(options):
+    """ Applies --log-format and --log-level; raises UsageError if they
+        are not valid. """
+    setup_logging()
+    log_format = options.get('log-format')
+    if log_format is not None:
+        if not log_format in FORMATS:
+            msg = 'Invalid --log-format %r; expected one of %s.' % (log_format, ", ".join(FORMATS))
+            raise UsageError(msg)
+        _installed[0].setFormatter(make_formatter(log_format))
+
+    spec = options.get('log-level')
+    if spec is not None:
+        for name, level in parse_levels(spec):
+            if name is None:
+                logging.getLogger().setLevel(level)
+            else:
+                logging.getLogger(name).setLevel(level)
+                if name == _main_name():
+                    logging.getLogger('__main__').setLevel(level)
+
+
+def parse_levels(spec):
+    """ Parses "INFO,people=WARNING" into [(None, 20), ('people', 30)]. """
+    res = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if '=' in item:
+            name, level = item.split('=', 1)
+            name = name.strip()
+        else:
+            name, level = None, item
+        levelno = logging.getLevelName(level.strip().upper())
+        if not isinstance(levelno, int):
+            msg = 'Invalid log level %r in %r.' % (level, spec)
+            raise UsageError(msg)
+        res.append((name, levelno))
+    # global levels first, so that the per-stage ones win
+    res.sort(key=lambda x: x[0] is not None)
+    return res
+
+
+def _main_name():
+    """ The module name of the running script ("generate_roster"), whose
+        logger is called "__main__". """
+    main = sys.modules.get('__main__')
+    filename = getattr(main, '__file__', None)
+    if filename is None:
+        return None
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+class summarize(object):
+    """ Lazy one-line summary of a collection, for logging:
+
+            logger.info('people: %s', summarize(people))
+
+        gives "42 items: andrea, liam, ... (and 32 more)". Nothing is
+        computed unless the message is actually emitted. """
+
+    def __init__(self, collection, limit=10):
+        self.collection = collection
+        self.limit = limit
+
+    def __str__(self):
+        c = self.collection
+        keys = sorted(c) if isinstance(c, (dict, set, frozenset)) else list(c)
+        shown = ", ".join(str(k) for k in keys[:self.limit])
+        s = '%d items: %s' % (len(keys), shown)
+        if len(keys) > self.limit:
+            s += ', ... (and %d more)' % (len(keys) - self.limit)
+        return s
+
+    __repr__ = __str__
@@ -0,0 +1,195 @@
+"""
+    Optional minification of the generated pages (--minify).
+
+    The pages are Jekyll pages: YAML front matter, then Markdown with
+    blocks of HTML. So the minification is conservative, line by line:
+
+    - the front matter is left as it is;
+    - runs of blank lines become one blank line (the same for Markdown);
+    - trailing whitespace is removed, except for the two spaces of a
+      Markdown hard line break;
+    - indentation is removed from HTML lines (starting with "<") and from
+      lines that continue the previous one, but not from lines after a
+      blank line, which could be indented code, nor from list items, so
+      Markdown headings, lists and code blocks are unchanged;
+    - <pre> and <textarea> are left alone;
+    - <style> blocks are minified as CSS (comments and insignificant
+      whitespace removed); <script> blocks lose their indentation, blank
+      lines and whole-line // comments.
+
+    The minifier is streaming: it keeps only the current line (or <style>
+    block), so it can be used as a file-like wrapper around stdout:
+
+        out = MinifyingWriter(sys.stdout, 'lectures.html')
+        out.write(...)
+        out.close()   # logs the bytes saved
+"""
+import logging
+import re
+
+__all__ = ['OPTIONS', 'Minifier', 'MinifyingWriter', 'minify_text']
+
+OPTIONS = ['minify']
+
+logger = logging.getLogger(__name__)
+
+_css_comment = re.compile(r'/\*.*?\*/', re.S)
+_css_space = re.compile(r'\s+')
+_css_punct = re.compile(r'\s*([{};,])\s*')
+_css_colon = re.compile(r':\s+')
+_list_item = re.compile(r'([-*+]|\d+[.)])(\s|$)')
+_open_raw = re.compile(r'<(pre|textarea)\b', re.I)
+_open_block = re.compile(r'<(style|script)\b[^>]*>', re.I)
+
+
+def minify_css(css):
+    css = _css_comment.sub('', css)
+    css = _css_space.sub(' ', css)
+    css = _css_punct.sub(r'\1', css)
+    css = _css_colon.sub(':', css)
+    return css.replace(';}', '}').strip()
+
+
+class Minifier(object):
+    """ feed() returns the minified text for the complete lines so far;
+        close() returns the rest. """
+
+    def __init__(self):
+        self.pending = ''
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.first = True
+        self.front_matter = False
+        # None, 'style', 'script' or the raw tag (pre, textarea)
+        self.mode = None
+        self.css = []
+        self.blank = False
+
+    def feed(self, text):
+        self.bytes_in += len(text)
+        lines = (self.pending + text).split('\n')
+        self.pending = lines.pop()
+        res = ''.join(self._line(l) for l in lines)
+        self.bytes_out += len(res)
+        return res
+
+    def close(self):
+        res = ''
+        if self.pending:
+            res = self._line(self.pending, eol=False)
+            self.pending = ''
+        if self.css:
+            res += minify_css(''.join(self.css))
+            self.css = []
+        self.bytes_out += len(res)
+        return res
+
+    def _line(self, line, eol=True):
+        nl = '\n' if eol else ''
+        if self.first:
+            self.first = False
+            if line.rstrip() == '---':
+                self.front_matter = True
+                return line + nl
+        if self.front_matter:
+            if line.rstrip() == '---':
+                self.front_matter = False
+            return line + nl
+
+        if self.mode == 'style':
+            return self._style(line, nl)
+        if self.mode == 'script':
+            return self._script(line, nl)
+        if self.mode is not None:
+            if ('</%s' % self.mode) in line.lower():
+                self.mode = None
+            return line + nl
+
+        m = _open_raw.search(line)
+        if m and not ('</%s' % m.group(1).lower()) in line.lower():
+            self.mode = m.group(1).lower()
+            self.blank = False
+            return line.rstrip() + nl
+
+        m = _open_block.search(line)
+        if m and not ('</%s' % m.group(1).lower()) in line[m.end():].lower():
+            self.mode = m.group(1).lower()
+            head = self._html(line[:m.end()], '')
+            rest = line[m.end():]
+            if self.mode == 'style':
+                return head + self._style(rest, nl)
+            return head + (self._script(rest, nl) if rest.strip() else nl)
+
+        return self._html(line, nl)
+
+    def _html(self, line, nl):
+        s = line.rstrip()
+        if not s:
+            if self.blank:
+                return ''
+            self.blank = True
+            return nl
+        # taken before the indentation is stripped
+        hard_break = line[len(s):].startswith('  ')
+        stripped = s.lstrip()
+        if stripped.startswith('<') or (not self.blank and not _list_item.match(stripped)):
+            s = stripped
+        if hard_break and not s.endswith('>'):
+            s += '  '  # Markdown hard line break
+        self.blank = False
+        return s + nl
+
+    def _style(self, line, nl):
+        i = line.lower().find('</style')
+        if i == -1:
+            self.css.append(line + '\n')
+            return ''
+        self.css.append(line[:i])
+        css = minify_css(''.join(self.css))
+        self.css = []
+        self.mode = None
+        return css + self._html(line[i:], nl)
+
+    def _script(self, line, nl):
+        i = line.lower().find('</script')
+        if i != -1:
+            self.mode = None
+            code = line[:i].strip()
+            return (code + '\n' if code else '') + self._html(line[i:], nl)
+        s = line.strip()
+        if not s or s.startswith('//'):
+            return ''
+        return s + nl
+
+
+class MinifyingWriter(object):
+    """ File-like wrapper that minifies what is written to stream. """
+
+    def __init__(self, stream, name):
+        self.stream = stream
+        self.name = name
+        self.minifier = Minifier()
+
+    def write(self, text):
+        self.stream.write(self.minifier.feed(text))
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        """ Writes the rest and logs the savings (does not close stream). """
+        self.stream.write(self.minifier.close())
+        log_savings(self.name, self.minifier)
+
+
+def log_savings(name, minifier):
+    n_in, n_out = minifier.bytes_in, minifier.bytes_out
+    logger.info('%s: minified %d -> %d bytes (%d saved, %.1f%%)', name, n_in, n_out,
+                n_in - n_out, 100.0 * (n_in - n_out) / n_in if n_in else 0)
+
+
+def minify_text(text, name):
+    m = Minifier()
+    res = m.feed(text) + m.close()
+    log_savings(name, m)
+    return res
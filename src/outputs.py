@@ -0,0 +1,214 @@
+"""
+    Writing the generated pages to named files (--output=FILE), instead of
+    stdout, without touching the files whose contents did not change:
+
+        python src/generate_lectures.py people lectures.yaml \\
+            --output=lectures.html --manifest=.build-manifest.json
+
+    The new contents are hashed and compared with the existing file; if
+    they are the same, the file (and its mtime) is left alone, so Jekyll
+    does not regenerate anything. Otherwise the file is written to a
+    temporary file in the same directory and renamed over the old one, so
+    readers never see a partial page.
+
+    With --manifest=FILE, a JSON build manifest records the sha256, size
+    and mtime of every output: an output whose size and mtime match the
+    manifest is compared by hash without being read again. Each run logs
+    whether the output changed.
+
+    With --compress=gz,br,zst, precompressed sidecars are written next to
+    each output (see compress.py); they are only regenerated when the
+    output changed. When the output changes, the sidecars of the formats
+    not given (all of them without --compress) are deleted, so that the
+    server does not send the previous contents.
+
+    With --minify, for the HTML pages, output_to() passes what is printed
+    through the streaming minifier in minify.py.
+"""
+from contextlib import contextmanager
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from cli import UsageError
+
+__all__ = ['OPTIONS', 'write_output', 'output_to', 'output_options']
+
+OPTIONS = ['output', 'manifest', 'compress']
+
+logger = logging.getLogger(__name__)
+
+if hasattr(os, 'replace'):
+    _replace = os.replace
+else:  # Python 2; os.rename does not overwrite on Windows
+    def _replace(src, dst):
+        if os.name == 'nt' and os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
+def _as_bytes(contents):
+    if isinstance(contents, bytes):
+        return contents
+    return contents.encode('utf-8')
+
+
+def file_hash(filename):
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def atomic_write(filename, data):
+    """ Writes the bytes to filename through a temporary file + rename. """
+    dirname = os.path.dirname(os.path.abspath(filename))
+    fd, tmp = tempfile.mkstemp(dir=dirname, prefix='.%s.' % os.path.basename(filename),
+                               suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates the file as 0600
+        mode = 0o666 & ~_umask()
+        if os.path.exists(filename):
+            mode = os.stat(filename).st_mode & 0o777
+        os.chmod(tmp, mode)
+        _replace(tmp, filename)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+def read_manifest(manifest):
+    if manifest is None or not os.path.exists(manifest):
+        return {}
+    try:
+        with open(manifest) as f:
+            return json.load(f)
+    except ValueError as e:
+        logger.warning('Ignoring invalid manifest %r: %s', manifest, e)
+        return {}
+
+
+def _manifest_key(filename, manifest):
+    base = os.path.dirname(os.path.abspath(manifest))
+    return os.path.relpath(os.path.abspath(filename), base).replace(os.sep, '/')
+
+
+def _current_hash(filename, entry):
+    """ Hash of the existing file, or None; trusts the manifest entry if
+        size and mtime still match. """
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    if entry and entry.get('size') == st.st_size and entry.get('mtime') == st.st_mtime:
+        return entry.get('sha256')
+    return file_hash(filename)
+
+
+def write_output(filename, contents, manifest=None, compress=None):
+    """ Writes contents (bytes or text, encoded as UTF-8) to filename,
+        unless the file already has the same contents. Returns True if
+        the file was written.
+
+        compress: list of sidecar formats (see compress.parse_formats()). """
+    data = _as_bytes(contents)
+    digest = hashlib.sha256(data).hexdigest()
+
+    entries = read_manifest(manifest)
+    key = _manifest_key(filename, manifest) if manifest is not None else None
+    entry = entries.get(key)
+
+    changed = _current_hash(filename, entry) != digest
+    if changed:
+        atomic_write(filename, data)
+        logger.info('%s: changed (%d bytes)', filename, len(data))
+        from compress import remove_sidecars
+        remove_sidecars(filename, compress or ())
+    else:
+        logger.info('%s: unchanged', filename)
+
+    sidecars = None
+    if compress:
+        from compress import update_sidecars
+        previous = (entry or {}).get('sidecars', {}) if manifest is not None else None
+        sidecars = update_sidecars([(filename, digest, previous)], compress)[filename]
+
+    if manifest is not None:
+        st = os.stat(filename)
+        new_entry = {'sha256': digest, 'size': st.st_size, 'mtime': st.st_mtime,
+                     'changed': time.time() if changed else
+                     (entry or {}).get('changed', st.st_mtime)}
+        if sidecars:
+            new_entry['sidecars'] = sidecars
+        if new_entry != entry:
+            # another script may have updated it meanwhile
+            entries = read_manifest(manifest)
+            entries[key] = new_entry
+            atomic_write(manifest, _as_bytes(json.dumps(entries, indent=1, sort_keys=True,
+                                                         separators=(',', ': '))))
+    return changed
+
+
+if sys.version_info[0] >= 3:
+    from io import StringIO
+else:
+    from StringIO import StringIO
+
+
+def output_options(options, needs_output=True):
+    """ Returns (output, manifest, compress) from the options; output and
+        manifest may be None, compress is a list of formats.
+        needs_output=False allows --manifest and --compress without
+        --output, for scripts that write other files. """
+    output = options.get('output') or None
+    manifest = options.get('manifest') or None
+    compress = []
+    if options.get('compress'):
+        from compress import parse_formats
+        compress = parse_formats(options['compress'])
+    if (manifest is not None or compress) and output is None and needs_output:
+        raise UsageError('--manifest and --compress need --output.')
+    return output, manifest, compress
+
+
+@contextmanager
+def output_to(options, needs_output=True):
+    """ If --output was given, captures what the block prints and writes
+        it with write_output() at the end, if the block succeeded; with
+        --minify, what is printed is minified on the way. """
+    output, manifest, compress = output_options(options, needs_output)
+    minify = 'minify' in options
+    if output is None and not minify:
+        yield
+        return
+    stdout = sys.stdout
+    target = StringIO() if output is not None else stdout
+    if minify:
+        from minify import MinifyingWriter
+        sys.stdout = MinifyingWriter(target, output or 'stdout')
+    else:
+        sys.stdout = target
+    try:
+        yield
+        if minify:
+            sys.stdout.close()
+    finally:
+        sys.stdout = stdout
+    if output is not None:
+        write_output(output, target.getvalue(), manifest, compress)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""
+    Integrity scan of the cached PDFs (media/pdfs/*.pdf), so that a build
+    never passes a truncated download or a saved HTML error page to pdftk:
+
+        python src/pdfcheck.py [--quarantine] [--jobs=N] media/pdfs
+        python src/generate_pdf.py --verify < documents.yaml
+
+    Each file is memory-mapped and only its ends are looked at: the
+    "%PDF-" header in the first 1024 bytes, and the "startxref" and "%%EOF"
+    trailer in the last TRAILER bytes. The files are checked in parallel
+    by a thread pool (the work is mostly page faults, which release the
+    GIL).
+
+    With --quarantine (always with generate_pdf.py --verify) the bad files
+    are moved to media/pdfs/quarantine/, so that generate_pdf.py
+    downloads them again. generate_pdf.py checks each stored blob once
+    (media/pdfs/blobs/, see pdfstore.py) rather than each of its links.
+"""
+import logging
+import mmap
+import os
+import sys
+
+from cli import UsageError, split_options
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['check_pdf', 'scan_pdfs', 'scan_files', 'quarantine']
+
+HEADER = 1024
+TRAILER = 2048
+QUARANTINE = 'quarantine'
+
+
+def check_pdf(filename):
+    """ Returns None if the file looks like a complete PDF, otherwise the
+        reason why not. """
+    with open(filename, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return 'empty file'
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if m.find(b'%PDF-', 0, min(size, HEADER)) == -1:
+                if m[:HEADER].lstrip()[:1] == b'<':
+                    return 'not a PDF (HTML?)'
+                return 'no %PDF- header'
+            start = max(0, size - TRAILER)
+            if m.rfind(b'%%EOF', start) == -1:
+                return 'truncated (no %EOF)'
+            if m.rfind(b'startxref', start) == -1:
+                return 'truncated (no startxref)'
+        finally:
+            m.close()
+    return None
+
+
+def _check(filename):
+    try:
+        return filename, check_pdf(filename)
+    except (IOError, OSError, ValueError) as e:
+        return filename, 'cannot read: %s' % e
+
+
+def scan_pdfs(directory, jobs=None):
+    """ Checks the *.pdf files in directory; returns filename -> reason
+        for the bad ones. """
+    if not os.path.isdir(directory):
+        return {}
+    filenames = [os.path.join(directory, f) for f in sorted(os.listdir(directory))
+                 if f.endswith('.pdf') and os.path.isfile(os.path.join(directory, f))]
+    bad = scan_files(filenames, jobs)
+    logger.info('%s: %d PDFs checked, %d bad', directory, len(filenames), len(bad))
+    return bad
+
+
+def scan_files(filenames, jobs=None):
+    """ Checks the given files; returns filename -> reason for the bad
+        ones. """
+    if len(filenames) > 1 and jobs != 1:
+        from multiprocessing.pool import ThreadPool
+        from compress import _cpu_count
+        pool = ThreadPool(min(len(filenames), jobs or 2 * _cpu_count()))
+        try:
+            results = pool.map(_check, filenames)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_check(f) for f in filenames]
+    return dict((f, reason) for f, reason in results if reason is not None)
+
+
+def quarantine(filename):
+    """ Moves filename to the quarantine directory next to it; returns the
+        new name. """
+    from outputs import _replace
+    d = os.path.join(os.path.dirname(filename), QUARANTINE)
+    if not os.path.exists(d):
+        os.makedirs(d)
+    target = os.path.join(d, os.path.basename(filename))
+    _replace(filename, target)
+    return target
+
+
+def main():
+    from logs import setup_logging
+    setup_logging()
+    try:
+        args, options = split_options(sys.argv[1:], ['quarantine', 'jobs'])
+        if len(args) != 1:
+            msg = 'Usage: pdfcheck.py [--quarantine] [--jobs=N] DIR'
+            raise UsageError(msg)
+        jobs = int(options['jobs']) if options.get('jobs') else None
+        bad = scan_pdfs(args[0], jobs)
+        for filename in sorted(bad):
+            if 'quarantine' in options:
+                logger.warning('%s: %s; moved to %s', filename, bad[filename],
+                               quarantine(filename))
+            else:
+                logger.warning('%s: %s', filename, bad[filename])
+        if bad and not 'quarantine' in options:
+            sys.exit(1)
+    except (UsageError, ValueError) as e:
+        logger.error(e)
+        sys.exit(-2)
+
+
+if __name__ == '__main__':
+    main()
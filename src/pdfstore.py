@@ -0,0 +1,142 @@
+"""
+    Content-addressed store for the PDF exports of the documents:
+
+        media/pdfs/blobs/<sha256>.pdf   the contents, stored once
+        media/pdfs/index.json           {"ids": {id: sha256}, "merged": ...}
+        media/pdfs/<id>.pdf             hard link to the blob (a symlink
+                                        where hard links are not possible,
+                                        a copy as a last resort)
+
+    The same document shared through several links or ids is stored
+    once, and the pages keep linking to media/pdfs/<id>.pdf. The files
+    of the previous layout (a plain media/pdfs/<id>.pdf) are moved into
+    the store the first time they are looked up.
+
+    The hashes also key the merged PDF: generate_pdf.py records the
+    hash of the list of blobs it merged, and skips pdftk when the list
+    did not change.
+"""
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['PdfStore', 'merge_key']
+
+BLOBS = 'blobs'
+INDEX = 'index.json'
+
+
+def merge_key(hashes):
+    """ The key of the merge of the blobs, in order. """
+    return hashlib.sha256(' '.join(hashes).encode('ascii')).hexdigest()
+
+
+def _link(src, dst):
+    """ Makes dst a hard link to src, or a symlink, or a copy. """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+        return
+    except (AttributeError, OSError):  # no os.link on Windows with Python 2
+        pass
+    try:
+        os.symlink(os.path.relpath(src, os.path.dirname(dst)), dst)
+        return
+    except (AttributeError, NotImplementedError, OSError):
+        pass
+    import shutil
+    shutil.copyfile(src, dst)
+
+
+class PdfStore(object):
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.blob_dir = os.path.join(directory, BLOBS)
+        self.index_filename = os.path.join(directory, INDEX)
+        self.index = {'ids': {}, 'merged': None}
+        self.dirty = False
+        if os.path.exists(self.index_filename):
+            try:
+                with open(self.index_filename) as f:
+                    self.index.update(json.load(f))
+            except ValueError:
+                logger.warning('Ignoring invalid PDF index %r.', self.index_filename)
+        if not os.path.exists(self.blob_dir):
+            os.makedirs(self.blob_dir)
+
+    def blob(self, digest):
+        return os.path.join(self.blob_dir, digest + '.pdf')
+
+    def path(self, id_document):
+        return os.path.join(self.directory, id_document + '.pdf')
+
+    def digest(self, id_document):
+        return self.index['ids'].get(id_document)
+
+    def get(self, id_document):
+        """ Returns the file of the document, or None if it is not stored.
+            Repairs the link if needed, and adopts a plain file from the
+            previous layout. """
+        digest = self.digest(id_document)
+        filename = self.path(id_document)
+        if digest is not None and os.path.exists(self.blob(digest)):
+            if not os.path.exists(filename):
+                _link(self.blob(digest), filename)
+            return filename
+        if os.path.isfile(filename) and not os.path.islink(filename):
+            with open(filename, 'rb') as f:
+                self.put(id_document, f.read())
+            logger.info('%s: moved into the store', filename)
+            return filename
+        return None
+
+    def put(self, id_document, data):
+        """ Stores the contents of the document; returns its file. """
+        from outputs import atomic_write
+        digest = hashlib.sha256(data).hexdigest()
+        blob = self.blob(digest)
+        if os.path.exists(blob):
+            same = sorted(i for i, h in self.index['ids'].items()
+                          if h == digest and i != id_document)
+            if same:
+                logger.info('%s: same contents as %s', id_document, ", ".join(same))
+        else:
+            atomic_write(blob, data)
+        _link(blob, self.path(id_document))
+        self.index['ids'][id_document] = digest
+        self.dirty = True
+        return self.path(id_document)
+
+    def forget_blob(self, digest):
+        """ Drops the ids stored with the given contents (e.g. a corrupt
+            blob that was quarantined), and their links. """
+        for id_document, h in list(self.index['ids'].items()):
+            if h == digest:
+                del self.index['ids'][id_document]
+                if os.path.lexists(self.path(id_document)):
+                    os.remove(self.path(id_document))
+                self.dirty = True
+
+    def set_merged(self, key):
+        if self.index.get('merged') != key:
+            self.index['merged'] = key
+            self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        from outputs import atomic_write
+        data = json.dumps(self.index, indent=1, sort_keys=True, separators=(',', ': '))
+        atomic_write(self.index_filename, data.encode('utf-8'))
+        self.dirty = False
+
+    def stats(self):
+        """ (number of ids, number of blobs, bytes in the blobs). """
+        blobs = [f for f in os.listdir(self.blob_dir) if f.endswith('.pdf')]
+        size = sum(os.path.getsize(os.path.join(self.blob_dir, f)) for f in blobs)
+        return len(self.index['ids']), len(blobs), size
@@ -0,0 +1,146 @@
+"""
+    Reading and normalization of the people DB (db/<cohort>/*.yaml),
+    shared by generate_roster and generate_lectures.
+"""
+import logging
+import os
+
+import diagnostics
+from records import Person
+from schema import Field, compile_schema
+
+logger = logging.getLogger(__name__)
+
+
+class MyExc(Exception):
+    pass
+
+
+class Context(diagnostics.Context):
+    exception = MyExc
+
+
+def write_diagnostics(context, filename):
+    """ Writes the warnings and errors as JSON, for tooling. """
+    with open(filename, 'w') as f:
+        f.write(context.as_json())
+
+
+def read_yaml_dict(filename):
+    if not os.path.exists(filename):
+        msg = 'Could not find file %r.' % filename
+        raise Exception(msg)
+
+    yaml_string = open(filename).read()
+    return parse_yaml_dict(yaml_string)
+
+def parse_yaml_dict(yaml_string):
+    import yaml
+
+    try:
+        values = yaml.load(yaml_string)
+    except yaml.YAMLError as e:
+        msg = 'Yaml file is invalid:\n---\n%s' % e
+        raise MyExc(msg)
+
+    if not isinstance(values, dict):
+        msg = 'Invalid content: %s' % values
+        raise MyExc(msg)
+
+    return values
+
+def read_people(people_filename, context):
+    """ people_filename is either a glob of YAML files, a snapshot
+        compiled by snapshot.py or an archive (see archive.py). """
+    from snapshot import is_snapshot
+    if is_snapshot(people_filename):
+        return read_people_snapshot(people_filename, context)
+
+    from archive import is_archive
+    if is_archive(people_filename):
+        return read_people_archive(people_filename, context)
+
+    import glob
+
+    values = {}
+    listing = glob.glob(people_filename)
+    for filename in listing:
+        handle = os.path.splitext(os.path.basename(filename))[0]
+        logger.info('%s - %s ', handle, filename)
+        value = read_yaml_dict(filename)
+        values[handle] = Person.from_dict(normalize_person(handle, value, context))
+    return values
+
+def read_people_snapshot(snapshot_filename, context):
+    """ Keyed by "cohort/handle" if the snapshot has several cohorts
+        (see snapshot.record_keys()). """
+    from snapshot import load_people_records, record_keys
+
+    values = {}
+    records = load_people_records(snapshot_filename)
+    logger.info('%s: %d people', snapshot_filename, len(records))
+    for key, (handle, cohort, _, value) in zip(record_keys(records), records):
+        if key == handle:
+            values[key] = Person.from_dict(normalize_person(handle, value, context))
+        else:
+            with context.sub(cohort):
+                values[key] = Person.from_dict(normalize_person(handle, value, context))
+    return values
+
+def read_people_archive(archive_filename, context):
+    """ The photos are extracted in the same pass (archive.archive_photos). """
+    from archive import photo_cache_dir, read_archive
+
+    values = {}
+    records, _ = read_archive(archive_filename, photo_cache_dir(archive_filename))
+    for handle, name, yaml_string in records:
+        try:
+            value = parse_yaml_dict(yaml_string)
+        except MyExc as e:
+            msg = '%s: %s' % (name, e)
+            raise MyExc(msg)
+        values[handle] = Person.from_dict(normalize_person(handle, value, context))
+    return values
+
+def normalize_name(v, context):  # @UnusedVariable
+    return v
+
+
+def normalize_url(v, context):  # @UnusedVariable
+    if v is None:
+        context.warn('Empty URL', code='empty-url')
+    # existence is checked by linkcheck.py
+    return v
+
+
+def normalize_string(v, context):  # @UnusedVariable
+    if v is None:
+        context.warn('empty string', code='empty-string')
+    return v
+
+def normalize_tags(v, context):
+    if v is None:
+        context.warn('No tags specified', code='no-tags')
+        return []
+    return v
+
+def normalize_position(v, context):
+    if v is None:
+        context.warn('No position specified', code='no-position')
+        return ''
+    return v
+
+def normalize_bio(v, context):
+    if v is None:
+        context.warn('No bio.', code='no-bio')
+        return ''
+    return v
+
+normalize_person = compile_schema([
+    Field('order', default=100),
+    Field('name', normalize_name),
+    Field('position', normalize_position),
+    Field('url', normalize_url),
+    Field('bio', normalize_bio),
+    Field('tags', normalize_tags),
+], catch=MyExc)
@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+"""
+    Local preview server for the generated pages, to check an edit to a
+    bio or a lecture without running the generators and Jekyll:
+
+        python src/preview.py --people='db/2016-MIT/*.yaml' \\
+            --lectures=lectures.yaml --documents=documents.yaml \\
+            --outreach=outreach.yaml [--port=8000] [--host=127.0.0.1]
+
+    and then open http://127.0.0.1:8000/. The pages are
+
+        /roster.html      needs --people (a glob, a snapshot or db/)
+        /lectures.html    needs --people and --lectures
+        /documents.html   needs --documents (and 05_materials.begin in the
+                          current directory, as generate_documents.py)
+        /outreach.html    needs --outreach
+
+    The inputs are parsed and normalized once and kept in memory; an input
+    is parsed again only when one of its files changes (mtime, size, or
+    files added and removed). Each rendered page is cached with the state
+    of its inputs, so a refresh without changes is served from memory, and
+    a change to the lectures does not render the roster again.
+
+    The pages are the outputs of the generators, without the Jekyll front
+    matter; the Markdown parts are not rendered. Problems in the inputs
+    are shown in the page, with the warnings in the log.
+"""
+import glob
+import logging
+import os
+import sys
+import time
+
+from cli import UsageError, split_options
+from ingest import (load_documents, load_lectures, load_outreach, load_people,
+                    log_diagnostics)
+import logs
+from logs import setup_logging, configure_logging
+from people import MyExc, Context
+
+if sys.version_info[0] >= 3:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+else:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['Input', 'Preview']
+
+
+def main():
+    setup_logging()
+    try:
+        args, options = split_options(sys.argv[1:],
+                                      ['people', 'lectures', 'documents', 'outreach',
+                                       'host', 'port'] + logs.OPTIONS)
+        if args:
+            msg = 'Unexpected arguments %r.' % args
+            raise UsageError(msg)
+        configure_logging(options)
+        try:
+            port = int(options.get('port') or 8000)
+        except ValueError:
+            msg = 'Invalid --port=%s.' % options['port']
+            raise UsageError(msg)
+        preview = Preview(people=options.get('people') or None,
+                          lectures=options.get('lectures') or None,
+                          documents=options.get('documents') or None,
+                          outreach=options.get('outreach') or None)
+        if not preview.pages:
+            msg = 'Nothing to preview: give --people, --lectures, --documents or --outreach.'
+            raise UsageError(msg)
+        serve(preview, options.get('host') or '127.0.0.1', port)
+    except (MyExc, UsageError) as e:
+        logger.error(e)
+        sys.exit(-2)
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        import traceback
+        logger.error(traceback.format_exc(e))
+        sys.exit(-1)
+
+
+class Input(object):
+    """ One input (a file, a glob or a DB directory) and its parsed value,
+        kept until one of its files changes. """
+
+    def __init__(self, name, pattern, load):
+        self.name = name
+        self.pattern = pattern
+        self.load = load
+        self.value = None
+        self.state = None
+
+    def files(self):
+        from cohorts import is_cohort_db
+        if is_cohort_db(self.pattern):
+            return glob.glob(os.path.join(self.pattern, '*', '*.yaml'))
+        if glob.has_magic(self.pattern):
+            return glob.glob(self.pattern)
+        return [self.pattern]
+
+    def current_state(self):
+        """ Sorted (filename, mtime, size) of the files; a missing file
+            has mtime and size None. """
+        res = []
+        for filename in sorted(self.files()):
+            try:
+                st = os.stat(filename)
+                res.append((filename, st.st_mtime, st.st_size))
+            except OSError:
+                res.append((filename, None, None))
+        return tuple(res)
+
+    def get(self):
+        """ Returns (value, state), parsing the input again if it changed. """
+        state = self.current_state()
+        if state != self.state:
+            t0 = time.time()
+            self.value = None
+            self.state = None
+            self.value = self.load(self.pattern)
+            self.state = state
+            logger.info('%s: parsed %s in %.1f ms', self.name, self.pattern,
+                        1000 * (time.time() - t0))
+        return self.value, self.state
+
+
+def _read_file(filename):
+    with open(filename) as f:
+        return f.read()
+
+
+def _printed(f, *args):
+    """ Returns what f(*args) prints. """
+    from outputs import StringIO
+    stdout = sys.stdout
+    sys.stdout = buf = StringIO()
+    try:
+        f(*args)
+    finally:
+        sys.stdout = stdout
+    return buf.getvalue()
+
+
+def render_roster(people, photos):
+    from generate_roster import generate_roster, roster_page
+    return roster_page(generate_roster(people[0], photos))
+
+
+def render_lectures(people, lectures):
+    from generate_lectures import generate, lectures_page
+    context = Context()
+    res = generate(lectures, people[1], context)
+    log_diagnostics(context)
+    return lectures_page(res)
+
+
+def render_documents(documents, head):  # @UnusedVariable
+    from generate_documents import generate_page
+    return _printed(generate_page, documents)
+
+
+def render_outreach(outreach):
+    from generate_outreach import generate_page
+    return _printed(generate_page, outreach)
+
+
+class Preview(object):
+    """ The inputs, and the rendered pages cached by the state of their
+        inputs. """
+
+    def __init__(self, people=None, lectures=None, documents=None, outreach=None):
+        from generate_roster import Photos
+        from imageinfo import ImageIndex
+        # the photo sizes are cached for the whole session, by mtime;
+        # Photos only for one render, as it does not look at the files again
+        self.images = ImageIndex()
+        inputs = {}
+        if people is not None:
+            inputs['people'] = Input('people', people, load_people)
+        if lectures is not None:
+            inputs['lectures'] = Input('lectures', lectures, load_lectures)
+        if documents is not None:
+            inputs['documents'] = Input('documents', documents, load_documents)
+            inputs['head'] = Input('head', '05_materials.begin', _read_file)
+        if outreach is not None:
+            inputs['outreach'] = Input('outreach', outreach, load_outreach)
+        self.inputs = inputs
+
+        # page -> (names of the inputs, render function)
+        pages = {
+            'roster.html': (['people'],
+                            lambda people: render_roster(people, Photos(self.images))),
+            'lectures.html': (['people', 'lectures'], render_lectures),
+            'documents.html': (['documents', 'head'], render_documents),
+            'outreach.html': (['outreach'], render_outreach),
+        }
+        self.pages = dict((name, page) for name, page in pages.items()
+                          if all(i in inputs for i in page[0]))
+        # page -> (states of the inputs, text)
+        self.cache = {}
+
+    def render(self, name):
+        """ Returns (text, cached). Raises KeyError for unknown pages. """
+        needed, render = self.pages[name]
+        values = []
+        states = []
+        for i in needed:
+            value, state = self.inputs[i].get()
+            values.append(value)
+            states.append(state)
+        states = tuple(states)
+        cached = self.cache.get(name)
+        if cached is not None and cached[0] == states:
+            return cached[1], True
+        text = render(*values)
+        self.cache[name] = (states, text)
+        return text, False
+
+
+def strip_front_matter(text):
+    if text.startswith('---\n'):
+        end = text.find('\n---', 4)
+        if end != -1:
+            return text[text.find('\n', end + 1) + 1:]
+    return text
+
+
+def _index(preview):
+    links = ''.join("<li><a href='/%s'>%s</a></li>\n" % (name, name)
+                    for name in sorted(preview.pages))
+    return '<html><body><ul>\n%s</ul></body></html>\n' % links
+
+
+def _page(body):
+    return ("<html><head><meta charset='utf-8'></head><body>\n%s\n</body></html>\n"
+            % body)
+
+
+def _escape(s):
+    return s.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def make_handler(preview):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            from outputs import _as_bytes
+            name = self.path.split('?')[0].lstrip('/')
+            t0 = time.time()
+            status = 200
+            if name in ('', 'index.html'):
+                body = _index(preview)
+            elif name in preview.pages:
+                try:
+                    text, cached = preview.render(name)
+                    body = _page(strip_front_matter(text))
+                    logger.info('%s: %s in %.1f ms', name,
+                                'cached' if cached else 'rendered',
+                                1000 * (time.time() - t0))
+                except Exception as e:
+                    status = 500
+                    body = _page('<pre>%s</pre>' % _escape(u'%s' % e))
+                    logger.error('%s: %s', name, e)
+            else:
+                status = 404
+                body = _page('No page %s.' % _escape(name))
+            data = _as_bytes(body)
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):  # @ReservedAssignment
+            logger.debug(format, *args)
+
+    return Handler
+
+
+def serve(preview, host, port):
+    server = HTTPServer((host, port), make_handler(preview))
+    logger.info('Serving %s on http://%s:%d/', ", ".join(sorted(preview.pages)),
+                host, port)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+    Compact record types for the normalized people, lectures, documents
+    and outreach entries.
+
+    The records use __slots__ instead of a per-record dict, and the tags
+    (and the presenters of the lectures) are interned in a shared table:
+    equal tags are the same string object and equal tag lists are the
+    same tuple. The records still support the
+    read-only dict protocol used by the generators and the templates
+    (p['name'], p.get('title', ''), 'roster_note' in p), so they can be
+    used in place of the normalized YAML dicts:
+
+        person = Person.from_dict(normalize_person(handle, value, context))
+
+    Keys that are not fields (e.g. roster_note) are kept in a small
+    per-record dict, which is None for most records. An optional field
+    that was not given is not "in" the record, as for the dicts.
+"""
+
+__all__ = ['Record', 'Person', 'Lecture', 'LectureFile', 'Document', 'Outreach',
+           'intern_tag', 'intern_tags', 'get_tag_stats']
+
+
+class _Missing(object):
+    def __repr__(self):
+        return 'MISSING'
+
+
+MISSING = _Missing()
+
+# tag -> the one instance of it
+_tags = {}
+# tuple of tags -> the one instance of it
+_tag_tuples = {}
+
+
+def intern_tag(tag):
+    try:
+        return _tags[tag]
+    except KeyError:
+        _tags[tag] = tag
+        return tag
+    except TypeError:  # not hashable; left to the validation
+        return tag
+
+
+def intern_tags(tags):
+    """ Returns a shared tuple for a list of tags; a single tag (string)
+        or None is returned as it is, interned. """
+    if not isinstance(tags, (list, tuple)):
+        return intern_tag(tags) if tags is not None else None
+    t = tuple(intern_tag(x) for x in tags)
+    try:
+        return _tag_tuples.setdefault(t, t)
+    except TypeError:
+        return t
+
+
+def get_tag_stats():
+    return {'tags': len(_tags), 'tag_lists': len(_tag_tuples)}
+
+
+class Record(object):
+    """ Base class; subclasses list their fields in __slots__ and the ones
+        holding tags in tag_fields. """
+    __slots__ = ('_extra',)
+    _fields = frozenset()
+    tag_fields = frozenset()
+
+    @classmethod
+    def from_dict(cls, d):
+        """ Values that are not dicts (already reported as errors by the
+            schema) are returned as they are. """
+        if not isinstance(d, dict):
+            return d
+        r = cls.__new__(cls)
+        extra = None
+        for k, v in d.items():
+            if k in cls.tag_fields:
+                v = intern_tags(v)
+            if k in cls._fields:
+                setattr(r, k, v)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[k] = v
+        for k in cls._fields:
+            if not k in d:
+                setattr(r, k, MISSING)
+        r._extra = extra
+        return r
+
+    def _get(self, key):
+        if key in self._fields:
+            return getattr(self, key)
+        if self._extra is not None:
+            return self._extra.get(key, MISSING)
+        return MISSING
+
+    def __getitem__(self, key):
+        v = self._get(key)
+        if v is MISSING:
+            raise KeyError(key)
+        return v
+
+    def get(self, key, default=None):
+        v = self._get(key)
+        return default if v is MISSING else v
+
+    def __contains__(self, key):
+        return self._get(key) is not MISSING
+
+    def keys(self):
+        res = [k for k in self._fields if getattr(self, k) is not MISSING]
+        if self._extra is not None:
+            res.extend(self._extra)
+        return res
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def as_dict(self):
+        """ The plain dict form: tuples become lists again, and nested
+            records dicts. """
+        return dict((k, _plain(v)) for k, v in self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = other.as_dict()
+        return self.as_dict() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, self.as_dict())
+
+
+def _plain(v):
+    if isinstance(v, Record):
+        return v.as_dict()
+    if isinstance(v, tuple):
+        return [_plain(x) for x in v]
+    return v
+
+
+def _record_type(name, fields, tag_fields=(), doc=None):
+    fields = tuple(fields)
+    return type(name, (Record,), {'__slots__': fields,
+                                  '_fields': frozenset(fields),
+                                  'tag_fields': frozenset(tag_fields),
+                                  '__doc__': doc})
+
+
+Person = _record_type('Person', ['order', 'name', 'position', 'url', 'bio', 'tags'],
+                      tag_fields=['tags'], doc=""" A person in the DB. """)
+
+LectureFile = _record_type('LectureFile', ['desc', 'url'],
+                           doc=""" A file attached to a lecture. """)
+
+Lecture = _record_type('Lecture', ['date', 'title', 'vimeo', 'ready', 'files', 'presenters'],
+                       tag_fields=['presenters'], doc=""" A lecture. """)
+
+Document = _record_type('Document', ['google_docs_share_link', 'id', 'title', 'desc', 'tags'],
+                        tag_fields=['tags'], doc=""" An entry of documents.yaml. """)
+
+Outreach = _record_type('Outreach', ['tags', 'lat', 'lon', 'id', 'institution',
+                                     'institution_url', 'project_url', 'title',
+                                     'desc', 'active'],
+                        tag_fields=['tags'], doc=""" An entry of outreach.yaml. """)
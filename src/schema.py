@@ -0,0 +1,91 @@
+"""
+    Declarative record schemas.
+
+    A schema is a list of fields, each with a key, a normalizer and
+    (optionally) a default. compile_schema() turns it into a validator that
+    checks a whole record in one pass and reports every problem to the
+    context, instead of stopping at the first one:
+
+        PERSON = compile_schema([
+            Field('name', normalize_name),
+            Field('order', default=100),
+        ], catch=MyExc)
+
+        record = PERSON(id_record, record, context)
+
+    Normalizers have the signature f(value, context) -> value; they can call
+    context.warn(), and raise one of the `catch` exceptions for errors.
+"""
+
+__all__ = ['Field', 'compile_schema', 'string_types']
+
+try:
+    string_types = basestring
+except NameError:  # Python 3
+    string_types = str
+
+REQUIRED = object()
+
+
+class Field(object):
+    """ A field of a record. If default is not given the field is
+        required, unless optional is True, in which case a missing field
+        is left missing. """
+    __slots__ = ('key', 'normalize', 'default', 'optional')
+
+    def __init__(self, key, normalize=None, default=REQUIRED, optional=False):
+        self.key = key
+        self.normalize = normalize
+        self.default = default
+        self.optional = optional
+
+    def __repr__(self):
+        return 'Field(%r)' % self.key
+
+
+def compile_schema(fields, catch=()):
+    """ Returns a function validate(id_record, record, context) -> record.
+
+        The record is normalized in place; missing required fields and
+        exceptions of type `catch` raised by the normalizers are recorded
+        with context.error(). """
+    # (key, normalize, required, optional, default), in declaration order
+    plan = tuple((f.key, f.normalize, f.default is REQUIRED and not f.optional,
+                  f.optional, f.default)
+                 for f in fields)
+    catch = catch or ()
+
+    def validate(id_record, record, context):
+        stack = context.stack
+        stack.append(id_record)
+        try:
+            if not isinstance(record, dict):
+                context.error('Expected a dictionary, got %r', (record,),
+                              code='not-a-dict')
+                return record
+            for key, normalize, required, optional, default in plan:
+                try:
+                    value = record[key]
+                except KeyError:
+                    if required:
+                        context.error('Could not find %r in %r', (key, record),
+                                      code='missing-field')
+                        continue
+                    if optional:
+                        continue
+                    value = record[key] = default
+                if normalize is None:
+                    continue
+                stack.append(key)
+                try:
+                    record[key] = normalize(value, context)
+                except catch as e:
+                    context.error('%s', (e,), code='invalid-value')
+                finally:
+                    stack.pop()
+            return record
+        finally:
+            stack.pop()
+
+    validate.fields = tuple(fields)
+    return validate
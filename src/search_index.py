@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+"""
+    Builds a static search index over the people, lectures and documents,
+    for client-side search:
+
+        python src/search_index.py OUTDIR --people='db/2016-MIT/*.yaml' \\
+            --lectures=lectures.yaml --documents=documents.yaml
+
+    Indexed fields (the titles count 3 times):
+
+        person    name, position, bio
+        lecture   title, presenters (handles and names), files' desc
+        document  title, desc
+
+    Output:
+
+        OUTDIR/docs.json        [[type, id, title], ...]; the position is
+                                the document number used in the postings
+        OUTDIR/shards/<p>.json  {term: [[doc, weight], ...]} for the terms
+                                starting with the prefix <p> (PREFIX
+                                characters; non-alphanumeric characters
+                                are written as _xxxx)
+        OUTDIR/state.json       what the next run needs to be incremental
+
+    The browser fetches docs.json and, for each word typed, only the shard
+    of its prefix. Terms are lowercase, without accents; words shorter
+    than 2 characters and a few stop words are skipped.
+
+    The build is incremental: only the records whose fields changed are
+    tokenized again, the document numbers of the others stay the same,
+    and only the shards whose contents changed are rewritten (see
+    outputs.py); shards left empty are removed.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import unicodedata
+
+from cli import UsageError, split_options
+import logs
+from logs import setup_logging, configure_logging
+from outputs import write_output
+from people import MyExc, Context, read_people
+import timings
+from timings import stage
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 2
+
+TITLE_WEIGHT = 3
+
+STOP_WORDS = set("""a an and are as at be by for from has he his in is it its of on or
+she that the their this to was were will with""".split())
+
+_tag = re.compile(r'<[^>]*>')
+_word = re.compile(r'\w+', re.U)
+
+
+def main():
+    setup_logging()
+    try:
+        args, options = split_options(sys.argv[1:],
+                                      ['people', 'lectures', 'documents'] +
+                                      timings.OPTIONS + logs.OPTIONS)
+        if len(args) != 1:
+            msg = 'Expected the output directory, got %r.' % args
+            raise UsageError(msg)
+        configure_logging(options)
+        with timings.instrumented(options):
+            go(args[0], options.get('people'), options.get('lectures'),
+               options.get('documents'))
+    except (MyExc, UsageError) as e:
+        logger.error(e)
+        sys.exit(-2)
+    except Exception as e:
+        import traceback
+        logger.error(traceback.format_exc(e))
+        sys.exit(-1)
+
+
+def go(out_dir, people_filename=None, lectures_filename=None, documents_filename=None):
+    context = Context()
+    with stage('read'):
+        records = collect_records(context, people_filename, lectures_filename,
+                                  documents_filename)
+    if context.warnings:
+        logger.warning(context.get_warnings())
+    context.bail()
+    with stage('index'):
+        update_index(out_dir, records)
+
+
+def _text(v):
+    if v is None:
+        return u''
+    if isinstance(v, bytes):
+        return v.decode('utf-8')
+    if not isinstance(v, type(u'')):
+        return u'%s' % v
+    return v
+
+
+def tokenize(text):
+    """ Lowercase words without accents and HTML tags. """
+    text = unicodedata.normalize('NFKD', _tag.sub(' ', _text(text)).lower())
+    text = u''.join(c for c in text if not unicodedata.combining(c))
+    return [w for w in _word.findall(text)
+            if len(w) >= 2 and not w in STOP_WORDS and not w.isdigit()]
+
+
+def collect_records(context, people_filename=None, lectures_filename=None,
+                    documents_filename=None):
+    """ Returns key -> (type, id, title, [(weight, text), ...]). """
+    records = {}
+    people = {}
+    if people_filename is not None:
+        from cohorts import HandleIndex, is_cohort_db, read_cohorts
+        if is_cohort_db(people_filename):
+            people = HandleIndex(read_cohorts(people_filename, context)).people
+        else:
+            people = read_people(people_filename, context)
+        context.bail()
+        for handle, p in people.items():
+            records['person:' + handle] = (
+                'person', handle, p['name'] or handle,
+                [(TITLE_WEIGHT, p['name']), (1, p['position']), (1, p['bio'])])
+
+    if lectures_filename is not None:
+        from generate_lectures import read_lectures
+        lectures = read_lectures(lectures_filename, context)
+        context.bail()
+        for id_lecture, l in lectures.items():
+            fields = [(TITLE_WEIGHT, l['title'])]
+            for handle in l['presenters']:
+                fields.append((1, handle))
+                if handle in people:
+                    fields.append((1, people[handle]['name']))
+            for f in l['files']:
+                fields.append((1, f['desc']))
+            records['lecture:' + id_lecture] = ('lecture', id_lecture, l['title'], fields)
+
+    if documents_filename is not None:
+        from generate_documents import normalize_documents
+        import yaml
+        with open(documents_filename) as f:
+            documents = yaml.load(f.read())
+        normalize_documents(documents, context)
+        context.bail()
+        for i, d in enumerate(documents):
+            id_document = d.get('id') or str(i)
+            records['document:' + id_document] = (
+                'document', id_document, d.get('title') or id_document,
+                [(TITLE_WEIGHT, d.get('title')), (1, d.get('desc'))])
+    return records
+
+
+def fingerprint(record):
+    data = json.dumps([_text(x) for x in record[:3]] +
+                      [[w, _text(t)] for w, t in record[3]], sort_keys=True)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def term_weights(fields):
+    res = {}
+    for weight, text in fields:
+        for w in tokenize(text):
+            res[w] = res.get(w, 0) + weight
+    return res
+
+
+def shard_name(term):
+    return ''.join(c if c.isalnum() and ord(c) < 128 else '_%04x' % ord(c)
+                   for c in term[:PREFIX])
+
+
+def read_state(out_dir):
+    filename = os.path.join(out_dir, 'state.json')
+    if not os.path.exists(filename):
+        return {'next': 0, 'records': {}}
+    with open(filename) as f:
+        try:
+            return json.load(f)
+        except ValueError:
+            logger.warning('Ignoring invalid index state %r.', filename)
+            return {'next': 0, 'records': {}}
+
+
+def _dumps(x):
+    return json.dumps(x, sort_keys=True, separators=(',', ':'))
+
+
+def update_index(out_dir, records):
+    """ Brings the index in out_dir up to date with the records. """
+    state = read_state(out_dir)
+    old = state['records']
+    new = {}
+    changed = 0
+    for key, record in records.items():
+        fp = fingerprint(record)
+        previous = old.get(key)
+        if previous is not None and previous['fp'] == fp:
+            new[key] = previous
+            continue
+        changed += 1
+        doc = previous['doc'] if previous is not None else state['next']
+        if previous is None:
+            state['next'] += 1
+        new[key] = {'fp': fp, 'doc': doc, 'type': record[0], 'id': record[1],
+                    'title': _text(record[2]), 'terms': term_weights(record[3])}
+    removed = len(set(old) - set(new))
+    logger.info('%d records: %d new or changed, %d removed', len(new), changed, removed)
+
+    # the document numbers are stable; removed ones become holes
+    docs = [None] * state['next']
+    shards = {}
+    for r in new.values():
+        docs[r['doc']] = [r['type'], r['id'], r['title']]
+        for term, weight in r['terms'].items():
+            shard = shards.setdefault(shard_name(term), {})
+            shard.setdefault(term, []).append([r['doc'], weight])
+
+    shards_dir = os.path.join(out_dir, 'shards')
+    if not os.path.exists(shards_dir):
+        os.makedirs(shards_dir)
+    written = 0
+    for name, shard in shards.items():
+        for postings in shard.values():
+            postings.sort()
+        if write_output(os.path.join(shards_dir, name + '.json'), _dumps(shard)):
+            written += 1
+    stale = [f for f in os.listdir(shards_dir)
+             if f.endswith('.json') and not f[:-len('.json')] in shards]
+    for f in stale:
+        os.remove(os.path.join(shards_dir, f))
+    logger.info('%d shards: %d written, %d removed', len(shards), written, len(stale))
+
+    write_output(os.path.join(out_dir, 'docs.json'), _dumps(docs))
+    state['records'] = new
+    write_output(os.path.join(out_dir, 'state.json'), _dumps(state))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""
+    Compiles the people DB (db/<cohort>/*.yaml) into one SQLite snapshot,
+    so that the generators (and other tools) do not need to parse hundreds
+    of YAML files:
+
+        python src/snapshot.py 'db/2016-MIT/*.yaml' people.sqlite
+        python src/generate_roster.py people.sqlite
+
+    A snapshot of several cohorts ('db/*/*.yaml') keys the people by
+    "cohort/handle", as the roster of the DB directory does; with a
+    single cohort they keep their bare handles.
+
+    The snapshot is updated incrementally: only the files whose mtime or
+    size changed are parsed again, and removed files are dropped.
+
+    Tables:
+
+        people(filename, handle, cohort, mtime, size, name, sort_order, data)
+            data is the raw YAML record, as JSON; indexes on handle and
+            sort_order.
+        tags(filename, handle, tag)
+            one row per tag; indexes on tag and handle.
+"""
+import glob
+import json
+import logging
+import os
+import sqlite3
+import sys
+
+from logs import setup_logging
+from people import MyExc, read_yaml_dict
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['is_snapshot', 'update_snapshot', 'load_people_records', 'record_keys']
+
+SUFFIXES = ('.sqlite', '.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS people (
+    filename TEXT PRIMARY KEY,
+    handle TEXT NOT NULL,
+    cohort TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    name TEXT,
+    sort_order INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS people_handle ON people (handle);
+CREATE INDEX IF NOT EXISTS people_sort_order ON people (sort_order);
+CREATE TABLE IF NOT EXISTS tags (
+    filename TEXT NOT NULL,
+    handle TEXT NOT NULL,
+    tag TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tags_tag ON tags (tag);
+CREATE INDEX IF NOT EXISTS tags_handle ON tags (handle);
+"""
+
+
+def main():
+    setup_logging()
+    args = sys.argv[1:]
+    if len(args) != 2:
+        logger.error('Usage: snapshot.py <people glob> <snapshot.sqlite>')
+        sys.exit(-2)
+    try:
+        update_snapshot(args[0], args[1])
+    except MyExc as e:
+        logger.error(e)
+        sys.exit(-2)
+
+
+def is_snapshot(filename):
+    return filename.endswith(SUFFIXES)
+
+
+def connect(snapshot_filename):
+    db = sqlite3.connect(snapshot_filename)
+    db.executescript(SCHEMA)
+    return db
+
+
+def update_snapshot(people_filename, snapshot_filename):
+    """ Brings the snapshot up to date with the files matching the glob.
+        Returns a dict with the number of added/updated/removed/unchanged
+        files. """
+    db = connect(snapshot_filename)
+    try:
+        known = dict((row[0], (row[1], row[2])) for row in
+                     db.execute('SELECT filename, mtime, size FROM people'))
+        stats = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+        listing = set(os.path.abspath(f) for f in glob.glob(people_filename))
+
+        for filename in sorted(listing):
+            st = os.stat(filename)
+            if known.get(filename) == (st.st_mtime, st.st_size):
+                stats['unchanged'] += 1
+                continue
+            stats['updated' if filename in known else 'added'] += 1
+            value = read_yaml_dict(filename)
+            _delete(db, filename)
+            _insert(db, filename, st, value)
+
+        for filename in set(known) - listing:
+            stats['removed'] += 1
+            _delete(db, filename)
+
+        db.commit()
+    finally:
+        db.close()
+
+    logger.info('%s: %d added, %d updated, %d removed, %d unchanged',
+                snapshot_filename, stats['added'], stats['updated'],
+                stats['removed'], stats['unchanged'])
+    return stats
+
+
+def _delete(db, filename):
+    db.execute('DELETE FROM people WHERE filename = ?', (filename,))
+    db.execute('DELETE FROM tags WHERE filename = ?', (filename,))
+
+
+def _insert(db, filename, st, value):
+    handle = os.path.splitext(os.path.basename(filename))[0]
+    cohort = os.path.basename(os.path.dirname(filename))
+    try:
+        data = json.dumps(value, sort_keys=True)
+    except (TypeError, ValueError) as e:
+        msg = 'Cannot store %r in the snapshot: %s' % (filename, e)
+        raise MyExc(msg)
+    order = value.get('order', 100)
+    db.execute('INSERT INTO people (filename, handle, cohort, mtime, size, '
+               'name, sort_order, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+               (filename, handle, cohort, st.st_mtime, st.st_size,
+                value.get('name'), order if isinstance(order, int) else None,
+                data))
+    tags = value.get('tags') or []
+    if not isinstance(tags, list):
+        tags = [tags]
+    db.executemany('INSERT INTO tags (filename, handle, tag) VALUES (?, ?, ?)',
+                   [(filename, handle, str(tag)) for tag in tags])
+
+
+def load_people_records(snapshot_filename):
+    """ Returns a list of (handle, cohort, filename, raw record). """
+    if not os.path.exists(snapshot_filename):
+        msg = 'Could not find snapshot %r.' % snapshot_filename
+        raise MyExc(msg)
+    db = sqlite3.connect(snapshot_filename)
+    try:
+        rows = db.execute('SELECT handle, cohort, filename, data FROM people '
+                          'ORDER BY filename').fetchall()
+    except sqlite3.DatabaseError as e:
+        msg = 'Invalid snapshot %r: %s' % (snapshot_filename, e)
+        raise MyExc(msg)
+    finally:
+        db.close()
+    return [(handle, cohort, filename, json.loads(data))
+            for handle, cohort, filename, data in rows]
+
+
+def record_keys(records):
+    """ The ids of the people of load_people_records(): the handles if
+        they are all from one cohort, otherwise "cohort/handle", as in the
+        roster of a DB directory, so that the same handle in two cohorts
+        is two people. """
+    from cohorts import SEP
+    if len(set(cohort for _, cohort, _, _ in records)) <= 1:
+        return [handle for handle, _, _, _ in records]
+    return [cohort + SEP + handle for handle, cohort, _, _ in records]
+
+
+if __name__ == '__main__':
+    main()
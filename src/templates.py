@@ -0,0 +1,223 @@
+"""
+    Compiled fragment templates.
+
+    A template is compiled once into a Python function that evaluates a
+    single format expression; there is no parsing at render time.
+
+    Syntax:
+
+        {name}              value of name ('%s' formatting)
+        {x.key}             x[key], where x is a loop variable
+        {if name} ... {else} ... {end}
+        {if not name} ... {end}
+        {for x in name} ... {end}
+        {{ and }}           literal braces
+
+    If a prefix is given, the output is indented like indent(s, prefix):
+    every line (including the first) starts with the prefix and trailing
+    whitespace is removed. This is done at compile time for the literal
+    text; only values that contain newlines need work at render time.
+"""
+import re
+
+__all__ = ['compile_template', 'TemplateError']
+
+
+class TemplateError(Exception):
+    pass
+
+
+re_tag = re.compile(r'\{\{|\}\}|\{([^{}]*)\}')
+re_name = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?$')
+
+
+def compile_template(text, prefix=''):
+    """ Returns a function render(...) -> str, taking the template values
+        as keyword arguments. """
+    tokens = _tokenize(text)
+    if prefix:
+        tokens = _bake_indent(tokens, prefix)
+    source = _generate(tokens, prefix)
+    ns = {}
+    try:
+        exec(compile(source, '<template>', 'exec'), ns)
+    except SyntaxError as e:  # pragma: no cover
+        msg = 'Could not compile template:\n%s\n\n%s' % (source, e)
+        raise TemplateError(msg)
+    render = ns['render']
+    render.source = source
+    return render
+
+
+def _tokenize(text):
+    """ Returns a list of ('text', s), ('value', name), ('if', name, negate),
+        ('else',), ('for', var, name), ('end',). """
+    tokens = []
+    literal = []
+    i = 0
+    for m in re_tag.finditer(text):
+        literal.append(text[i:m.start()])
+        i = m.end()
+        tag = m.group(0)
+        if tag == '{{':
+            literal.append('{')
+            continue
+        if tag == '}}':
+            literal.append('}')
+            continue
+        if literal:
+            tokens.append(('text', ''.join(literal)))
+            literal = []
+        tokens.append(_parse_tag(m.group(1).strip()))
+    literal.append(text[i:])
+    tokens.append(('text', ''.join(literal)))
+    return [t for t in tokens if t != ('text', '')]
+
+
+def _parse_tag(tag):
+    words = tag.split()
+    if words == ['else']:
+        return ('else',)
+    if words == ['end']:
+        return ('end',)
+    if len(words) == 2 and words[0] == 'if':
+        return ('if', _check_name(words[1]), False)
+    if len(words) == 3 and words[:2] == ['if', 'not']:
+        return ('if', _check_name(words[2]), True)
+    if len(words) == 4 and words[0] == 'for' and words[2] == 'in':
+        return ('for', _check_name(words[1]), _check_name(words[3]))
+    if len(words) == 1:
+        return ('value', _check_name(words[0]), False)
+    msg = 'Invalid template tag {%s}' % tag
+    raise TemplateError(msg)
+
+
+def _check_name(name):
+    if not re_name.match(name):
+        msg = 'Invalid name %r in template' % name
+        raise TemplateError(msg)
+    return name
+
+
+def _bake_indent(tokens, prefix):
+    """ Adds the prefix after each literal newline and strips trailing
+        whitespace; marks values that end a line so that they are stripped
+        at render time. """
+    res = [('text', prefix)]
+    for t in tokens:
+        if t[0] != 'text':
+            res.append(t)
+            continue
+        lines = t[1].split('\n')
+        if len(lines) > 1:
+            if not lines[0].strip() and res and res[-1][0] == 'value':
+                res[-1] = ('value', res[-1][1], True)
+            lines = [l.rstrip() for l in lines[:-1]] + [lines[-1]]
+        text = ('\n' + prefix).join(lines)
+        if res[-1][0] == 'text':
+            res[-1] = ('text', res[-1][1] + text)
+        else:
+            res.append(('text', text))
+    return res
+
+
+def _parse_tree(tokens):
+    """ Nests the tokens: ('if', name, negate, then, else_) and
+        ('for', var, name, body). """
+    root = []
+    stack = [(None, root)]
+    for t in tokens:
+        kind = t[0]
+        if kind in ('text', 'value'):
+            stack[-1][1].append(t)
+        elif kind == 'if':
+            node = ('if', t[1], t[2], [], [])
+            stack[-1][1].append(node)
+            stack.append((node, node[3]))
+        elif kind == 'for':
+            node = ('for', t[1], t[2], [])
+            stack[-1][1].append(node)
+            stack.append((node, node[3]))
+        elif kind == 'else':
+            node, body = stack[-1]
+            if node is None or node[0] != 'if' or body is node[4]:
+                raise TemplateError('{else} without {if}')
+            stack[-1] = (node, node[4])
+        elif kind == 'end':
+            if len(stack) == 1:
+                raise TemplateError('{end} without block')
+            stack.pop()
+    if len(stack) > 1:
+        msg = 'Unclosed block {%s %s}' % (stack[-1][0][0], stack[-1][0][1])
+        raise TemplateError(msg)
+    return root
+
+
+def _generate(tokens, prefix):
+    """ Generates the source of render(): a single format expression,
+        with conditional expressions and joins for the blocks. """
+    params = []
+    loop_vars = []
+
+    def ref(name):
+        if '.' in name:
+            var, key = name.split('.')
+            if not var in loop_vars:
+                msg = 'Unknown loop variable %r' % var
+                raise TemplateError(msg)
+            return '%s[%r]' % (var, key)
+        if name in loop_vars:
+            return name
+        if not name in params:
+            params.append(name)
+        return name
+
+    def expr(nodes):
+        fmt = []
+        args = []
+        for t in nodes:
+            kind = t[0]
+            if kind == 'text':
+                fmt.append(t[1].replace('%', '%%'))
+            elif kind == 'value':
+                fmt.append('%s')
+                if prefix:
+                    f = '_indent_eol' if t[2] else '_indent'
+                    args.append("%s('%%s' %% (%s,))" % (f, ref(t[1])))
+                else:
+                    args.append(ref(t[1]))
+            elif kind == 'if':
+                cond = ('not ' if t[2] else '') + ref(t[1])
+                fmt.append('%s')
+                args.append('(%s if %s else %s)' % (expr(t[3]), cond, expr(t[4])))
+            elif kind == 'for':
+                if t[1] in params:
+                    msg = 'Loop variable %r shadows a value' % t[1]
+                    raise TemplateError(msg)
+                seq = ref(t[2])
+                loop_vars.append(t[1])
+                fmt.append('%s')
+                args.append("''.join([%s for %s in %s])" % (expr(t[3]), t[1], seq))
+                loop_vars.pop()
+        if not args:
+            return repr(''.join(fmt).replace('%%', '%'))
+        return '(%r %% (%s,))' % (''.join(fmt), ', '.join(args))
+
+    body = expr(_parse_tree(tokens))
+    lines = ['def render(%s):' % ', '.join(params),
+             '    return %s' % body]
+
+    if prefix:
+        lines = ['def _indent(v, eol=False):',
+                 '    if not eol and not "\\n" in v:',
+                 '        return v',
+                 '    parts = v.split("\\n")',
+                 '    last = parts.pop()',
+                 '    parts = [p.rstrip() for p in parts]',
+                 '    parts.append(last.rstrip() if eol else last)',
+                 '    return %r.join(parts)' % ('\n' + prefix),
+                 '',
+                 'def _indent_eol(v):',
+                 '    return _indent(v, True)',
+                 ''] + lines
+    return '\n'.join(lines) + '\n'
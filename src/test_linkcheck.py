@@ -0,0 +1,127 @@
+"""
+    Tests of linkcheck.py against a stub server on localhost:
+
+        cd src && python -m unittest test_linkcheck
+"""
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+from linkcheck import LinkCache, _HostQueues, check_url, check_urls
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """ /ok: 200; /missing: 404; /no-head: 405 for HEAD, 200 for GET;
+        /down: 503. """
+
+    def do_HEAD(self):
+        if self.path == '/no-head':
+            self.respond(405)
+        else:
+            self.respond(self.status())
+
+    def do_GET(self):
+        self.respond(self.status())
+
+    def status(self):
+        return {'/ok': 200, '/no-head': 200, '/down': 503}.get(self.path, 404)
+
+    def respond(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def _closed_port():
+    """ A port on which nothing listens. """
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+class TestLinkcheck(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(('127.0.0.1', 0), StubHandler)
+        cls.base = 'http://127.0.0.1:%d' % cls.server.server_address[1]
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.daemon = True
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_ok(self):
+        r = check_url(self.base + '/ok', timeout=5)
+        self.assertTrue(r['ok'])
+        self.assertEqual(r['status'], 200)
+
+    def test_not_found(self):
+        r = check_url(self.base + '/missing', timeout=5)
+        self.assertFalse(r['ok'])
+        self.assertEqual(r['status'], 404)
+
+    def test_head_refused(self):
+        r = check_url(self.base + '/no-head', timeout=5)
+        self.assertTrue(r['ok'])
+        self.assertEqual(r['status'], 200)
+
+    def test_connection_refused(self):
+        r = check_url('http://127.0.0.1:%d/' % _closed_port(), timeout=5)
+        self.assertFalse(r['ok'])
+        self.assertEqual(r['status'], None)
+        self.assertTrue(r['error'])
+
+    def test_cache(self):
+        d = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(d, 'links.json')
+            urls = [self.base + '/ok', self.base + '/missing', self.base + '/down',
+                    'http://127.0.0.1:%d/' % _closed_port()]
+            cache = LinkCache(filename)
+            results = check_urls(urls, cache, jobs=4, timeout=5)
+            self.assertEqual([results[u]['ok'] for u in urls], [True, False, False, False])
+            cache.save()
+            # the transient failures are checked again, the others are not
+            cache = LinkCache(filename)
+            self.assertEqual(sorted(cache.entries), sorted(urls[:2]))
+            self.assertEqual(cache.get(urls[2]), None)
+        finally:
+            shutil.rmtree(d)
+
+
+class TestHostQueues(unittest.TestCase):
+
+    def test_round_robin(self):
+        urls = ['http://a/1', 'http://a/2', 'http://a/3', 'http://b/1', 'http://b/2']
+        q = _HostQueues(urls, per_host=1)
+        self.assertEqual(q.take(), 'http://a/1')
+        # a is busy: the next URL is taken from b rather than waited for
+        self.assertEqual(q.take(), 'http://b/1')
+        q.done('http://a/1')
+        self.assertEqual(q.take(), 'http://a/2')
+        q.done('http://b/1')
+        self.assertEqual(q.take(), 'http://b/2')
+        q.done('http://a/2')
+        self.assertEqual(q.take(), 'http://a/3')
+        self.assertEqual(q.take(), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,233 @@
+"""
+    Downsized thumbnails of the staff photos, for the roster:
+
+        python src/generate_roster.py 'db/2016-MIT/*.yaml' \\
+            --thumbnails=media/staff/thumbs
+
+    The photos next to the YAML files (db/<cohort>/<handle>.jpg, or in
+    the same archive, see archive.py) are resized to WIDTHS (the photo
+    column is 10em, so 1x and 2x), as JPEG and, if Pillow supports it,
+    WebP. The thumbnails are named after the sha256 of the source photo
+    and listed in DIR/index.json, so a photo is only processed again when
+    its contents change, and renaming a person does not invalidate
+    anything. The photos are processed in parallel by a process pool.
+
+    The roster then emits a <picture> with srcset, width, height and
+    loading="lazy". Needs Pillow; Git LFS pointers that were not fetched
+    (see imageinfo.py) and photos that Pillow cannot open keep the
+    full-size image.
+"""
+import glob
+import io
+import json
+import logging
+import os
+
+from people import MyExc
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['WIDTHS', 'photo_sources', 'make_all_thumbnails', 'photo_attributes']
+
+WIDTHS = [160, 320]
+# part of the names, so that the thumbnails made before a change in the
+# processing are made again (2: EXIF orientation applied)
+VERSION = 2
+PHOTO_SUFFIXES = ['.jpg', '.jpeg', '.png']
+INDEX = 'index.json'
+
+
+def photo_sources(people_filename):
+    """ Returns id_person -> photo file, for the ids used by the roster
+        ("cohort/handle" for a DB directory, the handle otherwise).
+        The photos in an archive are the ones extracted when the people
+        were read (archive.archive_photos). """
+    from archive import archive_photos, is_archive
+    from cohorts import SEP, discover_cohorts, is_cohort_db
+    from snapshot import is_snapshot
+
+    if is_archive(people_filename):
+        return dict(archive_photos(people_filename))
+    if is_cohort_db(people_filename):
+        pairs = []
+        for cohort in discover_cohorts(people_filename):
+            for filename in glob.glob(os.path.join(people_filename, cohort, '*.yaml')):
+                handle = os.path.splitext(os.path.basename(filename))[0]
+                pairs.append((cohort + SEP + handle, filename))
+    elif is_snapshot(people_filename):
+        from snapshot import load_people_records, record_keys
+        records = load_people_records(people_filename)
+        pairs = [(key, filename)
+                 for key, (_, _, filename, _) in zip(record_keys(records), records)]
+    else:
+        pairs = [(os.path.splitext(os.path.basename(f))[0], f)
+                 for f in glob.glob(people_filename)]
+
+    res = {}
+    for id_person, filename in pairs:
+        base = os.path.splitext(filename)[0]
+        for suffix in PHOTO_SUFFIXES:
+            if os.path.exists(base + suffix):
+                res[id_person] = base + suffix
+                break
+    return res
+
+
+def _resample(Image):
+    if hasattr(Image, 'Resampling'):
+        return Image.Resampling.LANCZOS
+    return getattr(Image, 'LANCZOS', Image.ANTIALIAS)
+
+
+def make_thumbnails(args):
+    """ Worker: resizes one photo. Returns (digest, sizes, error), where
+        sizes is a list of [width, height, format, name], or empty if the
+        photo cannot be read. """
+    from PIL import Image
+    from outputs import atomic_write
+
+    source, digest, out_dir, widths, formats = args
+    try:
+        im = Image.open(source)
+        im.load()
+    except (IOError, OSError, SyntaxError) as e:
+        return digest, [], str(e)
+    # the camera orientation, before the EXIF is dropped by the resize
+    im = _exif_transpose(im, Image)
+    if im.mode != 'RGB':
+        im = im.convert('RGB')
+
+    sizes = []
+    # no upscaling: at most the original width
+    targets = sorted(set(min(w, im.size[0]) for w in widths))
+    for w in targets:
+        h = max(1, int(round(im.size[1] * float(w) / im.size[0])))
+        resized = im.resize((w, h), _resample(Image))
+        for fmt in formats:
+            name = '%s-v%d-%d.%s' % (digest[:16], VERSION, w, fmt)
+            buf = io.BytesIO()
+            if fmt == 'jpg':
+                resized.save(buf, 'JPEG', quality=82, optimize=True, progressive=True)
+            else:
+                resized.save(buf, 'WEBP', quality=80, method=6)
+            atomic_write(os.path.join(out_dir, name), buf.getvalue())
+            sizes.append([w, h, fmt, name])
+    return digest, sizes, None
+
+
+# EXIF Orientation -> transposition that displays the image upright
+ORIENTATIONS = {2: 'FLIP_LEFT_RIGHT', 3: 'ROTATE_180', 4: 'FLIP_TOP_BOTTOM',
+                5: 'TRANSPOSE', 6: 'ROTATE_270', 7: 'TRANSVERSE', 8: 'ROTATE_90'}
+
+
+def _exif_transpose(im, Image):
+    try:
+        from PIL import ImageOps
+        return ImageOps.exif_transpose(im)
+    except (ImportError, AttributeError):  # Pillow < 6
+        pass
+    try:
+        orientation = (im._getexif() or {}).get(0x0112)
+    except (AttributeError, IndexError, KeyError, SyntaxError, ValueError):
+        return im
+    method = ORIENTATIONS.get(orientation)
+    if method is None:
+        return im
+    transpose = getattr(Image, 'Transpose', Image)
+    return im.transpose(getattr(transpose, method))
+
+
+def _formats():
+    try:
+        from PIL import features
+        if features.check('webp'):
+            return ['jpg', 'webp']
+    except ImportError:  # old Pillow
+        pass
+    return ['jpg']
+
+
+def _read_index(out_dir):
+    filename = os.path.join(out_dir, INDEX)
+    if not os.path.exists(filename):
+        return {}
+    with open(filename) as f:
+        try:
+            return json.load(f)
+        except ValueError:
+            logger.warning('Ignoring invalid thumbnail index %r.', filename)
+            return {}
+
+
+def _is_cached(out_dir, entry):
+    return entry is not None and all(os.path.exists(os.path.join(out_dir, s[3]))
+                                     for s in entry)
+
+
+def make_all_thumbnails(sources, out_dir, jobs=None):
+    """ sources: id_person -> photo file. Returns id_person -> list of
+        [width, height, format, name] (names relative to out_dir), for
+        the photos that could be read. """
+    try:
+        __import__('PIL')
+    except ImportError:
+        msg = 'Pillow is needed for the thumbnails (pip install Pillow).'
+        raise MyExc(msg)
+    from outputs import atomic_write, file_hash
+
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    index = _read_index(out_dir)
+    formats = _formats()
+
+    from imageinfo import IMAGE_FORMATS, read_image_info
+    digests = {}
+    for id_person, f in sources.items():
+        fmt = read_image_info(f)['format']
+        if not fmt in IMAGE_FORMATS:
+            logger.warning('Skipping photo %r (format: %s).', f, fmt)
+            continue
+        digests[id_person] = '%s-v%d' % (file_hash(f), VERSION)
+    tasks = {}
+    for id_person, digest in digests.items():
+        if not _is_cached(out_dir, index.get(digest)) and not digest in tasks:
+            tasks[digest] = (sources[id_person], digest, out_dir, WIDTHS, formats)
+
+    if tasks:
+        logger.info('thumbnails: %d of %d photos to process', len(tasks), len(digests))
+        if len(tasks) > 1 and jobs != 1:
+            import multiprocessing
+            pool = multiprocessing.Pool(jobs)
+            try:
+                results = pool.map(make_thumbnails, list(tasks.values()))
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [make_thumbnails(t) for t in tasks.values()]
+        for digest, sizes, error in results:
+            if error is not None:
+                logger.warning('Cannot read photo %r: %s', tasks[digest][0], error)
+            index[digest] = sizes
+        data = json.dumps(index, indent=1, sort_keys=True, separators=(',', ': '))
+        atomic_write(os.path.join(out_dir, INDEX), data.encode('utf-8'))
+
+    return dict((id_person, index[digest]) for id_person, digest in digests.items()
+                if index.get(digest))
+
+
+def photo_attributes(sizes, url_prefix):
+    """ The template fields for the <picture> of one photo: src, width and
+        height of the smallest JPEG, and the srcsets. """
+    jpgs = sorted(s for s in sizes if s[2] == 'jpg')
+    webps = sorted(s for s in sizes if s[2] == 'webp')
+    w, h, _, name = jpgs[0]
+
+    def srcset(l):
+        return ', '.join('%s%s %dw' % (url_prefix, s[3], s[0]) for s in l)
+
+    return {'thumb_url': url_prefix + name,
+            'srcset': srcset(jpgs),
+            'webp_srcset': srcset(webps),
+            'width': w,
+            'height': h}
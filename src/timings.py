@@ -0,0 +1,165 @@
+"""
+    Stage-level timings for the scripts (--timings and --profile=FILE).
+
+        @timed('generate_html_tag')
+        def generate_html_tag(...):
+            ...
+
+        with instrumented(options):
+            with stage('read_people'):
+                ...
+
+    For each stage we record the number of calls, wall and CPU time, the
+    change in allocated memory blocks and, if tracemalloc is available,
+    the net and peak traced memory (the peak restarts when a nested stage
+    begins, so it is most meaningful for leaf stages). At the end a compact
+    table is printed on stderr; with --profile=FILE a cProfile dump is
+    also written.
+
+    When timings are not enabled, stage() costs one function call.
+"""
+from contextlib import contextmanager
+import sys
+import time
+
+__all__ = ['OPTIONS', 'instrumented', 'stage', 'timed']
+
+OPTIONS = ['timings', 'profile']
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+if hasattr(time, 'process_time'):
+    cpu_time = time.process_time
+else:
+    cpu_time = time.clock
+
+if hasattr(sys, 'getallocatedblocks'):
+    allocated_blocks = sys.getallocatedblocks
+else:  # Python 2
+    allocated_blocks = None
+
+
+class _State(object):
+    enabled = False
+    # stage name -> [calls, wall, cpu, blocks, bytes, peak]
+    stats = {}
+    # stage names in order of first use
+    order = []
+
+
+class _NoStage(object):
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *args):
+        pass
+
+
+_no_stage = _NoStage()
+
+
+def stage(name):
+    """ Context manager that accounts the enclosed code to the stage name. """
+    if not _State.enabled:
+        return _no_stage
+    return _stage(name)
+
+
+def timed(name):
+    """ Decorator version of stage(). """
+    def decorator(f):
+        def wrapper(*args, **kwargs):
+            if not _State.enabled:
+                return f(*args, **kwargs)
+            with _stage(name):
+                return f(*args, **kwargs)
+        wrapper.__name__ = f.__name__
+        wrapper.__doc__ = f.__doc__
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def _stage(name):
+    if tracemalloc is not None:
+        mem0, _ = tracemalloc.get_traced_memory()
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+    blocks0 = allocated_blocks() if allocated_blocks is not None else 0
+    cpu0 = cpu_time()
+    wall0 = time.time()
+    try:
+        yield
+    finally:
+        wall = time.time() - wall0
+        cpu = cpu_time() - cpu0
+        blocks = allocated_blocks() - blocks0 if allocated_blocks is not None else 0
+        mem = peak = 0
+        if tracemalloc is not None:
+            mem1, peak = tracemalloc.get_traced_memory()
+            mem = mem1 - mem0
+            peak = peak - mem0
+        try:
+            s = _State.stats[name]
+        except KeyError:
+            s = _State.stats[name] = [0, 0.0, 0.0, 0, 0, 0]
+            _State.order.append(name)
+        s[0] += 1
+        s[1] += wall
+        s[2] += cpu
+        s[3] += blocks
+        s[4] += mem
+        s[5] = max(s[5], peak)
+
+
+@contextmanager
+def instrumented(options):
+    """ Enables the timings if --timings or --profile were given. """
+    profile = options.get('profile')
+    if not 'timings' in options and not profile:
+        yield
+        return
+
+    _State.enabled = True
+    if tracemalloc is not None:
+        tracemalloc.start()
+    profiler = None
+    if profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with stage('total'):
+            yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile)
+        if tracemalloc is not None:
+            tracemalloc.stop()
+        _State.enabled = False
+        sys.stderr.write(format_table() + '\n')
+        if profile:
+            sys.stderr.write('cProfile data written to %s\n' % profile)
+
+
+def format_table():
+    lines = ['%-22s %6s %10s %10s %10s %10s %10s' %
+             ('stage', 'calls', 'wall ms', 'cpu ms', 'blocks', 'net KiB', 'peak KiB')]
+    # 'total' is opened first but finishes last
+    names = [n for n in _State.order if n != 'total'] + ['total']
+    for name in names:
+        if not name in _State.stats:
+            continue
+        calls, wall, cpu, blocks, mem, peak = _State.stats[name]
+        if tracemalloc is not None:
+            mem_s = '%10.1f %10.1f' % (mem / 1024.0, peak / 1024.0)
+        else:
+            mem_s = '%10s %10s' % ('-', '-')
+        blocks_s = '%10d' % blocks if allocated_blocks is not None else '%10s' % '-'
+        lines.append('%-22s %6d %10.1f %10.1f %s %s' %
+                     (name, calls, wall * 1000, cpu * 1000, blocks_s, mem_s))
+    return '\n'.join(lines)